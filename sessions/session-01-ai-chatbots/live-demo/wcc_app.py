@@ -19,9 +19,15 @@ import os
 import google.generativeai as genai
 from datetime import datetime
 
+# Shared token counting (utilities/token_counter.py, installed by requirements.txt)
+from token_counter import trim_history
+
 
 MODEL_ID = 'gemini-2.5-flash-lite'
 
+# Max tokens of conversation history sent with each message
+MAX_HISTORY_TOKENS = 8000
+
 # Load .env if available (dev convenience)
 try:
     from dotenv import load_dotenv
@@ -165,8 +171,10 @@ def step_3_conversation_memory():
             # Add user message to history
             self.conversation_history.append({"role": "user", "parts": [user_input]})
             
-            # Generate response with full history
-            response = self.model.generate_content(self.conversation_history)
+            # Generate response with the most recent history that fits the budget
+            response = self.model.generate_content(
+                trim_history(self.conversation_history, MAX_HISTORY_TOKENS)
+            )
             
             # Add assistant response to history
             self.conversation_history.append({"role": "model", "parts": [response.text]})
@@ -331,8 +339,10 @@ def step_5_streamlit_interface():
                 # Add current user prompt
                 conversation_history.append({"role": "user", "parts": [prompt]})
                 
-                # Generate response with full conversation history
-                response = model_ui.generate_content(conversation_history)
+                # Generate response with the most recent history that fits the budget
+                response = model_ui.generate_content(
+                    trim_history(conversation_history, MAX_HISTORY_TOKENS)
+                )
                 
                 st.markdown(response.text)
         
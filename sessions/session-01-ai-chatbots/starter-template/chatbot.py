@@ -7,6 +7,9 @@ import os
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# Shared token counting (utilities/token_counter.py, installed by requirements.txt)
+from token_counter import trim_history
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -20,6 +23,9 @@ if not API_KEY:
 
 genai.configure(api_key=API_KEY)
 
+# Max tokens of conversation history sent with each message
+MAX_HISTORY_TOKENS = 8000
+
 
 class SimpleBot:
     """A simple chatbot using Gemini API"""
@@ -54,9 +60,9 @@ class SimpleBot:
                 {"role": "user", "parts": [user_message]}
             )
 
-            # Generate response using conversation history
+            # Generate response using the most recent history that fits the budget
             response = self.model.generate_content(
-                self.conversation_history
+                trim_history(self.conversation_history, MAX_HISTORY_TOKENS)
             )
 
             # Extract response text
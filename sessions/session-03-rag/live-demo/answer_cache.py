@@ -0,0 +1,267 @@
+"""
+WCC AI Learning Series - Session 3: Semantic Answer Cache
+Reuse answers for questions that mean the same thing
+
+"How do I join the mentorship program?" and "How can I join WCC mentorship?"
+should not cost two Gemini calls. The cache stores each answer with the
+question's embedding and the IDs of the chunks it was generated from. A new
+question gets the stored answer when:
+
+1. Its embedding is within `threshold` cosine similarity of a cached question
+2. Retrieval returned exactly the same chunks (so the context is identical)
+3. The answer was generated by the same model
+
+Chunk IDs include a hash of the chunk text, so edited content can never be
+matched against a stale answer; `invalidate()` clears everything whenever the
+collection is written to. Entries older than `ttl` expire, and beyond
+`max_entries` the least recently used answers are dropped.
+
+Similarity thresholds depend on the embedding size. In a few dimensions
+unrelated questions score much higher (a random pair of 10-dimensional
+embeddings reaches 0.95 about 200 times more often than one in a million;
+at 768 dimensions practically never), so the threshold used is never below
+the similarity a random direction reaches with probability ~1e-6
+(min_threshold_for_dimension). It is still a heuristic: questions that
+differ only by a negation ("join" / "leave") can score above any threshold,
+which is why the retrieved chunks must match too.
+
+Lookups avoid scanning every cached question with random-hyperplane LSH:
+each embedding is hashed into one bucket per band, and only questions that
+share a bucket are compared exactly.
+"""
+
+import json
+import math
+import random
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+
+def make_sources_key(chunk_ids: Sequence[str]) -> str:
+    """Order-independent key for the set of retrieved chunks"""
+    return "|".join(sorted(chunk_ids))
+
+
+def min_threshold_for_dimension(dimension: int, false_match_rate: float = 1e-6) -> float:
+    """
+    Cosine similarity a random direction reaches with probability ~`false_match_rate`
+
+    The fraction of directions within angle t of a vector shrinks like
+    sin(t) ** (dimension - 1), giving about 0.98 for 10 dimensions and 0.19
+    for 768 (so the usual 0.95 only needs raising for very small embeddings).
+    """
+    if dimension < 2:
+        return 1.0
+    return math.sqrt(1.0 - false_match_rate ** (2.0 / (dimension - 1)))
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SemanticAnswerCache:
+    """
+    Persistent cache of RAG answers, looked up by question similarity
+
+    Usage:
+        cache = SemanticAnswerCache("./answer_cache.sqlite", threshold=0.95,
+                                    model="gemini-2.5-flash-lite")
+        hit = cache.lookup(question_embedding, sources_key)
+        if hit is None:
+            answer = generate(...)
+            cache.store(question, question_embedding, sources_key, answer, sources)
+    """
+
+    def __init__(self, path: str = "./answer_cache.sqlite", threshold: float = 0.95,
+                 model: str = "", max_entries: int = 10000,
+                 ttl: Optional[float] = 7 * 24 * 3600, num_bands: int = 4,
+                 bits_per_band: int = 8, seed: int = 42):
+        """
+        Args:
+            path: SQLite file for cached answers
+            threshold: Minimum cosine similarity between questions for a hit
+                       (raised for small embeddings, see min_threshold_for_dimension)
+            model: Generation model; answers from other models never match
+            max_entries: Max cached answers (least recently used are dropped)
+            ttl: Seconds before a cached answer expires (None = never)
+            num_bands: LSH bands (more bands = higher recall, more candidates)
+            bits_per_band: Hyperplanes per band (more bits = smaller buckets)
+            seed: Seed for the random hyperplanes (keep fixed across runs)
+        """
+        self.path = path
+        self.threshold = threshold
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.num_bands = num_bands
+        self.bits_per_band = bits_per_band
+        self.seed = seed
+
+        # Counters for the current process
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._planes: Optional[List[List[float]]] = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Caches written before answers were keyed by model are simply rebuilt
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(answers)")}
+        if columns and not {"model", "last_used"} <= columns:
+            self._conn.executescript("DROP TABLE answers; DROP TABLE IF EXISTS lsh_buckets;")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                sources_key TEXT NOT NULL,
+                model TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                answer_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_lsh_buckets ON lsh_buckets(band, bucket);
+            CREATE INDEX IF NOT EXISTS idx_lsh_answer ON lsh_buckets(answer_id);
+            CREATE INDEX IF NOT EXISTS idx_answers_sources ON answers(sources_key);
+            CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers(last_used);
+        """)
+        self._conn.commit()
+
+    # ========================================================================
+    # LSH
+    # ========================================================================
+
+    def _buckets(self, embedding: Sequence[float]) -> List[int]:
+        """One bucket number per band: the sign pattern of the band's hyperplanes"""
+        if self._planes is None or len(self._planes[0]) != len(embedding):
+            rng = random.Random(self.seed)
+            self._planes = [[rng.gauss(0, 1) for _ in embedding]
+                            for _ in range(self.num_bands * self.bits_per_band)]
+
+        bits = [sum(p * x for p, x in zip(plane, embedding)) >= 0 for plane in self._planes]
+        buckets = []
+        for band in range(self.num_bands):
+            bucket = 0
+            for bit in bits[band * self.bits_per_band:(band + 1) * self.bits_per_band]:
+                bucket = (bucket << 1) | bit
+            buckets.append(bucket)
+        return buckets
+
+    # ========================================================================
+    # LOOKUP / STORE
+    # ========================================================================
+
+    def lookup(self, embedding: Sequence[float], sources_key: str) -> Optional[Dict]:
+        """
+        Find a cached answer for a similar question with the same sources
+
+        Returns:
+            Dict with 'question', 'answer', 'sources' and 'similarity', or None
+        """
+        buckets = self._buckets(embedding)
+        threshold = max(self.threshold, min_threshold_for_dimension(len(embedding)))
+        now = time.time()
+        with self._lock:
+            clauses = " OR ".join("(band = ? AND bucket = ?)" for _ in buckets)
+            params = [value for band, bucket in enumerate(buckets) for value in (band, bucket)]
+            # Same sources, same model, same embedding size, not expired
+            rows = self._conn.execute(f"""
+                SELECT a.id, a.question, a.embedding, a.answer, a.sources FROM answers a
+                WHERE a.sources_key = ? AND a.model = ? AND length(a.embedding) = ?
+                  AND a.created >= ? AND a.id IN (
+                    SELECT answer_id FROM lsh_buckets WHERE {clauses}
+                )
+            """, [sources_key, self.model, 4 * len(embedding), self._expired_before(now)]
+                + params).fetchall()
+
+            best = None
+            for answer_id, question, blob, answer, sources in rows:
+                similarity = _cosine(embedding, array("f", blob))
+                if similarity >= threshold and (best is None or similarity > best["similarity"]):
+                    best = {
+                        "id": answer_id,
+                        "question": question,
+                        "answer": answer,
+                        "sources": json.loads(sources),
+                        "similarity": similarity,
+                    }
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, best.pop("id")))
+            self._conn.commit()
+        return best
+
+    def store(self, question: str, embedding: Sequence[float], sources_key: str,
+              answer: str, sources: List[Dict]) -> None:
+        """Cache an answer generated for `question` from the chunks in `sources_key`"""
+        buckets = self._buckets(embedding)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (question, embedding, sources_key, model, answer, sources, "
+                "created, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (question, array("f", embedding).tobytes(), sources_key, self.model, answer,
+                 json.dumps(sources), now, now),
+            )
+            self._conn.executemany(
+                "INSERT INTO lsh_buckets (band, bucket, answer_id) VALUES (?, ?, ?)",
+                [(band, bucket, cursor.lastrowid) for band, bucket in enumerate(buckets)],
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _expired_before(self, now: float) -> float:
+        """Answers created before this time have expired"""
+        return now - self.ttl if self.ttl is not None else float("-inf")
+
+    def _evict(self, now: float) -> None:
+        """Drop expired answers, then the least recently used beyond max_entries (lock held)"""
+        expired = self._conn.execute("SELECT id FROM answers WHERE created < ?",
+                                     (self._expired_before(now),)).fetchall()
+        (size,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        excess = size - len(expired) - self.max_entries
+        if excess > 0:
+            expired += self._conn.execute(
+                "SELECT id FROM answers WHERE created >= ? ORDER BY last_used LIMIT ?",
+                (self._expired_before(now), excess),
+            ).fetchall()
+        if expired:
+            self._conn.executemany("DELETE FROM answers WHERE id = ?", expired)
+            self._conn.executemany("DELETE FROM lsh_buckets WHERE answer_id = ?", expired)
+            self.evictions += len(expired)
+
+    def invalidate(self) -> None:
+        """Drop every cached answer (call whenever the collection changes)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.execute("DELETE FROM lsh_buckets")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        return size
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
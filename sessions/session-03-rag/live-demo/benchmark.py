@@ -0,0 +1,451 @@
+"""
+WCC AI Learning Series - Session 3: RAG Benchmark
+Latency, throughput and memory for every stage of the pipeline
+
+Replays a query log against a synthetic corpus built from SAMPLE_BLOGS
+(scaled to any number of chunks) and measures:
+
+- chunk_documents (in-process and with the process pool), generate_embeddings,
+  store_in_vectordb, BM25 build
+- semantic_search, hybrid_search, rag_query
+- the same steps through the starter template's RAGPipeline
+
+A sampled query log repeats a handful of questions, so query stages run
+twice: cold (query and answer caches cleared before every call, so each
+call pays for embedding and generation) and again as "<stage>.cached"
+with the caches warm. The two show miss and hit latency separately.
+
+Embedding and generation go through FakeGenAIClient (fake_genai.py), so the
+numbers describe our code, not the network. Add --embed-latency and
+--generate-latency to simulate the API.
+
+Each stage reports p50/p95/p99 latency per call, throughput, how far it
+raised the process's peak RSS (rss_growth_mb) and the cumulative peak so far
+(rss_peak_cumulative_mb), and everything is written to JSON for regression
+tracking.
+
+Usage:
+    python benchmark.py --chunks 1000 10000 --backend numpy
+    python benchmark.py --chunks 100000 --target demo --query-log queries.jsonl
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+from chunk_store import ChunkStore
+from fake_genai import FakeGenAIClient
+from sample_data import SAMPLE_BLOGS
+
+LIVE_DEMO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Documents per chunk_documents call. ParallelChunker splits inputs under
+# min_parallel_docs (256) in-process, so smaller batches never reach the pool.
+CHUNK_BATCH = 1024
+
+# Questions from the demos plus exact-term ones that exercise BM25
+DEFAULT_QUERIES = [
+    "How do I start learning Python?",
+    "What events did WCC host about web development?",
+    "Tell me about mentorship at WCC",
+    "What Python topics has WCC covered?",
+    "How can I transition from backend to AI engineering?",
+    "What advice do you have for mentees?",
+    "What cloud platforms were discussed?",
+    "Django REST Framework",
+    "How should a startup design its cloud architecture?",
+    "What is a good first Python program?",
+]
+
+
+# ============================================================================
+# SYNTHETIC CORPUS & QUERY LOG
+# ============================================================================
+
+def synthetic_blogs(num_blogs: int, seed: int = 42) -> Iterator[Dict]:
+    """
+    Yield blog posts shaped like SAMPLE_BLOGS, each a distinct variant
+
+    Variants reorder the paragraphs of a sample post and get their own
+    title and URL, so every post produces new chunk IDs and texts.
+    """
+    rng = random.Random(seed)
+    for i in range(num_blogs):
+        base = SAMPLE_BLOGS[i % len(SAMPLE_BLOGS)]
+        paragraphs = [p for p in base["content"].split("\n\n") if p.strip()]
+        rng.shuffle(paragraphs)
+        yield {
+            "title": f"{base['title']} (Edition {i // len(SAMPLE_BLOGS) + 1})",
+            "date": base["date"],
+            "url": f"{base['url']}-{i}",
+            "content": "\n\n".join(paragraphs),
+        }
+
+
+def blogs_for_chunks(num_chunks: int, chunk_fn) -> int:
+    """Number of synthetic posts needed for about `num_chunks` chunks"""
+    per_blog = len(chunk_fn(list(synthetic_blogs(len(SAMPLE_BLOGS))))) / len(SAMPLE_BLOGS)
+    return max(1, math.ceil(num_chunks / per_blog))
+
+
+def load_query_log(path: Optional[str], num_queries: int, seed: int = 42) -> List[str]:
+    """
+    Queries to replay, in order
+
+    Args:
+        path: File with one query per line, either plain text or JSON with a
+              "question" (or "query") field; None = sample DEFAULT_QUERIES
+        num_queries: Length of the sampled log when no file is given
+        seed: Seed for sampling
+
+    Returns:
+        List of query strings
+    """
+    if path:
+        queries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("{"):
+                    record = json.loads(line)
+                    line = record.get("question") or record.get("query")
+                queries.append(line)
+        return queries
+
+    # Real traffic is skewed: a few questions are asked far more often than the rest
+    rng = random.Random(seed)
+    weights = [1.0 / rank for rank in range(1, len(DEFAULT_QUERIES) + 1)]
+    return rng.choices(DEFAULT_QUERIES, weights=weights, k=num_queries)
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def _rss_high_water_mb() -> Optional[float]:
+    """Peak resident memory of this process so far (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@contextlib.contextmanager
+def quiet():
+    """Hide the progress prints of the functions being measured"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+class StageRecorder:
+    """
+    Collects per-call latencies and per-stage memory peaks
+
+    Usage:
+        recorder = StageRecorder(trace_memory=True)
+        with recorder.stage("semantic_search"):
+            for query in queries:
+                with recorder.call(items=1):
+                    semantic_search(query)
+        recorder.summary()
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, Dict] = {}
+        self._current: Optional[Dict] = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        # ru_maxrss only ever grows, so a stage's own cost is how far it raised the peak
+        self._current = {"latencies": [], "items": 0, "start": time.perf_counter(),
+                         "rss_before_mb": _rss_high_water_mb()}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            stage = self._current
+            stage["wall_s"] = time.perf_counter() - stage["start"]
+            stage["rss_peak_cumulative_mb"] = _rss_high_water_mb()
+            stage["rss_growth_mb"] = (stage["rss_peak_cumulative_mb"] - stage["rss_before_mb"]
+                                      if stage["rss_before_mb"] is not None else None)
+            stage["python_peak_mb"] = (tracemalloc.get_traced_memory()[1] / 1024 / 1024
+                                       if self.trace_memory else None)
+            self.stages[name] = stage
+            self._current = None
+
+    @contextlib.contextmanager
+    def call(self, items: int = 1):
+        """Time one call; set record["items"] inside the block if it is only known afterwards"""
+        record = {"items": items}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self._current["latencies"].append(time.perf_counter() - start)
+            self._current["items"] += record["items"]
+
+    def summary(self) -> Dict[str, Dict]:
+        results = {}
+        for name, stage in self.stages.items():
+            latencies_ms = np.asarray(stage["latencies"]) * 1000
+            p50, p95, p99 = (np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms)
+                             else (0.0, 0.0, 0.0))
+            results[name] = {
+                "calls": len(latencies_ms),
+                "items": stage["items"],
+                "total_s": round(stage["wall_s"], 4),
+                "items_per_s": round(stage["items"] / stage["wall_s"], 1) if stage["wall_s"] else None,
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3),
+                "rss_growth_mb": stage["rss_growth_mb"],
+                "rss_peak_cumulative_mb": stage["rss_peak_cumulative_mb"],
+                "python_peak_mb": stage["python_peak_mb"],
+            }
+        return results
+
+
+def _batched(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def chunk_in_batches(recorder: StageRecorder, name: str, chunk_fn: Callable[[List[Dict]], ChunkStore],
+                     documents: Iterable[Dict], chunks: ChunkStore) -> ChunkStore:
+    """Time `chunk_fn` on CHUNK_BATCH documents at a time, collecting into `chunks`"""
+    documents = iter(documents)
+    with recorder.stage(name), quiet():
+        while True:
+            batch = list(islice(documents, CHUNK_BATCH))
+            if not batch:
+                break
+            with recorder.call() as record:
+                batch_chunks = chunk_fn(batch)
+                record["items"] = len(batch_chunks)
+            chunks.extend(batch_chunks)
+    return chunks
+
+
+# ============================================================================
+# BENCHMARKS
+# ============================================================================
+
+def replay_queries(recorder: StageRecorder, name: str, run: Callable[[str], object],
+                   queries: List[str], clear_caches: Callable[[], None]) -> None:
+    """
+    Time `run` on every query twice: cold, then warm
+
+    Stage `name` clears the caches before every call (outside the timer),
+    so repeated queries still pay for embedding and generation. Stage
+    `name`.cached replays the same queries on warm caches.
+    """
+    with recorder.stage(name), quiet():
+        for query in queries:
+            clear_caches()
+            with recorder.call():
+                run(query)
+
+    clear_caches()
+    with recorder.stage(f"{name}.cached"), quiet():
+        for query in queries:
+            with recorder.call():
+                run(query)
+
+def benchmark_rag_demo(num_chunks: int, queries: List[str], recorder: StageRecorder,
+                       k: int = 5, embed_batch: int = 1000, store_batch: int = 5000,
+                       client: Optional[FakeGenAIClient] = None) -> Dict:
+    """Run every rag_demo stage on a corpus of about `num_chunks` chunks"""
+    with quiet():
+        import rag_demo
+
+    # Start from an empty store and cold caches
+    rag_demo.client = client or FakeGenAIClient()
+    rag_demo.get_vector_store().reset()
+    rag_demo.answer_cache.invalidate()
+    rag_demo.query_embedding_cache.clear()
+
+    # Chunk twice: in-process (max_workers=1) and with the process pool
+    num_blogs = blogs_for_chunks(num_chunks, rag_demo.chunk_documents)
+    chunk_in_batches(recorder, "chunk_documents.serial",
+                     lambda batch: rag_demo.chunk_documents(batch, max_workers=1),
+                     synthetic_blogs(num_blogs), ChunkStore())
+    chunks = chunk_in_batches(recorder, "chunk_documents", rag_demo.chunk_documents,
+                              synthetic_blogs(num_blogs), ChunkStore())
+
+    embeddings: List[List[float]] = []
+    with recorder.stage("generate_embeddings"), quiet():
+        for batch in _batched(chunks.texts(), embed_batch):
+            with recorder.call(items=len(batch)):
+                embeddings.extend(rag_demo.generate_embeddings(batch))
+
+    with recorder.stage("store_in_vectordb"), quiet():
+        for start in range(0, len(chunks), store_batch):
+            batch = chunks.take(range(start, min(start + store_batch, len(chunks))))
+            with recorder.call(items=len(batch)):
+                rag_demo.store_in_vectordb(batch, embeddings[start:start + store_batch])
+    del embeddings
+
+    with recorder.stage("bm25_build"):
+        with recorder.call(items=len(chunks)):
+            rag_demo.bm25_index.build(chunks.ids(), chunks.texts())
+
+    def clear_query_caches():
+        rag_demo.query_embedding_cache.clear()
+        rag_demo.answer_cache.invalidate()
+
+    stages = (("semantic_search", lambda query: rag_demo.semantic_search(query, k=k)),
+              ("hybrid_search", lambda query: rag_demo.hybrid_search(query, k=k)),
+              ("rag_query", lambda query: rag_demo.rag_query(query, k=k)))
+    for name, run in stages:
+        replay_queries(recorder, name, run, queries, clear_query_caches)
+
+    return {"chunks": len(chunks), "blogs": num_blogs,
+            "query_cache": rag_demo.query_embedding_cache.stats(),
+            "answer_cache": rag_demo.answer_cache.stats()}
+
+
+def benchmark_rag_pipeline(num_chunks: int, queries: List[str], recorder: StageRecorder,
+                           backend: str, k: int = 5, store_batch: int = 5000,
+                           client: Optional[FakeGenAIClient] = None) -> Dict:
+    """Run the starter template's RAGPipeline on a corpus of about `num_chunks` chunks"""
+    from rag_pipeline import RAGPipeline  # pip install -e ../starter-template
+
+    with quiet():
+        rag = RAGPipeline(project_id="benchmark", vector_backend=backend,
+                          client=client or FakeGenAIClient())
+        rag.reset()
+    rag.embedding_cache.clear()
+
+    documents = [{"title": blog["title"], "source": blog["url"], "content": blog["content"]}
+                 for blog in synthetic_blogs(blogs_for_chunks(
+                     num_chunks, lambda blogs: list(rag.iter_chunks(blogs))))]
+
+    chunks = chunk_in_batches(recorder, "pipeline.chunk_documents", rag.chunk_documents,
+                              documents, ChunkStore(offset_key=None))
+    del documents
+
+    with recorder.stage("pipeline.embed_and_store"), quiet():
+        for start in range(0, len(chunks), store_batch):
+            rag.chunks = chunks.take(range(start, min(start + store_batch, len(chunks))))
+            with recorder.call(items=len(rag.chunks)):
+                rag.embed_and_store(write_batch_size=min(store_batch, 500))
+
+    for name, method in (("pipeline.search", rag.search), ("pipeline.query", rag.query)):
+        replay_queries(recorder, name, lambda query: method(query, k=k), queries,
+                       rag.query_cache.clear)
+
+    return {"chunks": len(chunks), "query_cache": rag.query_cache.stats()}
+
+
+def print_summary(run: Dict) -> None:
+    print(f"\n{run['target']} - {run['chunks']:,} chunks ({run['backend']})")
+    print(f"{'stage':<28} {'calls':>6} {'items/s':>10} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'RSS +MB':>8} {'peak MB':>8}")
+    print("-" * 94)
+    for name, stage in run["stages"].items():
+        growth, peak = stage["rss_growth_mb"], stage["rss_peak_cumulative_mb"]
+        growth = f"{growth:.0f}" if growth is not None else "-"
+        peak = f"{peak:.0f}" if peak is not None else "-"
+        print(f"{name:<28} {stage['calls']:>6} {stage['items_per_s'] or 0:>10,.0f} "
+              f"{stage['p50_ms']:>9.3f} {stage['p95_ms']:>9.3f} {stage['p99_ms']:>9.3f} {growth:>8} {peak:>8}")
+
+
+# ============================================================================
+# MAIN EXECUTION
+# ============================================================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the RAG demo with local fakes")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000],
+                        help="Corpus sizes to benchmark (approximate chunk counts)")
+    parser.add_argument("--target", nargs="+", choices=["demo", "pipeline"],
+                        default=["demo", "pipeline"], help="rag_demo and/or RAGPipeline")
+    parser.add_argument("--backend", default="numpy", choices=["chroma", "numpy", "ann"],
+                        help="Vector store backend")
+    parser.add_argument("--query-log", help="Queries to replay (text or JSON lines)")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="Sampled queries when no --query-log is given")
+    parser.add_argument("--k", type=int, default=5, help="Chunks retrieved per query")
+    parser.add_argument("--embed-latency", type=float, default=0.0,
+                        help="Simulated seconds per embedding request")
+    parser.add_argument("--generate-latency", type=float, default=0.0,
+                        help="Simulated seconds per generation request")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also record Python heap peaks with tracemalloc (slower)")
+    parser.add_argument("--workdir", help="Where indexes and caches are written "
+                        "(default: a temporary directory, deleted afterwards)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    queries = load_query_log(args.query_log, args.queries)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag_benchmark_")
+    os.makedirs(workdir, exist_ok=True)
+
+    # rag_demo opens its caches on import and its vector store on first use,
+    # relative to the working directory: run it inside the scratch directory, offline
+    os.chdir(workdir)
+    os.environ["VECTOR_BACKEND"] = args.backend
+    os.environ.setdefault("GCP_PROJECT_ID", "benchmark")
+    if args.trace_memory:
+        tracemalloc.start()
+
+    runs = []
+    try:
+        for num_chunks in args.chunks:
+            for target in args.target:
+                client = FakeGenAIClient(args.embed_latency, args.generate_latency)
+                recorder = StageRecorder(trace_memory=args.trace_memory)
+                print(f"\n⏱️  Benchmarking {target} with ~{num_chunks:,} chunks...")
+                if target == "demo":
+                    info = benchmark_rag_demo(num_chunks, queries, recorder, k=args.k,
+                                              client=client)
+                else:
+                    info = benchmark_rag_pipeline(num_chunks, queries, recorder,
+                                                  args.backend, k=args.k, client=client)
+                run = {"target": target, "backend": args.backend, **info,
+                       "embed_calls": client.models.embed_calls,
+                       "generate_calls": client.models.generate_calls,
+                       "stages": recorder.summary()}
+                runs.append(run)
+                print_summary(run)
+    finally:
+        if not args.workdir:
+            os.chdir(LIVE_DEMO_DIR)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "config": {**vars(args), "num_queries": len(queries), "python": sys.version.split()[0],
+                   "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "runs": runs,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+WCC AI Learning Series - Session 3: BM25 Keyword Search
+Exact-term retrieval to complement embeddings
+
+Embeddings are great at meaning but can miss exact terms: a question about
+"Django REST Framework" or a speaker's name should find the chunk that
+contains those words, even if another chunk is "semantically closer".
+BM25 is the classic keyword ranking function used by search engines.
+
+The index is an inverted index with array-backed postings:
+
+    vocab["django"] = 17
+    postings for term 17 = doc_ids[offsets[17]:offsets[18]]
+                           term_freqs[offsets[17]:offsets[18]]
+
+Everything is stored as a few `.npy` arrays (memory-mapped on load) plus
+the vocabulary and chunk IDs as JSON.
+
+reciprocal_rank_fusion() merges BM25 and vector rankings into one list.
+"""
+
+import json
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens ("Django REST" -> ["django", "rest"])"""
+    return _TOKEN.findall(text.casefold())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk texts
+
+    Usage:
+        index = BM25Index("./bm25_index")       # loads the saved index, if any
+        index.build(chunk_ids, chunk_texts)     # (re)build and save
+        index.search("Django REST Framework", k=10)  # [(chunk_id, score), ...]
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            path: Directory to save the index in (None = memory only)
+            k1: Term-frequency saturation (higher = repeated terms count more)
+            b: Length normalization (0 = none, 1 = full)
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        self.ids: List[str] = []
+        self.vocab: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.term_freqs = np.zeros(0, dtype=np.uint16)
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+
+        if path and os.path.exists(os.path.join(path, "meta.json")):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ========================================================================
+    # BUILD
+    # ========================================================================
+
+    def build(self, ids: Sequence[str], texts: Sequence[str]) -> None:
+        """Index `texts` (one per chunk ID) and save to disk, replacing any previous index"""
+        vocab: Dict[str, int] = {}
+        term_ids, doc_ids, counts = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc] = len(tokens)
+            frequencies: Dict[int, int] = {}
+            for token in tokens:
+                term = vocab.setdefault(token, len(vocab))
+                frequencies[term] = frequencies.get(term, 0) + 1
+            term_ids.extend(frequencies)
+            doc_ids.extend([doc] * len(frequencies))
+            counts.extend(frequencies.values())
+
+        # Group postings by term: one sort instead of a list per term
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(term_ids, minlength=len(vocab)))]).astype(np.int64)
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)[order]
+        self.term_freqs = np.minimum(np.asarray(counts), 65535).astype(np.uint16)[order]
+        self.doc_lengths = doc_lengths
+        self.vocab = vocab
+        self.ids = list(ids)
+
+        if self.path:
+            self._save()
+
+    def _save(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        for name in ("offsets", "doc_ids", "term_freqs", "doc_lengths"):
+            np.save(os.path.join(self.path, f"{name}.tmp.npy"), getattr(self, name))
+            os.replace(os.path.join(self.path, f"{name}.tmp.npy"),
+                       os.path.join(self.path, f"{name}.npy"))
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "vocab": list(self.vocab)}, f)
+
+    def _load(self) -> None:
+        with open(os.path.join(self.path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.ids = meta["ids"]
+        self.vocab = {term: i for i, term in enumerate(meta["vocab"])}
+        for name in ("offsets", "doc_ids", "term_freqs", "doc_lengths"):
+            setattr(self, name, np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r"))
+
+    # ========================================================================
+    # SEARCH
+    # ========================================================================
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Top k chunks for `query` by BM25 score
+
+        Returns:
+            List of (chunk_id, score), best first; chunks sharing no term
+            with the query are never returned
+        """
+        n = len(self.ids)
+        terms = [self.vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        if n == 0 or not terms or k <= 0:
+            return []
+
+        doc_lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / max(doc_lengths.mean(), 1.0))
+        scores = np.zeros(n, dtype=np.float32)
+
+        for term in terms:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.doc_ids[start:end]
+            tf = np.asarray(self.term_freqs[start:end], dtype=np.float32)
+            idf = np.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            # Each doc appears once per term, so plain fancy-index += is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        k = min(k, len(matched))
+        if k == 0:
+            return []
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[doc], float(scores[doc])) for doc in top]
+
+
+# ============================================================================
+# RANK FUSION
+# ============================================================================
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge several ranked lists of IDs into one
+
+    Each ID scores sum(1 / (k + rank)) over the lists it appears in, so items
+    ranked well by both retrievers rise to the top. Only ranks are used, which
+    means BM25 scores and cosine distances never need to be put on one scale.
+
+    Args:
+        rankings: Ranked ID lists, best first
+        k: Damping constant (60 is the value from the original RRF paper)
+
+    Returns:
+        List of (id, fused score), best first
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
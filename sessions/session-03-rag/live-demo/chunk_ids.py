@@ -0,0 +1,52 @@
+"""
+WCC AI Learning Series - Session 3: Stable Chunk IDs
+Deterministic chunk IDs for incremental, idempotent ingestion
+
+Positional IDs like `chunk_0`, `chunk_1`, ... change meaning every time the
+corpus changes, so re-running setup either collides with what is already
+stored or forces a full rebuild. Deriving the ID from the document URL, the
+chunk's offset and a hash of its text means:
+
+- An unchanged chunk always gets the same ID (nothing to do)
+- An edited chunk gets a new ID (embed + upsert it, delete the old one)
+- A chunk of a deleted post simply disappears from the new ID set
+"""
+
+import hashlib
+from typing import Iterable, List, Set, Tuple
+
+
+def hash16(value: str) -> str:
+    """First 16 hex digits of the SHA-1 of `value` (one part of a chunk ID)"""
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:16]
+
+
+def make_chunk_id(url: str, start: int, text: str) -> str:
+    """
+    Build a deterministic chunk ID
+
+    Args:
+        url: Source document URL (or any stable document key)
+        start: Character offset of the chunk in the source document
+        text: Chunk text
+
+    Returns:
+        ID like "3f2a9c1d0b7e4a55-000412-9e107d9d372bb682"
+    """
+    return f"{hash16(url)}-{start:06d}-{hash16(text)}"
+
+
+def diff_chunk_ids(new_ids: Iterable[str], existing_ids: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    Compare the IDs we want to store with the IDs already stored
+
+    Returns:
+        (ids to add, ids to delete) - unchanged IDs appear in neither list
+    """
+    new_ids = list(dict.fromkeys(new_ids))
+    existing: Set[str] = set(existing_ids)
+    wanted = set(new_ids)
+
+    to_add = [chunk_id for chunk_id in new_ids if chunk_id not in existing]
+    to_delete = sorted(existing - wanted)
+    return to_add, to_delete
@@ -0,0 +1,187 @@
+"""
+WCC AI Learning Series - Session 3: Compact Chunk Store
+Chunks as offsets into their document, not copies of its text
+
+A chunk dict ({"id", "text", "metadata": {...}}) costs a copy of the chunk
+text (overlap makes the copies ~12% bigger than the corpus) plus several
+hundred bytes of dict and string overhead. ChunkStore keeps instead:
+
+- one text buffer and one metadata dict per document
+- per chunk, a few numbers in typed arrays: document, start, end, and
+  8 bytes of the text hash used in the chunk ID
+
+Chunk dicts are only built when someone asks for one, e.g. a batch that is
+about to be embedded or a search result going into a prompt. Indexing,
+slicing and iterating all give plain dicts, so code written for a list of
+chunk dicts keeps working.
+"""
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from chunk_ids import hash16
+from parallel_chunking import Span
+
+
+class ChunkStore:
+    """
+    Sequence of chunks backed by per-document buffers and array columns
+
+    Usage:
+        store = ChunkStore()
+        store.add_document(url, {"title": ..., "url": url}, full_text, spans)
+        len(store), store[0]["text"], store.ids()
+        for batch in store.batches(500):   # lists of chunk dicts
+            ...
+    """
+
+    def __init__(self, offset_key: Optional[str] = "start_index"):
+        """
+        Args:
+            offset_key: Metadata key for the chunk's offset in its document
+                        (None = leave it out of the metadata)
+        """
+        self.offset_key = offset_key
+
+        # Per document
+        self._texts: List[str] = []
+        self._metadata: List[Dict] = []
+        self._key_hashes: List[str] = []
+        self._first_row = array("q", [0])  # chunks of doc d: rows _first_row[d]:_first_row[d + 1]
+
+        # Per chunk
+        self._doc = array("l")
+        self._start = array("q")
+        self._end = array("q")            # -1 = text kept in _literal (not an exact slice)
+        self._digest = bytearray()        # 8 bytes per chunk (the text hash in the ID)
+        self._literal: Dict[int, str] = {}
+
+        # Selection made by take() (None = every chunk, in order)
+        self._rows: Optional[array] = None
+
+    # ========================================================================
+    # BUILD
+    # ========================================================================
+
+    def add_document(self, key: str, metadata: Dict, text: str, spans: Iterable[Span]) -> None:
+        """
+        Add one document and its chunks
+
+        Args:
+            key: Stable document key for chunk IDs (usually the URL)
+            metadata: Shared by every chunk of the document
+            text: The full text the spans point into
+            spans: (start, end) per chunk, from parallel_chunking.split_spans()
+        """
+        if self._rows is not None:
+            raise TypeError("Can't add documents to a view; add them to the full store")
+        doc = len(self._texts)
+        self._texts.append(text)
+        self._metadata.append(dict(metadata))
+        self._key_hashes.append(hash16(key))
+
+        for start, end in spans:
+            row = len(self._doc)
+            chunk_text = text[start:end] if isinstance(end, int) else end
+            if not isinstance(end, int):
+                self._literal[row] = end
+                end = -1
+            self._doc.append(doc)
+            self._start.append(start)
+            self._end.append(end)
+            self._digest += bytes.fromhex(hash16(chunk_text))
+        self._first_row.append(len(self._doc))
+
+    def extend(self, other: "ChunkStore") -> None:
+        """Append every document of another (full) store"""
+        if self._rows is not None or other._rows is not None:
+            raise TypeError("Can't extend with or into a view")
+        doc_offset, row_offset = len(self._texts), len(self._doc)
+        self._texts.extend(other._texts)
+        self._metadata.extend(other._metadata)
+        self._key_hashes.extend(other._key_hashes)
+        self._first_row.extend(row + row_offset for row in other._first_row[1:])
+        self._doc.extend(doc + doc_offset for doc in other._doc)
+        self._start.extend(other._start)
+        self._end.extend(other._end)
+        self._digest += other._digest
+        self._literal.update({row + row_offset: text for row, text in other._literal.items()})
+
+    def take(self, indices: Iterable[int]) -> "ChunkStore":
+        """A view of some chunks (shares all buffers; nothing is copied)"""
+        view = ChunkStore.__new__(ChunkStore)
+        view.__dict__.update(self.__dict__)
+        view._rows = array("q", (self._row(i) for i in indices))
+        return view
+
+    # ========================================================================
+    # ACCESS
+    # ========================================================================
+
+    def __len__(self) -> int:
+        return len(self._rows) if self._rows is not None else len(self._doc)
+
+    def _row(self, i: int) -> int:
+        return self._rows[i] if self._rows is not None else i
+
+    def _rows_range(self) -> Iterable[int]:
+        return self._rows if self._rows is not None else range(len(self._doc))
+
+    def _text(self, row: int) -> str:
+        end = self._end[row]
+        if end < 0:
+            return self._literal[row]
+        return self._texts[self._doc[row]][self._start[row]:end]
+
+    def _id(self, row: int) -> str:
+        digest = self._digest[row * 8:row * 8 + 8].hex()
+        return f"{self._key_hashes[self._doc[row]]}-{self._start[row]:06d}-{digest}"
+
+    def _metadata_for(self, row: int) -> Dict:
+        doc = self._doc[row]
+        first = self._first_row[doc]
+        metadata = dict(self._metadata[doc])
+        metadata["chunk_id"] = row - first
+        metadata["total_chunks"] = self._first_row[doc + 1] - first
+        if self.offset_key:
+            metadata[self.offset_key] = self._start[row]
+        return metadata
+
+    def _chunk(self, row: int) -> Dict:
+        return {"id": self._id(row), "text": self._text(row), "metadata": self._metadata_for(row)}
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Dict, List[Dict]]:
+        if isinstance(index, slice):
+            return [self._chunk(self._row(i)) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        return self._chunk(self._row(index))
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in self._rows_range():
+            yield self._chunk(row)
+
+    def ids(self) -> List[str]:
+        """Every chunk ID, without building chunk dicts"""
+        return [self._id(row) for row in self._rows_range()]
+
+    def texts(self, indices: Optional[Sequence[int]] = None) -> List[str]:
+        """Chunk texts (all, or just `indices`), sliced from the document buffers"""
+        rows = self._rows_range() if indices is None else (self._row(i) for i in indices)
+        return [self._text(row) for row in rows]
+
+    def metadatas(self) -> List[Dict]:
+        return [self._metadata_for(row) for row in self._rows_range()]
+
+    def batches(self, size: int) -> Iterator[List[Dict]]:
+        """Chunk dicts in lists of `size`, built one batch at a time"""
+        for start in range(0, len(self), size):
+            yield self[start:start + size]
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the chunk columns (document texts not included)"""
+        columns = (self._doc, self._start, self._end, self._first_row)
+        return (sum(column.itemsize * len(column) for column in columns) + len(self._digest)
+                + sum(len(text) for text in self._literal.values()))
@@ -0,0 +1,158 @@
+"""
+WCC AI Learning Series - Session 3: Context Packing
+Fit the most useful retrieved text into a token budget
+
+Concatenating all k retrieved chunks wastes prompt tokens: neighbouring
+chunks of one post repeat their overlap, and a long, weak match costs as
+much as a short, strong one. pack_context():
+
+1. Drops repeated chunks (same ID, or text already covered by another chunk)
+2. Merges chunks that are adjacent in the same document (consecutive
+   chunk_id, or overlapping offsets) into one span, removing the overlap
+3. Picks spans by relevance per token until the budget is full
+4. Returns them best-first, so [Source N] numbering still follows relevance
+
+Every packed span keeps the IDs of the chunks it was built from, so sources
+and citations still point at real chunks.
+"""
+
+from typing import Dict, List, Optional
+
+from token_counter import TokenCounter, get_token_counter
+
+# Longest overlap looked for when merging chunks without offsets (characters)
+MAX_OVERLAP_CHARS = 2000
+
+
+def relevance(doc: Dict) -> float:
+    """Higher = more relevant: the fused 'score' if present, else from 'distance'"""
+    if doc.get('score') is not None:
+        return doc['score']
+    if doc.get('distance') is not None:
+        return 1.0 / (1.0 + max(doc['distance'], 0.0))
+    return 0.0
+
+
+def document_key(metadata: Dict) -> str:
+    """Which document a chunk came from (URL, else source + title)"""
+    return metadata.get('url') or f"{metadata.get('source', '')}/{metadata.get('title', '')}"
+
+
+def merge_texts(first: str, second: str, offset: Optional[int] = None) -> str:
+    """
+    Join two neighbouring chunks without repeating their overlap
+
+    Args:
+        first, second: Chunk texts, `second` starting at or after `first`
+        offset: Where `second` starts relative to the start of `first`, if known
+    """
+    if offset is not None:
+        if offset + len(second) <= len(first):
+            return first  # `second` is inside `first`
+        if offset <= len(first):
+            return first + second[len(first) - offset:]
+        return first + "\n" + second
+
+    # No offsets: the longest suffix of `first` that is a prefix of `second`
+    for size in range(min(len(first), len(second), MAX_OVERLAP_CHARS), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + "\n" + second
+
+
+def pack_context(docs: List[Dict], max_tokens: int, counter: Optional[TokenCounter] = None,
+                 offset_key: str = 'start_index') -> List[Dict]:
+    """
+    Select, de-duplicate and merge retrieved chunks to fit `max_tokens`
+
+    Args:
+        docs: Search results, best first ('id', 'text', 'metadata' with
+              'title' and 'chunk_id', and 'score' or 'distance')
+        max_tokens: Token budget for the packed chunk texts
+        counter: Token counter (default: the shared one)
+        offset_key: Metadata key with each chunk's offset in its document
+
+    Returns:
+        Packed spans, best first. Each is a result dict whose 'text' may
+        cover several chunks, listed in 'ids' (its 'id' is the best one)
+    """
+    counter = counter or get_token_counter()
+
+    # 1. One entry per chunk, remembering its rank
+    unique: Dict[str, Dict] = {}
+    for rank, doc in enumerate(docs):
+        if doc['id'] not in unique:
+            unique[doc['id']] = dict(doc, rank=rank, relevance=relevance(doc))
+
+    # 2. Merge runs of neighbouring chunks within each document
+    by_document: Dict[str, List[Dict]] = {}
+    for doc in unique.values():
+        by_document.setdefault(document_key(doc['metadata']), []).append(doc)
+
+    spans = []
+    for chunks in by_document.values():
+        chunks.sort(key=lambda doc: (doc['metadata'].get(offset_key, 0), doc['metadata'].get('chunk_id', 0)))
+        span = None
+        for doc in chunks:
+            if span is not None and _adjacent(span, doc, offset_key):
+                offset = _offset(span, doc, offset_key)
+                span['text'] = merge_texts(span['text'], doc['text'], offset)
+                if span['end'] is not None:
+                    span['end'] = max(span['end'], _end(doc, offset_key))
+                    span['start'] = span['end'] - len(span['text'])  # keeps later offsets aligned
+                span['last_chunk'] = doc['metadata'].get('chunk_id')
+                span['members'].append(doc)
+                continue
+            span = {'text': doc['text'], 'members': [doc], 'start': doc['metadata'].get(offset_key),
+                    'end': _end(doc, offset_key), 'last_chunk': doc['metadata'].get('chunk_id')}
+            spans.append(span)
+
+    # 3. Best relevance per token first, while the budget lasts
+    counts = counter.count_batch([span['text'] for span in spans])
+    for span, count in zip(spans, counts):
+        span['tokens'] = count
+        span['value'] = sum(doc['relevance'] for doc in span['members'])
+    chosen, used = [], 0
+    for span in sorted(spans, key=lambda span: span['value'] / max(span['tokens'], 1), reverse=True):
+        if used + span['tokens'] <= max_tokens or not chosen:
+            chosen.append(span)
+            used += span['tokens']
+
+    # 4. Back to relevance order, as result dicts
+    packed = []
+    for span in sorted(chosen, key=lambda span: min(doc['rank'] for doc in span['members'])):
+        members = sorted(span['members'], key=lambda doc: doc['rank'])
+        best = members[0]
+        distances = [doc['distance'] for doc in members if doc.get('distance') is not None]
+        packed.append({
+            'id': best['id'],
+            'ids': [doc['id'] for doc in members],
+            'text': span['text'],
+            'metadata': dict(min(span['members'], key=lambda doc: doc['metadata'].get('chunk_id', 0))['metadata']),
+            'distance': min(distances) if distances else None,
+            'score': span['value'],
+            'tokens': span['tokens'],
+        })
+    return packed
+
+
+def _end(doc: Dict, offset_key: str) -> Optional[int]:
+    start = doc['metadata'].get(offset_key)
+    return None if start is None else start + len(doc['text'])
+
+
+def _offset(span: Dict, doc: Dict, offset_key: str) -> Optional[int]:
+    """Start of `doc` relative to the start of the span's text"""
+    start = doc['metadata'].get(offset_key)
+    if start is None or span['start'] is None:
+        return None
+    return start - span['start']
+
+
+def _adjacent(span: Dict, doc: Dict, offset_key: str) -> bool:
+    """Does `doc` continue (or overlap) the span?"""
+    start = doc['metadata'].get(offset_key)
+    if start is not None and span['end'] is not None and start <= span['end']:
+        return True
+    chunk_id, last = doc['metadata'].get('chunk_id'), span['last_chunk']
+    return chunk_id is not None and last is not None and chunk_id - last <= 1
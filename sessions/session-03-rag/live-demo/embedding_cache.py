@@ -0,0 +1,196 @@
+"""
+WCC AI Learning Series - Session 3: Embedding Cache
+Persistent, content-addressed cache for chunk embeddings
+
+An embedding only depends on the model, the output dimensionality and the
+text itself, so once a chunk has been embedded we never need to pay for it
+again. Entries are stored in a small SQLite file and keyed by a hash of those
+three values:
+
+- Re-ingesting an unchanged corpus makes zero embedding calls
+- Editing 1% of the corpus only re-embeds that 1%
+- The least recently used entries are evicted once `max_entries` is reached
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Sequence
+
+# SQLite limits the number of "?" parameters in a single statement
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache backed by SQLite
+
+    Usage:
+        cache = EmbeddingCache("./embedding_cache.sqlite")
+        embeddings = cache.embed(texts, "text-embedding-004", 10, embed_fn)
+        print(cache.stats())
+    """
+
+    def __init__(self, path: str = "./embedding_cache.sqlite", max_entries: int = 100_000):
+        """
+        Open (or create) the cache
+
+        Args:
+            path: SQLite file to store embeddings in
+            max_entries: Evict least recently used entries beyond this size
+        """
+        self.path = path
+        self.max_entries = max_entries
+
+        # Counters for the current process
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, output_dimensionality: int, text: str) -> str:
+        """Content address for one embedding: hash(model, dimensionality, text)"""
+        digest = hashlib.sha256()
+        digest.update(f"{model}\x00{output_dimensionality}\x00".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    # ========================================================================
+    # LOW-LEVEL GET / PUT
+    # ========================================================================
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Look up embeddings by key
+
+        Returns:
+            Dict of key -> embedding for the keys that are cached
+        """
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = list(keys[i:i + _SQL_BATCH])
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+
+                # Touch hits so eviction drops the least recently used entries
+                hit_keys = [(now, key) for key, _ in rows]
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", hit_keys)
+            self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+        """Store embeddings by key, evicting old entries if the cache is full"""
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries beyond max_entries (lock held)"""
+        (size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = size - self.max_entries
+        if overflow > 0:
+            self._conn.execute("""
+                DELETE FROM embeddings WHERE key IN (
+                    SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?
+                )
+            """, (overflow,))
+            self.evictions += overflow
+
+    # ========================================================================
+    # HIGH-LEVEL EMBED
+    # ========================================================================
+
+    def embed(self, texts: Sequence[str], model: str, output_dimensionality: int,
+              embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """
+        Return embeddings for `texts`, calling `embed_fn` only for cache misses
+
+        Args:
+            texts: Texts to embed
+            model: Embedding model name (part of the cache key)
+            output_dimensionality: Embedding size (part of the cache key)
+            embed_fn: Function that embeds a list of texts (only gets misses)
+
+        Returns:
+            List of embeddings in the same order as `texts`
+        """
+        keys = [self.make_key(model, output_dimensionality, text) for text in texts]
+        found = self.get_many(list(dict.fromkeys(keys)))
+
+        # Embed each missing text once, even if it appears several times
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        hit_count = sum(1 for key in keys if key in found)
+        self.hits += hit_count
+        self.misses += len(keys) - hit_count
+
+        if missing:
+            new_embeddings = embed_fn(list(missing.values()))
+            fresh = dict(zip(missing.keys(), new_embeddings))
+            self.put_many(fresh)
+            found.update(fresh)
+
+        return [list(found[key]) for key in keys]
+
+    # ========================================================================
+    # UTILITIES
+    # ========================================================================
+
+    def __len__(self) -> int:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return size
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus the current cache size"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def clear(self) -> None:
+        """Remove every cached embedding"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
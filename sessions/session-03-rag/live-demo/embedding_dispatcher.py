@@ -0,0 +1,186 @@
+"""
+WCC AI Learning Series - Session 3: Embedding Dispatcher
+Concurrent, rate-limit aware embedding generation
+
+Sending batches of 5 texts one after another means ingest time is
+(number of batches) x (round-trip latency). The dispatcher instead:
+
+1. Packs texts into the largest batches the model accepts per request
+2. Keeps several batches in flight on a bounded thread pool
+3. Retries 429 / 5xx responses with exponential backoff and full jitter
+4. Returns embeddings in the same order as the input texts
+
+It works with anything that looks like `genai.Client` (a `.models.embed_content`
+method), including the local fake server in `fake_genai.py`.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Sequence, Tuple
+
+from google.genai import types
+
+# Per-request limits: (max texts per request, max input tokens per request)
+MODEL_LIMITS = {
+    "text-embedding-004": (250, 20_000),
+    "text-embedding-005": (250, 20_000),
+    "text-multilingual-embedding-002": (250, 20_000),
+    "gemini-embedding-001": (1, 2_048),
+}
+DEFAULT_LIMITS = (5, 20_000)
+
+# HTTP status codes worth retrying (rate limited / temporarily unavailable)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Rough token estimate, kept pessimistic so batches stay under the limit
+CHARS_PER_TOKEN = 3
+
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an API error (google-genai uses .code, others .status_code)"""
+    for attr in ("code", "status_code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+class EmbeddingDispatcher:
+    """
+    Embed many texts with several requests in flight
+
+    Usage:
+        dispatcher = EmbeddingDispatcher(client, "text-embedding-004", output_dimensionality=10)
+        embeddings = dispatcher.embed(texts)
+    """
+
+    def __init__(self, client, model: str, output_dimensionality: int = 10,
+                 max_workers: int = 8, batch_size: Optional[int] = None,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 32.0,
+                 verbose: bool = True):
+        """
+        Args:
+            client: genai.Client (or a compatible fake)
+            model: Embedding model name
+            output_dimensionality: Embedding size to request
+            max_workers: Maximum number of requests in flight
+            batch_size: Max texts per request (default: the model's limit)
+            max_retries: Retries per batch for 429 / 5xx responses
+            base_delay: First backoff delay in seconds
+            max_delay: Upper bound for a single backoff delay
+            verbose: Print progress while embedding
+        """
+        self.client = client
+        self.model = model
+        self.output_dimensionality = output_dimensionality
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.verbose = verbose
+
+        self.max_texts, self.max_tokens = MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+        self.batch_size = min(batch_size, self.max_texts) if batch_size else self.max_texts
+
+        # Counters (across all calls)
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    # ========================================================================
+    # BATCHING
+    # ========================================================================
+
+    def make_batches(self, texts: Sequence[str], batch_size: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Split texts into request-sized batches
+
+        A batch is closed when it reaches the per-request text limit or its
+        estimated token count would exceed the per-request token limit.
+        An override larger than the model's text limit is capped at it.
+
+        Returns:
+            List of (start, end) index ranges into `texts`
+        """
+        batch_size = min(batch_size, self.max_texts) if batch_size else self.batch_size
+        batches = []
+        start = 0
+        tokens = 0
+        for i, text in enumerate(texts):
+            text_tokens = len(text) // CHARS_PER_TOKEN + 1
+            if i > start and (i - start >= batch_size or tokens + text_tokens > self.max_tokens):
+                batches.append((start, i))
+                start, tokens = i, 0
+            tokens += text_tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    # ========================================================================
+    # EMBEDDING
+    # ========================================================================
+
+    def embed(self, texts: Sequence[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """
+        Embed `texts`, keeping up to `max_workers` requests in flight
+
+        Args:
+            texts: Texts to embed
+            batch_size: Override the max texts per request for this call
+
+        Returns:
+            List of embeddings in the same order as `texts`
+        """
+        texts = list(texts)
+        batches = self.make_batches(texts, batch_size)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        if len(batches) <= 1:
+            for start, end in batches:
+                results[start:end] = self._embed_batch(texts[start:end])
+            return results
+
+        done = 0
+        report_every = max(1, len(texts) // 10)
+        next_report = report_every
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(self._embed_batch, texts[start:end]): (start, end)
+                for start, end in batches
+            }
+            for future in as_completed(futures):
+                start, end = futures[future]
+                results[start:end] = future.result()
+
+                done += end - start
+                if self.verbose and done >= next_report:
+                    print(f"  Processed {done}/{len(texts)} chunks")
+                    next_report += report_every
+
+        return results
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embed one batch, backing off and retrying on 429 / 5xx"""
+        attempt = 0
+        while True:
+            try:
+                with self._lock:
+                    self.requests += 1
+                response = self.client.models.embed_content(
+                    model=self.model,
+                    contents=batch,
+                    config=types.EmbedContentConfig(output_dimensionality=self.output_dimensionality),
+                )
+                return [emb.values for emb in response.embeddings]
+            except Exception as error:
+                if status_code(error) not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    raise
+                with self._lock:
+                    self.retries += 1
+
+                # Exponential backoff with full jitter spreads retries out
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                time.sleep(random.uniform(0, delay))
+                attempt += 1
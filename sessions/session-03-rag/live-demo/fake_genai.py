@@ -0,0 +1,294 @@
+"""
+WCC AI Learning Series - Session 3: Local Fakes
+Offline stand-ins for the Vertex AI embedding API
+
+Useful for testing and load-testing the ingestion code without a GCP project
+or quota:
+
+- fake_embedding(): deterministic embedding for a text
+- FakeEmbeddingServer: local HTTP server with configurable latency,
+  per-request limits and injected 429 (rate limit) responses
+- HTTPEmbeddingClient: talks to the fake server but looks like genai.Client
+  (client.models.embed_content), so it can be passed anywhere a real client goes
+- FakeGenAIClient: in-process genai.Client look-alike for embedding and
+  generation, with optional simulated latency (used by benchmark.py); its
+  `client.aio.models` side sleeps with asyncio instead of blocking
+
+Run the server on its own with:
+    python fake_genai.py --port 8765 --latency 0.2 --rate-limit 0.1
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import List
+
+
+def fake_embedding(text: str, dimensionality: int = 10) -> List[float]:
+    """Deterministic, unit-length pseudo-embedding derived from a hash of the text"""
+    values = []
+    counter = 0
+    while len(values) < dimensionality:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        values.extend((byte - 127.5) / 127.5 for byte in digest)
+        counter += 1
+    values = values[:dimensionality]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+# ============================================================================
+# FAKE EMBEDDING SERVER
+# ============================================================================
+
+class FakeEmbeddingServer:
+    """
+    Local HTTP embedding server
+
+    POST /embed  {"model": ..., "texts": [...], "output_dimensionality": 10}
+      -> 200 {"embeddings": [[...], ...]}
+      -> 429 when a rate-limit response is injected
+      -> 400 when more than `max_batch` texts are sent
+
+    Usage:
+        with FakeEmbeddingServer(latency=0.1, rate_limit_probability=0.2) as server:
+            client = HTTPEmbeddingClient(server.url)
+            ...
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 rate_limit_probability: float = 0.0, max_batch: int = 250, seed: int = 0):
+        self.latency = latency
+        self.rate_limit_probability = rate_limit_probability
+        self.max_batch = max_batch
+
+        # Counters
+        self.requests = 0
+        self.rate_limited = 0
+        self.texts_embedded = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, payload = server.handle_embed(body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Keep test output quiet
+
+        return Handler
+
+    def handle_embed(self, body: dict):
+        """Return (status, payload) for one /embed request"""
+        with self._lock:
+            self.requests += 1
+            rate_limited = self._random.random() < self.rate_limit_probability
+            if rate_limited:
+                self.rate_limited += 1
+
+        if rate_limited:
+            return 429, {"error": {"code": 429, "message": "Resource exhausted (fake)"}}
+
+        texts = body.get("texts", [])
+        if len(texts) > self.max_batch:
+            return 400, {"error": {"code": 400, "message": f"At most {self.max_batch} texts per request"}}
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        dimensionality = body.get("output_dimensionality") or 10
+        with self._lock:
+            self.texts_embedded += len(texts)
+        return 200, {"embeddings": [fake_embedding(text, dimensionality) for text in texts]}
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def start(self) -> "FakeEmbeddingServer":
+        """Serve from a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ============================================================================
+# CLIENT FOR THE FAKE SERVER
+# ============================================================================
+
+class FakeAPIError(Exception):
+    """Error from the fake server; `.code` matches google.genai.errors.APIError"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class _HTTPModels:
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def embed_content(self, model: str, contents: List[str], config=None):
+        payload = json.dumps({
+            "model": model,
+            "texts": list(contents),
+            "output_dimensionality": getattr(config, "output_dimensionality", None),
+        }).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.base_url}/embed", data=payload,
+            headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            raise FakeAPIError(error.code, error.read().decode("utf-8", "replace")) from None
+
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=v) for v in body["embeddings"]])
+
+
+class HTTPEmbeddingClient:
+    """genai.Client look-alike that embeds through a FakeEmbeddingServer"""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.models = _HTTPModels(base_url.rstrip("/"), timeout)
+
+
+# ============================================================================
+# IN-PROCESS FAKE CLIENT
+# ============================================================================
+
+class _FakeModels:
+    def __init__(self, embed_latency: float, generate_latency: float):
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.embed_calls = 0
+        self.generate_calls = 0
+
+    def embed_content(self, model: str, contents: List[str], config=None):
+        if self.embed_latency:
+            time.sleep(self.embed_latency)
+        return self._embed(contents, config)
+
+    def generate_content(self, model: str, contents, config=None):
+        if self.generate_latency:
+            time.sleep(self.generate_latency)
+        return SimpleNamespace(text=self._answer(contents))
+
+    def generate_content_stream(self, model: str, contents, config=None):
+        """The generate_content answer, a word at a time (latency spread across the words)"""
+        words = self._answer(contents).split(" ")
+        for i, word in enumerate(words):
+            if self.generate_latency:
+                time.sleep(self.generate_latency / len(words))
+            yield SimpleNamespace(text=word if i == 0 else " " + word)
+
+    def _embed(self, contents: List[str], config=None):
+        self.embed_calls += 1
+        dimensionality = getattr(config, "output_dimensionality", None) or 10
+        return SimpleNamespace(embeddings=[
+            SimpleNamespace(values=fake_embedding(text, dimensionality)) for text in contents])
+
+    def _answer(self, contents) -> str:
+        self.generate_calls += 1
+        prompt = contents[0] if isinstance(contents, list) else contents
+        digest = hashlib.sha256(str(prompt).encode("utf-8")).hexdigest()[:8]
+        return f"Fake answer {digest} based on the context [Source 1]."
+
+
+class _FakeAsyncModels:
+    """client.aio.models: the same responses, awaiting the latency instead of sleeping"""
+
+    def __init__(self, models: _FakeModels):
+        self._models = models
+
+    async def embed_content(self, model: str, contents: List[str], config=None):
+        if self._models.embed_latency:
+            await asyncio.sleep(self._models.embed_latency)
+        return self._models._embed(contents, config)
+
+    async def generate_content(self, model: str, contents, config=None):
+        if self._models.generate_latency:
+            await asyncio.sleep(self._models.generate_latency)
+        return SimpleNamespace(text=self._models._answer(contents))
+
+
+class FakeGenAIClient:
+    """
+    Deterministic genai.Client look-alike that never leaves the process
+
+    Usage:
+        client = FakeGenAIClient(embed_latency=0.05, generate_latency=0.5)
+        client.models.embed_content(model=..., contents=["text"], config=...)
+        client.models.generate_content(model=..., contents=[prompt])
+        client.models.generate_content_stream(model=..., contents=[prompt])
+        await client.aio.models.generate_content(model=..., contents=[prompt])
+    """
+
+    def __init__(self, embed_latency: float = 0.0, generate_latency: float = 0.0):
+        """
+        Args:
+            embed_latency: Seconds slept per embed_content call
+            generate_latency: Seconds slept per generate_content call
+        """
+        self.models = _FakeModels(embed_latency, generate_latency)
+        self.aio = SimpleNamespace(models=_FakeAsyncModels(self.models))
+
+
+# ============================================================================
+# MAIN EXECUTION
+# ============================================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local fake embedding server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per request")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Probability of a 429")
+    args = parser.parse_args()
+
+    server = FakeEmbeddingServer(port=args.port, latency=args.latency,
+                                 rate_limit_probability=args.rate_limit)
+    print(f"✓ Fake embedding server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
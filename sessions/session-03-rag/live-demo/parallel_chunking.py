@@ -0,0 +1,204 @@
+"""
+WCC AI Learning Series - Session 3: Parallel Chunking
+Split documents on every CPU core
+
+RecursiveCharacterTextSplitter is pure Python, so chunking a big archive in
+one process keeps a single core busy while the rest sit idle. ParallelChunker
+shards documents across a pool of worker processes:
+
+- Each worker builds its own splitter once (pool initializer)
+- Documents go out in batches; workers send back only (start, end)
+  offsets, never the chunk strings, and the parent slices the text it
+  already holds
+- Results stream back in document order with a bounded number of batches
+  in flight, so a generator of 500k documents never sits in memory at once
+- Small inputs are split in-process (starting a pool costs more than it saves)
+
+Note: on macOS and Windows, worker processes re-import the main script.
+Keep its work under `if __name__ == "__main__":`.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_text_splitters.character import RecursiveCharacterTextSplitter
+
+from token_chunker import TokenChunker
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+# (start, end) of a chunk in its document; in the rare case where the chunk is
+# not an exact slice of the document, the chunk text itself instead of `end`
+Span = Tuple[int, Union[int, str]]
+
+
+Splitter = Union[RecursiveCharacterTextSplitter, TokenChunker]
+
+
+def make_splitter(chunk_size: int = 400, chunk_overlap: int = 50,
+                  separators: Optional[Sequence[str]] = None, unit: str = "chars") -> Splitter:
+    """
+    The splitter used by the demos
+    
+    unit="chars" measures chunks with len() (chunk offsets recorded);
+    unit="tokens" budgets them in tiktoken tokens (see token_chunker.py).
+    """
+    if unit == "tokens":
+        return TokenChunker(chunk_size, chunk_overlap, separators)
+    if unit != "chars":
+        raise ValueError(f"Unknown chunk unit: {unit!r} (use 'chars' or 'tokens')")
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=list(separators or DEFAULT_SEPARATORS),
+        length_function=len,
+        add_start_index=True,
+    )
+
+
+def split_spans(splitter: Splitter, text: str) -> List[Span]:
+    """Chunk `text` and return where each chunk sits in it"""
+    if isinstance(splitter, TokenChunker):
+        return splitter.split_spans(text)
+    spans = []
+    for chunk in splitter.create_documents([text]):
+        start = chunk.metadata["start_index"]
+        end = start + len(chunk.page_content)
+        if text[start:end] == chunk.page_content:
+            spans.append((start, end))
+        else:
+            spans.append((start, chunk.page_content))
+    return spans
+
+
+def span_text(text: str, span: Span) -> str:
+    """Chunk text for a span returned by split_spans()"""
+    start, end = span
+    return text[start:end] if isinstance(end, int) else end
+
+
+# ============================================================================
+# WORKER PROCESS
+# ============================================================================
+
+_worker_splitter: Optional[Splitter] = None
+
+
+def _init_worker(chunk_size: int, chunk_overlap: int, separators: Sequence[str], unit: str) -> None:
+    global _worker_splitter
+    _worker_splitter = make_splitter(chunk_size, chunk_overlap, separators, unit)
+
+
+def _split_batch(texts: List[str]) -> List[List[Span]]:
+    return [split_spans(_worker_splitter, text) for text in texts]
+
+
+# ============================================================================
+# CHUNKER
+# ============================================================================
+
+class ParallelChunker:
+    """
+    Process-pool document splitter
+
+    Usage:
+        with ParallelChunker(chunk_size=400, chunk_overlap=50) as chunker:
+            for key, text, spans in chunker.iter_split((doc, doc["content"]) for doc in docs):
+                chunks = [span_text(text, span) for span in spans]
+    """
+
+    def __init__(self, chunk_size: int = 400, chunk_overlap: int = 50,
+                 separators: Optional[Sequence[str]] = None, max_workers: Optional[int] = None,
+                 docs_per_task: int = 32, min_parallel_docs: int = 256, unit: str = "chars"):
+        """
+        Args:
+            chunk_size: Max characters (or tokens) per chunk
+            chunk_overlap: Characters (or tokens) shared by neighbouring chunks
+            separators: Split points, tried in order
+            max_workers: Worker processes (default: CPU count; 1 = no pool)
+            docs_per_task: Documents sent to a worker at a time
+            min_parallel_docs: Inputs with fewer documents are split in-process
+            unit: "chars" or "tokens" (see make_splitter)
+        """
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators or DEFAULT_SEPARATORS)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.docs_per_task = docs_per_task
+        self.min_parallel_docs = min_parallel_docs
+        self.unit = unit
+        self._splitter = make_splitter(chunk_size, chunk_overlap, self.separators, unit)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.chunk_size, self.chunk_overlap, self.separators, self.unit),
+            )
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def iter_split(self, items: Iterable[Tuple[Any, str]]) -> Iterator[Tuple[Any, str, List[Span]]]:
+        """
+        Split many documents, yielding results in input order
+
+        Args:
+            items: (key, text) pairs; the key (e.g. the document dict) is
+                   passed through untouched and never sent to a worker
+
+        Yields:
+            (key, text, spans) per document
+        """
+        iterator = iter(items)
+        head = list(islice(iterator, self.min_parallel_docs))
+
+        if self.max_workers <= 1 or len(head) < self.min_parallel_docs:
+            # Small input: not worth starting processes
+            for key, text in head:
+                yield key, text, split_spans(self._splitter, text)
+            for key, text in iterator:
+                yield key, text, split_spans(self._splitter, text)
+            return
+
+        pool = self._get_pool()
+        batches = _batched_items(head, iterator, self.docs_per_task)
+        in_flight: deque = deque()
+        max_in_flight = self.max_workers * 2
+
+        for batch in batches:
+            # Only the texts cross the process boundary; keys stay here
+            in_flight.append((batch, pool.submit(_split_batch, [text for _, text in batch])))
+            if len(in_flight) >= max_in_flight:
+                yield from _results(*in_flight.popleft())
+        while in_flight:
+            yield from _results(*in_flight.popleft())
+
+
+def _batched_items(head: List, rest: Iterator, size: int) -> Iterator[List]:
+    for start in range(0, len(head), size):
+        yield head[start:start + size]
+    while True:
+        batch = list(islice(rest, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _results(batch, future) -> Iterator[Tuple[Any, str, List[Span]]]:
+    for (key, text), spans in zip(batch, future.result()):
+        yield key, text, spans
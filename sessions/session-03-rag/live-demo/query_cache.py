@@ -0,0 +1,152 @@
+"""
+WCC AI Learning Series - Session 3: Query Embedding Cache
+LRU + TTL cache for query embeddings, with in-flight request coalescing
+
+Real traffic repeats itself: many users ask the same handful of questions.
+Instead of embedding every query again we:
+
+1. Normalize the query ("  What is  RAG? " and "what is rag?" are the same
+   cache key); only the key is normalized, the embedding is always computed
+   from the query as typed, so names and acronyms ("WCC") keep their case
+2. Return a cached embedding if it is younger than `ttl` seconds
+3. If the same query is already being embedded by another thread, wait for
+   that call instead of starting a second one ("single flight")
+"""
+
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a query: Unicode NFKC, case-folded, single spaces"""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe LRU cache of query embeddings
+
+    Usage:
+        cache = QueryEmbeddingCache(embed_fn, maxsize=1024, ttl=3600)
+        embedding = cache.get("How do I learn Python?")
+        print(cache.stats()["hit_rate"])
+    """
+
+    def __init__(self, embed_fn: Callable[[str], List[float]], maxsize: int = 1024,
+                 ttl: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            embed_fn: Embeds one query (called with the original text, not the key)
+            maxsize: Max number of cached queries (least recently used are dropped)
+            ttl: Seconds before a cached embedding expires
+            clock: Time source (override in tests)
+        """
+        self.embed_fn = embed_fn
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, embedding)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> List[float]:
+        """Embedding for `query`, from cache, from an in-flight call, or freshly embedded"""
+        key = normalize_query(query)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, embedding = entry
+                if expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+
+        if not owner:
+            # Someone else is embedding the same query; share their result
+            return future.result()
+
+        try:
+            embedding = self.embed_fn(query)
+        except BaseException as error:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(error)
+            raise
+
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            del self._inflight[key]
+        future.set_result(embedding)
+        return embedding
+
+    def peek(self, query: str) -> Optional[List[float]]:
+        """
+        Cached embedding for `query`, or None (never calls embed_fn)
+
+        For callers that embed misses themselves, e.g. with an async client;
+        they hand the result back with put().
+        """
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, embedding = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, query: str, embedding: List[float]) -> None:
+        """Cache an embedding computed outside get() (counted as a miss)"""
+        key = normalize_query(query)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (self.clock() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Hit-rate metrics (coalesced calls count as hits: they cost no API call)"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -5,21 +5,35 @@ Complete RAG Pipeline Implementation
 This demo shows:
 1. Document chunking
 2. Embedding generation with Vertex AI
-3. Storage in ChromaDB
-4. Semantic search
+3. Storage in ChromaDB (or an in-process NumPy index)
+4. Semantic search (optionally fused with BM25 keyword search)
 5. RAG with Gemini
 """
 
+import json
 import os
-import chromadb
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from functools import lru_cache
 import vertexai
-from typing import List, Dict
+from typing import List, Dict, Iterator, Tuple
 from google import genai
 from google.genai import types
-from chromadb.config import Settings
-from langchain_text_splitters.character import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
 from sample_data import SAMPLE_BLOGS
+from chunk_ids import diff_chunk_ids
+from embedding_dispatcher import EmbeddingDispatcher
+from query_cache import QueryEmbeddingCache, normalize_query
+from answer_cache import SemanticAnswerCache, make_sources_key
+from vector_store import open_vector_store
+from bm25 import BM25Index, reciprocal_rank_fusion
+from parallel_chunking import ParallelChunker
+from streaming_ingest import batched
+from token_chunker import tokens_available, CHARS_PER_TOKEN
+from context_packer import pack_context
+from mmr import mmr_rerank, DEFAULT_LAMBDA
+from chunk_store import ChunkStore
 
 # ============================================================================
 # CONFIGURATION
@@ -31,76 +45,120 @@ load_dotenv()
 PROJECT_ID = os.getenv("GCP_PROJECT_ID")
 LOCATION = os.getenv("GCP_LOCATION", "us-central1")
 
-# Initialize Vertex AI and Generative AI client
-vertexai.init(project=PROJECT_ID, location=LOCATION)
-client = genai.Client(
-    vertexai=True, project=PROJECT_ID, location=LOCATION)
-
 # Initialize models
 GENERATION_MODEL_NAME = os.getenv("GENERATION_MODEL_NAME", "gemini-2.5-flash-lite")
 EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-004")
+EMBEDDING_DIMENSIONS = 10
+
+# Initialize the vector database (local, persistent storage)
+# VECTOR_BACKEND=chroma -> ChromaDB in ./chroma_data (default)
+# VECTOR_BACKEND=numpy  -> in-process NumPy index in ./numpy_index
+# VECTOR_BACKEND=ann    -> NumPy index + IVF-PQ approximate search (ANN_NPROBE knob)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
 
-# Initialize ChromaDB (local, persistent storage)
-# chroma_client = chromadb.Client(Settings(
-#    anonymized_telemetry=False,
-#    allow_reset=True
-#))
-chroma_client = chromadb.PersistentClient(path="./chroma_data")
+# Chunk length unit: "tokens" (tiktoken, see token_chunker.py) or "chars"
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "tokens")
+CHUNK_DEFAULTS = {"tokens": (100, 12), "chars": (400, 50)}  # (chunk_size, chunk_overlap)
 
-# Create or get collection
+# Token budget for retrieved context in the prompt
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "2000"))
 collection_name = "wcc_blogs"
-try:
-    collection = chroma_client.get_collection(collection_name)
-    print(f"✓ Using existing collection: {collection_name}")
-except:
-    collection = chroma_client.create_collection(collection_name)
-    print(f"✓ Created new collection: {collection_name}")
+
+# The Generative AI client and the vector store are created on first use, not
+# on import, so importing rag_demo (streamlit_app.py, benchmark.py) is cheap.
+# Assign rag_demo.client to use another client, e.g. a FakeGenAIClient.
+client = None
+vector_store = None
+_init_lock = threading.Lock()
+
+def get_client():
+    """The Generative AI client (initializes Vertex AI on first call)"""
+    global client
+    if client is None:
+        with _init_lock:
+            if client is None:
+                vertexai.init(project=PROJECT_ID, location=LOCATION)
+                client = genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
+    return client
+
+def get_vector_store():
+    """The vector store for VECTOR_BACKEND (opened on first call)"""
+    global vector_store
+    if vector_store is None:
+        with _init_lock:
+            if vector_store is None:
+                vector_store = open_vector_store(VECTOR_BACKEND, collection_name)
+    return vector_store
+
+# Answers for near-identical questions with identical sources are reused, per
+# generation model (small EMBEDDING_DIMENSIONS raise the threshold, see answer_cache.py)
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_MAX_ENTRIES = 10000
+answer_cache = SemanticAnswerCache("./answer_cache.sqlite", threshold=ANSWER_CACHE_THRESHOLD,
+                                   model=GENERATION_MODEL_NAME,
+                                   max_entries=ANSWER_CACHE_MAX_ENTRIES)
+
+# Keyword index for exact-term matches (built during setup, saved in ./bm25_index)
+bm25_index = BM25Index("./bm25_index")
+search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search")
 
 
 # ============================================================================
 # STEP 1: CHUNKING DOCUMENTS
 # ============================================================================
 
-def chunk_documents(blogs: List[Dict], chunk_size: int = 400, chunk_overlap: int = 50) -> List[Dict]:
+@lru_cache(maxsize=None)
+def resolve_chunk_unit(unit: str) -> str:
+    """The unit actually used: "tokens" falls back to "chars" without tiktoken"""
+    if unit == "tokens" and not tokens_available():
+        print(f"⚠️  tiktoken encoding unavailable - chunking by characters (~{CHARS_PER_TOKEN} per token)")
+        return "chars"
+    return unit
+
+def chunk_documents(blogs: List[Dict], chunk_size: int = None, chunk_overlap: int = None,
+                    max_workers: int = None, unit: str = CHUNK_UNIT) -> ChunkStore:
     """
     Chunk blog posts into smaller pieces with metadata
     
+    By default chunks are budgeted in tokens (one tiktoken encode per post,
+    see token_chunker.py), so every chunk costs about the same to embed.
+    Without tiktoken the sizes are converted to characters instead.
+    
+    Large inputs are split on all CPU cores (see parallel_chunking.py);
+    the result is identical to splitting one post at a time.
+    
+    Chunks are kept as offsets into their post (see chunk_store.py), so
+    nothing is copied until a chunk is actually used. The result behaves
+    like a list of chunk dicts: chunks[0]["text"], len(chunks), for ... in.
+    
     Args:
         blogs: List of blog post dictionaries
-        chunk_size: Target size for each chunk in tokens (~chars)
-        chunk_overlap: Number of characters to overlap between chunks
+        chunk_size: Max size of each chunk, in `unit`s (default: 100 tokens / 400 chars)
+        chunk_overlap: Overlap between chunks, in `unit`s (default: 12 tokens / 50 chars)
+        max_workers: Worker processes for big inputs (default: CPU count, 1 = no pool)
+        unit: "tokens" or "chars" (default: CHUNK_UNIT env var, else tokens)
     
     Returns:
-        List of document chunks with metadata
+        ChunkStore of chunks, each with a stable ID and metadata
+        (title, date, url, chunk_id, total_chunks, start_index)
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", ". ", " ", ""],
-        length_function=len,
-    )
+    default_size, default_overlap = CHUNK_DEFAULTS[unit]
+    chunk_size = chunk_size or default_size
+    chunk_overlap = default_overlap if chunk_overlap is None else chunk_overlap
+    if resolve_chunk_unit(unit) != unit:
+        chunk_size, chunk_overlap = chunk_size * CHARS_PER_TOKEN, chunk_overlap * CHARS_PER_TOKEN
+        unit = "chars"
     
-    all_chunks = []
+    all_chunks = ChunkStore(offset_key="start_index")
     
-    for blog in blogs:
-        # Create a combined text with title and content
-        full_text = f"Title: {blog['title']}\n\n{blog['content']}"
-        
-        # Split into chunks
-        chunks = text_splitter.split_text(full_text)
-        
-        # Add metadata to each chunk
-        for i, chunk in enumerate(chunks):
-            all_chunks.append({
-                "text": chunk,
-                "metadata": {
-                    "title": blog["title"],
-                    "date": blog["date"],
-                    "url": blog["url"],
-                    "chunk_id": i,
-                    "total_chunks": len(chunks)
-                }
-            })
+    # Create a combined text with title and content for each post
+    posts = ((blog, f"Title: {blog['title']}\n\n{blog['content']}") for blog in blogs)
+    
+    with ParallelChunker(chunk_size, chunk_overlap, max_workers=max_workers, unit=unit) as chunker:
+        # Split into chunks (keeping each chunk's offset in the post)
+        for blog, full_text, spans in chunker.iter_split(posts):
+            metadata = {"title": blog["title"], "date": blog["date"], "url": blog["url"]}
+            all_chunks.add_document(blog["url"], metadata, full_text, spans)
     
     return all_chunks
 
@@ -108,39 +166,32 @@ def chunk_documents(blogs: List[Dict], chunk_size: int = 400, chunk_overlap: int
 # STEP 2: GENERATE EMBEDDINGS
 # ============================================================================
 
-def generate_embeddings(texts: List[str], batch_size: int = 5) -> List[List[float]]:
+def generate_embeddings(texts: List[str], batch_size: int = None,
+                        max_workers: int = 8) -> List[List[float]]:
     """
     Generate embeddings for a list of texts using Vertex AI
     
+    Batches are sized from the model's per-request limits and sent
+    concurrently; 429 (rate limit) responses are retried with backoff.
+    
     Args:
         texts: List of text strings to embed
-        batch_size: Number of texts to process at once
+        batch_size: Max texts per request (default: the model's limit)
+        max_workers: Number of requests in flight at once
     
     Returns:
-        List of embeddings (each embedding is a list of floats)
+        List of embeddings (each embedding is a list of floats), in input order
     """
-    all_embeddings = []
-    
     print(f"Generating embeddings for {len(texts)} chunks...")
     
-    # Process in batches to avoid rate limits
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i+batch_size]
-        
-        # Get embeddings for this batch
-        response = client.models.embed_content(
-            model=EMBEDDING_MODEL_NAME,
-            contents=batch,
-            config=types.EmbedContentConfig(output_dimensionality=10),
-        )
-        
-        # Extract the values (list of floats) from each embedding
-        batch_embeddings = [emb.values for emb in response.embeddings]
-        all_embeddings.extend(batch_embeddings)
-        
-        # Progress update
-        if (i + batch_size) % 10 == 0:
-            print(f"  Processed {min(i+batch_size, len(texts))}/{len(texts)} chunks")
+    dispatcher = EmbeddingDispatcher(
+        get_client(),
+        EMBEDDING_MODEL_NAME,
+        output_dimensionality=EMBEDDING_DIMENSIONS,
+        max_workers=max_workers,
+        batch_size=batch_size,
+    )
+    all_embeddings = dispatcher.embed(texts)
     
     print(f"✓ Generated {len(all_embeddings)} embeddings")
     print(f"  Embedding dimension: {len(all_embeddings[0])}")
@@ -151,106 +202,222 @@ def generate_embeddings(texts: List[str], batch_size: int = 5) -> List[List[floa
 # STEP 3: STORE IN CHROMADB
 # ============================================================================
 
-def store_in_vectordb(chunks: List[Dict], embeddings: List[List[float]]) -> None:
+def plan_sync(chunks: ChunkStore, prune: bool = True) -> Tuple[ChunkStore, List[str]]:
+    """
+    Work out which chunks actually need to be (re-)ingested
+    
+    Chunk IDs are derived from URL, offset and content hash, so any chunk
+    whose ID is already stored is unchanged and can be skipped.
+    
+    Args:
+        chunks: The full, freshly chunked corpus
+        prune: Also delete chunks of posts that are no longer in `chunks`
+               (False = only compare against the posts being ingested)
+    
+    Returns:
+        (chunks to embed and upsert, stale IDs to delete)
+    """
+    if prune:
+        existing = get_vector_store().get_ids()
+    else:
+        urls = sorted({metadata["url"] for metadata in _metadatas(chunks)})
+        existing = get_vector_store().get_ids(where={"url": {"$in": urls}}) if urls else []
+    
+    chunk_ids = chunks.ids() if isinstance(chunks, ChunkStore) else [chunk["id"] for chunk in chunks]
+    to_add, stale_ids = diff_chunk_ids(chunk_ids, existing)
+    
+    to_add = set(to_add)
+    keep = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id in to_add]
+    if isinstance(chunks, ChunkStore):
+        return chunks.take(keep), stale_ids  # A view: no chunk text is copied
+    return [chunks[i] for i in keep], stale_ids
+
+def _metadatas(chunks) -> List[Dict]:
+    return chunks.metadatas() if isinstance(chunks, ChunkStore) else [chunk["metadata"] for chunk in chunks]
+
+def store_in_vectordb(chunks: List[Dict], embeddings: List[List[float]],
+                      stale_ids: List[str] = None) -> None:
     """
-    Store chunks, embeddings, and metadata in ChromaDB
+    Store chunks, embeddings, and metadata in the vector database
+    
+    Upserting by stable ID makes this idempotent: re-running it with the same
+    chunks leaves the collection unchanged.
     
     Args:
         chunks: List of document chunks with metadata
         embeddings: List of embeddings corresponding to chunks
+        stale_ids: IDs of changed or deleted chunks to remove (see plan_sync)
     """
-    # Prepare data for ChromaDB
-    ids = [f"chunk_{i}" for i in range(len(chunks))]
-    documents = [chunk["text"] for chunk in chunks]
-    metadatas = [chunk["metadata"] for chunk in chunks]
-    
-    # Add to collection
-    collection.add(
-        embeddings=embeddings,
-        documents=documents,
-        metadatas=metadatas,
-        ids=ids
-    )
+    if chunks:
+        # Prepare data for the vector database
+        if isinstance(chunks, ChunkStore):
+            ids, documents, metadatas = chunks.ids(), chunks.texts(), chunks.metadatas()
+        else:
+            ids = [chunk["id"] for chunk in chunks]
+            documents = [chunk["text"] for chunk in chunks]
+            metadatas = [chunk["metadata"] for chunk in chunks]
+        
+        # Add new / changed chunks to the collection
+        get_vector_store().upsert(
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids
+        )
+    
+    if stale_ids:
+        get_vector_store().delete(ids=list(stale_ids))
+    get_vector_store().persist()
+    
+    # Cached answers may no longer reflect the collection
+    if chunks or stale_ids:
+        answer_cache.invalidate()
     
-    print(f"✓ Stored {len(chunks)} chunks in ChromaDB")
-    print(f"  Collection size: {collection.count()}")
+    print(f"✓ Stored {len(chunks)} chunks in the vector database ({VECTOR_BACKEND})")
+    if stale_ids:
+        print(f"  Deleted {len(stale_ids)} stale chunks")
+    print(f"  Collection size: {get_vector_store().count()}")
 
 # ============================================================================
 # STEP 4: SEMANTIC SEARCH
 # ============================================================================
 
-def semantic_search(query: str, k: int = 5) -> List[Dict]:
+def embed_query(query: str) -> List[float]:
+    """
+    Embed a single search query with Vertex AI (no caching)
+    
+    Args:
+        query: Text to embed
+    
+    Returns:
+        The query embedding
+    """
+    response = get_client().models.embed_content(
+            model=EMBEDDING_MODEL_NAME,
+            contents=[query],
+            config=types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIMENSIONS),
+        )
+    return response.embeddings[0].values
+
+# Repeated questions reuse their embedding; concurrent identical ones share one API call
+query_embedding_cache = QueryEmbeddingCache(lambda query: embed_query(query),
+                                            maxsize=1024, ttl=3600)
+
+def semantic_search(query: str, k: int = 5, diversify: bool = False,
+                    lambda_mult: float = DEFAULT_LAMBDA) -> List[Dict]:
     """
     Search for relevant chunks given a query
     
     Args:
         query: User's search query
         k: Number of results to return
+        diversify: Fetch 4k candidates and keep k diverse ones with maximal
+                   marginal relevance (see mmr.py), instead of several
+                   overlapping chunks of the same post
+        lambda_mult: MMR trade-off, 1.0 = relevance only, 0.0 = diversity only
     
     Returns:
         List of relevant documents with metadata and scores
     """
-    # Embed the query
-    response = client.models.embed_content(
-            model=EMBEDDING_MODEL_NAME,
-            contents=[query],
-            config=types.EmbedContentConfig(output_dimensionality=10),
-        )
-    query_embedding = response.embeddings[0].values
+    # Embed the query (cached by normalized query text)
+    query_embedding = query_embedding_cache.get(query)
     
-    # Search the vector database
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=k
-    )
+    if diversify:
+        candidates = get_vector_store().query(query_embedding, k=4 * k, include_embeddings=True)
+        return mmr_rerank(query_embedding, candidates, k, lambda_mult)
+    
+    # Search the vector database (each result has id, text, metadata, distance)
+    return get_vector_store().query(query_embedding, k=k)
+
+def hybrid_search(query: str, k: int = 5, candidates: int = 20) -> List[Dict]:
+    """
+    Search with BM25 and embeddings, merged by reciprocal-rank fusion
     
-    # Format results
-    relevant_docs = []
-    if results['documents'] and len(results['documents'][0]) > 0:
-        for i in range(len(results['documents'][0])):
-            relevant_docs.append({
-                'text': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i]  # Lower = more similar
-            })
+    Embeddings find chunks with the same meaning; BM25 finds chunks with the
+    same words (names, product terms like "Django REST Framework"). The
+    keyword search runs while the query is being embedded.
     
-    return relevant_docs
+    Args:
+        query: User's search query
+        k: Number of results to return
+        candidates: Results taken from each retriever before fusion
+    
+    Returns:
+        List of relevant documents with metadata, fused 'score' (higher =
+        better) and 'distance' (None for chunks found only by BM25)
+    """
+    keyword_future = search_pool.submit(bm25_index.search, query, candidates)
+    vector_results = semantic_search(query, k=candidates)
+    keyword_results = keyword_future.result()
+    
+    return fuse_results(vector_results, keyword_results, k)
+
+def fuse_results(vector_results: List[Dict], keyword_results: List[Tuple[str, float]],
+                 k: int) -> List[Dict]:
+    """Reciprocal-rank fusion of vector results and BM25 (id, score) pairs, top k"""
+    fused = reciprocal_rank_fusion([
+        [doc['id'] for doc in vector_results],
+        [chunk_id for chunk_id, _ in keyword_results],
+    ])[:k]
+    
+    # Chunks only BM25 found still need their text and metadata
+    by_id = {doc['id']: doc for doc in vector_results}
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in by_id]
+    for doc in get_vector_store().get(missing):
+        by_id[doc['id']] = {**doc, 'distance': None}
+    
+    return [{**by_id[chunk_id], 'score': score} for chunk_id, score in fused if chunk_id in by_id]
 
 # ============================================================================
 # STEP 5: RAG PIPELINE
 # ============================================================================
 
-def rag_query(question: str, k: int = 5, verbose: bool = False) -> Dict:
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information to answer that question."
+
+def retrieve_context(question: str, k: int = 5, verbose: bool = False, hybrid: bool = True,
+                     max_context_tokens: int = MAX_CONTEXT_TOKENS, diversify: bool = False,
+                     lambda_mult: float = DEFAULT_LAMBDA) -> List[Dict]:
     """
-    Complete RAG pipeline: retrieve relevant context and generate answer
+    Retrieval half of rag_query: search, then pack the results into the budget
     
     Args:
-        question: User's question
-        k: Number of context chunks to retrieve
-        verbose: Whether to print detailed information
+        question, k, verbose, hybrid, max_context_tokens, diversify,
+        lambda_mult: As in rag_query
     
     Returns:
-        Dictionary with answer, sources, and retrieved chunks
+        Packed context spans, best first (see context_packer.py)
     """
     # 1. Search for relevant chunks
     if verbose:
         print(f"\n🔍 Searching for: {question}")
     
-    relevant_docs = semantic_search(question, k=k)
+    if diversify:
+        relevant_docs = semantic_search(question, k=k, diversify=True, lambda_mult=lambda_mult)
+    elif hybrid and len(bm25_index):
+        relevant_docs = hybrid_search(question, k=k)
+    else:
+        relevant_docs = semantic_search(question, k=k)
     
     if not relevant_docs:
-        return {
-            'answer': "I couldn't find any relevant information to answer that question.",
-            'sources': [],
-            'chunks': []
-        }
+        return []
+    
+    # Merge neighbouring chunks, drop repeats, fill the budget by relevance per token
+    retrieved = len(relevant_docs)
+    relevant_docs = pack_context(relevant_docs, max_context_tokens)
     
     if verbose:
-        print(f"✓ Found {len(relevant_docs)} relevant chunks")
+        print(f"✓ Found {retrieved} relevant chunks, packed into {len(relevant_docs)} spans "
+              f"({sum(doc['tokens'] for doc in relevant_docs)} tokens)")
         for i, doc in enumerate(relevant_docs):
-            print(f"  [{i+1}] {doc['metadata']['title']} (distance: {doc['distance']:.3f})")
+            if doc['distance'] is None:
+                print(f"  [{i+1}] {doc['metadata']['title']} (keyword match)")
+            else:
+                print(f"  [{i+1}] {doc['metadata']['title']} (distance: {doc['distance']:.3f})")
     
-    # 2. Build context from retrieved chunks
+    return relevant_docs
+
+def build_prompt(question: str, relevant_docs: List[Dict]) -> str:
+    """The grounded prompt: numbered sources, then the question"""
     context_parts = []
     for i, doc in enumerate(relevant_docs):
         context_parts.append(f"""[Source {i+1}: {doc['metadata']['title']}]
@@ -259,8 +426,7 @@ def rag_query(question: str, k: int = 5, verbose: bool = False) -> Dict:
     
     context = "\n\n".join(context_parts)
     
-    # 3. Build prompt for LLM
-    prompt = f"""You are a helpful assistant for the Women Coding Community (WCC).
+    return f"""You are a helpful assistant for the Women Coding Community (WCC).
 Answer the question based ONLY on the provided context below.
 If the context doesn't contain enough information to answer the question, say so.
 Always cite your sources using the format [Source X] where X is the source number.
@@ -271,38 +437,409 @@ Context:
 Question: {question}
 
 Answer (with citations):"""
+
+def unique_sources(relevant_docs: List[Dict]) -> List[Dict]:
+    """Metadata of each distinct post in the context, in citation order"""
+    sources = []
+    seen_titles = set()
+    for doc in relevant_docs:
+        title = doc['metadata']['title']
+        if title not in seen_titles:
+            seen_titles.add(title)
+            sources.append(doc['metadata'])
+    return sources
+
+def _cached_answer(question: str, relevant_docs: List[Dict], verbose: bool = False) -> Tuple:
+    """(cached answer or None, question embedding, sources key) for the answer cache"""
+    question_embedding = query_embedding_cache.get(question)
+    sources_key = make_sources_key([chunk_id for doc in relevant_docs for chunk_id in doc['ids']])
+    cached = answer_cache.lookup(question_embedding, sources_key)
+    if cached is not None and verbose:
+        print(f"⚡ Reusing cached answer for: {cached['question']} "
+              f"(similarity: {cached['similarity']:.3f})")
+    return cached, question_embedding, sources_key
+
+def rag_query(question: str, k: int = 5, verbose: bool = False, use_cache: bool = True,
+              hybrid: bool = True, max_context_tokens: int = MAX_CONTEXT_TOKENS,
+              diversify: bool = False, lambda_mult: float = DEFAULT_LAMBDA) -> Dict:
+    """
+    Complete RAG pipeline: retrieve relevant context and generate answer
+    
+    Args:
+        question: User's question
+        k: Number of context chunks to retrieve
+        verbose: Whether to print detailed information
+        use_cache: Reuse the answer of a near-identical earlier question
+                   when retrieval returns the same chunks
+        hybrid: Fuse BM25 keyword results with vector results
+                (falls back to vector search until the BM25 index is built)
+        max_context_tokens: Token budget for the retrieved chunks in the prompt
+                            (see context_packer.py)
+        diversify: Re-rank vector results with MMR (see semantic_search);
+                   takes precedence over `hybrid`, since MMR needs every
+                   candidate's embedding
+        lambda_mult: MMR trade-off when `diversify` is set
+                     (1.0 = relevance only, 0.0 = diversity only)
+    
+    Returns:
+        Dictionary with answer, sources, retrieved chunks, and whether
+        the answer came from the cache
+    """
+    # 1-2. Retrieve and pack the context
+    relevant_docs = retrieve_context(question, k, verbose, hybrid, max_context_tokens,
+                                     diversify, lambda_mult)
+    
+    if not relevant_docs:
+        return {
+            'answer': NO_CONTEXT_ANSWER,
+            'sources': [],
+            'chunks': []
+        }
+    
+    # Same meaning + same context = same answer; skip generation if we have it
+    if use_cache:
+        cached, question_embedding, sources_key = _cached_answer(question, relevant_docs, verbose)
+        if cached is not None:
+            return {
+                'answer': cached['answer'],
+                'sources': cached['sources'],
+                'chunks': relevant_docs,
+                'cached': True
+            }
+    
+    # 3. Build prompt for LLM
+    prompt = build_prompt(question, relevant_docs)
     
     # 4. Generate answer with Gemini
     if verbose:
         print("🤖 Generating answer with Gemini...")
     
-    response = client.models.generate_content(
+    response = get_client().models.generate_content(
         model=GENERATION_MODEL_NAME,
         contents=[prompt],
         config=types.GenerateContentConfig()
     )
     
     # 5. Extract unique sources
-    unique_sources = []
-    seen_titles = set()
-    for doc in relevant_docs:
-        title = doc['metadata']['title']
-        if title not in seen_titles:
-            seen_titles.add(title)
-            unique_sources.append(doc['metadata'])
+    sources = unique_sources(relevant_docs)
+    
+    if use_cache:
+        answer_cache.store(question, question_embedding, sources_key, response.text, sources)
     
     return {
         'answer': response.text,
-        'sources': unique_sources,
-        'chunks': relevant_docs  # Include for debugging
+        'sources': sources,
+        'chunks': relevant_docs,  # Include for debugging
+        'cached': False
+    }
+
+def rag_query_stream(question: str, k: int = 5, verbose: bool = False, use_cache: bool = True,
+                     hybrid: bool = True, max_context_tokens: int = MAX_CONTEXT_TOKENS,
+                     diversify: bool = False, lambda_mult: float = DEFAULT_LAMBDA) -> Dict:
+    """
+    rag_query with the answer streamed as it is generated
+    
+    Retrieval runs before this returns, so sources and chunks can be shown
+    straight away; the answer text then arrives piece by piece from
+    generate_content_stream. Users see the first words after the
+    time-to-first-token instead of waiting for the whole answer.
+    
+    Args:
+        Same as rag_query
+    
+    Returns:
+        Dictionary with 'stream' (iterator of answer text pieces), sources,
+        retrieved chunks and 'cached'. The answer is stored in the answer
+        cache once the stream has been read to the end.
+    """
+    relevant_docs = retrieve_context(question, k, verbose, hybrid, max_context_tokens,
+                                     diversify, lambda_mult)
+    
+    if not relevant_docs:
+        return {'stream': iter([NO_CONTEXT_ANSWER]), 'sources': [], 'chunks': [], 'cached': False}
+    
+    if use_cache:
+        cached, question_embedding, sources_key = _cached_answer(question, relevant_docs, verbose)
+        if cached is not None:
+            return {
+                'stream': iter([cached['answer']]),
+                'sources': cached['sources'],
+                'chunks': relevant_docs,
+                'cached': True
+            }
+    
+    prompt = build_prompt(question, relevant_docs)
+    sources = unique_sources(relevant_docs)
+    
+    def stream():
+        if verbose:
+            print("🤖 Streaming answer from Gemini...")
+        pieces = []
+        for chunk in get_client().models.generate_content_stream(
+            model=GENERATION_MODEL_NAME,
+            contents=[prompt],
+            config=types.GenerateContentConfig()
+        ):
+            if chunk.text:
+                pieces.append(chunk.text)
+                yield chunk.text
+        
+        if use_cache:
+            answer_cache.store(question, question_embedding, sources_key, "".join(pieces), sources)
+    
+    return {
+        'stream': stream(),
+        'sources': sources,
+        'chunks': relevant_docs,
+        'cached': False
     }
 
+# ============================================================================
+# BATCH QUESTION ANSWERING (OFFLINE EVALUATION)
+# ============================================================================
+
+# Questions embedded and searched together; at most about two batches are in flight
+BATCH_SIZE = 256
+# Generation requests in flight at once
+BATCH_GENERATION_WORKERS = 16
+
+def embed_queries(queries: List[str]) -> List[List[float]]:
+    """
+    Embed many queries in as few API calls as possible
+    
+    Cached queries come from query_embedding_cache; the rest go out in
+    batched, concurrent requests and are added to the cache.
+    """
+    embeddings = [query_embedding_cache.peek(query) for query in queries]
+    
+    # Each distinct normalized query is embedded once, from its first spelling
+    missing: Dict[str, List[int]] = {}
+    for i, (query, embedding) in enumerate(zip(queries, embeddings)):
+        if embedding is None:
+            missing.setdefault(normalize_query(query), []).append(i)
+    
+    if missing:
+        dispatcher = EmbeddingDispatcher(get_client(), EMBEDDING_MODEL_NAME,
+                                         output_dimensionality=EMBEDDING_DIMENSIONS, verbose=False)
+        originals = [queries[rows[0]] for rows in missing.values()]
+        for rows, query, embedding in zip(missing.values(), originals, dispatcher.embed(originals)):
+            query_embedding_cache.put(query, embedding)
+            for i in rows:
+                embeddings[i] = embedding
+    return embeddings
+
+def retrieve_batch(questions: List[str], embeddings: List[List[float]], k: int = 5,
+                   hybrid: bool = True, diversify: bool = False,
+                   candidates: int = 20, lambda_mult: float = DEFAULT_LAMBDA) -> List[List[Dict]]:
+    """
+    retrieve_context's search step for a whole batch of embedded questions
+    
+    The vector search is one query_batch() call (a single matrix product
+    for the NumPy backends); BM25 runs on the search pool meanwhile.
+    `lambda_mult` is the MMR trade-off used when `diversify` is set.
+    """
+    if diversify:
+        results = get_vector_store().query_batch(embeddings, k=4 * k, include_embeddings=True)
+        return [mmr_rerank(embedding, docs, k, lambda_mult)
+                for embedding, docs in zip(embeddings, results)]
+    
+    if not (hybrid and len(bm25_index)):
+        return get_vector_store().query_batch(embeddings, k=k)
+    
+    keyword_futures = [search_pool.submit(bm25_index.search, question, candidates)
+                       for question in questions]
+    vector_results = get_vector_store().query_batch(embeddings, k=candidates)
+    return [fuse_results(docs, future.result(), k)
+            for docs, future in zip(vector_results, keyword_futures)]
+
+def _read_questions(path: str) -> Iterator[Dict]:
+    """
+    Records from a JSONL file: {"question": ..., any other fields} or a bare JSON string
+    
+    A line that isn't JSON, is some other JSON value (number, true, null,
+    list), or has no question, is yielded as a record with 'line' (1-based)
+    and 'error' set instead of stopping the batch.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield {"line": number, "error": f"Invalid JSON: {error}"}
+                continue
+            if isinstance(record, str):
+                record = {"question": record}
+            elif not isinstance(record, dict):
+                yield {"line": number, "error": f"Expected a JSON object or string, got {line[:100]}"}
+                continue
+            question = record.get("question")
+            if not isinstance(question, str) or not question.strip():
+                yield dict(record, line=number, error="Missing 'question' (a non-empty string)")
+                continue
+            yield record
+
+def _generate(prompt: str) -> Tuple[str, float]:
+    """(answer text, seconds) for one prompt"""
+    started = time.perf_counter()
+    response = get_client().models.generate_content(
+        model=GENERATION_MODEL_NAME,
+        contents=[prompt],
+        config=types.GenerateContentConfig()
+    )
+    return response.text, time.perf_counter() - started
+
+def batch_query(input_path: str, output_path: str, k: int = 5, hybrid: bool = True,
+                max_context_tokens: int = MAX_CONTEXT_TOKENS, diversify: bool = False,
+                lambda_mult: float = DEFAULT_LAMBDA, use_cache: bool = True,
+                batch_size: int = BATCH_SIZE, max_workers: int = BATCH_GENERATION_WORKERS) -> Dict:
+    """
+    Answer every question in a JSONL file, writing results to another JSONL file
+    
+    Per batch of `batch_size` questions: one batched embedding pass, one
+    vectorized search, then context packing; generations run on a pool of
+    `max_workers` threads while the next batch is retrieved. Each output
+    line is written as soon as its answer is ready, so results come out in
+    completion order - match them up by the input fields, which are copied.
+    Lines that aren't JSON or have no "question" get an {"line", "error"}
+    record and the rest of the file is still answered.
+    
+    Args:
+        input_path: JSONL with one {"question": ...} per line (extra fields
+                    such as "id" or "expected" are passed through)
+        output_path: JSONL to write
+        k, hybrid, max_context_tokens, diversify, use_cache: As in rag_query
+        lambda_mult: MMR trade-off when `diversify` is set (see semantic_search)
+        batch_size: Questions embedded and searched together
+        max_workers: Generation requests in flight
+    
+    Returns:
+        Summary with counts and total seconds per stage
+    """
+    print("\n" + "="*70)
+    print(f"BATCH RAG: {input_path} → {output_path}")
+    print("="*70)
+    
+    totals = {'embed': 0.0, 'search': 0.0, 'pack': 0.0, 'generate': 0.0}
+    counts = {'questions': 0, 'cached': 0, 'errors': 0}
+    started = time.perf_counter()
+    
+    def write(out, record: Dict) -> None:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        counts['questions'] += 1
+        counts['cached'] += record.get('cached', False)
+        counts['errors'] += 'error' in record
+    
+    def finish(out, future) -> None:
+        """Complete one generated record and write it"""
+        record, cache_entry = pending.pop(future)
+        try:
+            answer, seconds = future.result()
+        except Exception as error:
+            record['error'] = f"{type(error).__name__}: {error}"
+        else:
+            record['answer'] = answer
+            record['timings']['generate'] = round(seconds * 1000, 2)
+            totals['generate'] += seconds
+            if cache_entry is not None:
+                answer_cache.store(record['question'], *cache_entry, answer, record['sources'])
+        write(out, record)
+    
+    pending: Dict = {}
+    with open(output_path, "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generate") as pool:
+        for batch in batched(_read_questions(input_path), batch_size):
+            # Unreadable lines are reported as they are, the rest are answered
+            for record in batch:
+                if 'error' in record:
+                    write(out, record)
+            batch = [record for record in batch if 'error' not in record]
+            if not batch:
+                continue
+            questions = [record['question'] for record in batch]
+            
+            # 1. Embed the batch, 2. search it
+            stage_started = time.perf_counter()
+            embeddings = embed_queries(questions)
+            embed_seconds = time.perf_counter() - stage_started
+            
+            stage_started = time.perf_counter()
+            results = retrieve_batch(questions, embeddings, k, hybrid, diversify,
+                                     lambda_mult=lambda_mult)
+            search_seconds = time.perf_counter() - stage_started
+            totals['embed'] += embed_seconds
+            totals['search'] += search_seconds
+            
+            # Keep about one batch of generations queued behind the running ones
+            while len(pending) > batch_size:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(out, future)
+            
+            for record, embedding, docs in zip(batch, embeddings, results):
+                # 3. Pack the context (embed / search times are the batch's, per question)
+                stage_started = time.perf_counter()
+                docs = pack_context(docs, max_context_tokens) if docs else []
+                pack_seconds = time.perf_counter() - stage_started
+                totals['pack'] += pack_seconds
+                
+                record = dict(record, answer=None, sources=unique_sources(docs),
+                              chunk_ids=[chunk_id for doc in docs for chunk_id in doc['ids']],
+                              cached=False, timings={
+                                  'embed': round(embed_seconds / len(batch) * 1000, 2),
+                                  'search': round(search_seconds / len(batch) * 1000, 2),
+                                  'pack': round(pack_seconds * 1000, 2),
+                              })
+                
+                if not docs:
+                    write(out, dict(record, answer=NO_CONTEXT_ANSWER))
+                    continue
+                
+                cache_entry = None
+                if use_cache:
+                    sources_key = make_sources_key(record['chunk_ids'])
+                    cached = answer_cache.lookup(embedding, sources_key)
+                    if cached is not None:
+                        write(out, dict(record, answer=cached['answer'], sources=cached['sources'],
+                                        cached=True))
+                        continue
+                    cache_entry = (embedding, sources_key)
+                
+                # 4. Generate on the pool
+                future = pool.submit(_generate, build_prompt(record['question'], docs))
+                pending[future] = (record, cache_entry)
+            
+            for future in [future for future in pending if future.done()]:
+                finish(out, future)
+            out.flush()
+            print(f"  {counts['questions']} answered, {len(pending)} generating...")
+        
+        for future in as_completed(list(pending)):
+            finish(out, future)
+    
+    elapsed = time.perf_counter() - started
+    summary = {**counts, 'seconds': round(elapsed, 2),
+               'stage_seconds': {stage: round(seconds, 2) for stage, seconds in totals.items()}}
+    print(f"✓ {counts['questions']} questions in {elapsed:.1f}s "
+          f"({counts['questions'] / max(elapsed, 1e-9):.1f}/s), "
+          f"{counts['cached']} from cache, {counts['errors']} errors")
+    print(f"  Stage totals (s): {summary['stage_seconds']} "
+          f"(generation time is summed across {max_workers} workers)")
+    return summary
+
 # ============================================================================
 # DEMO FUNCTIONS
 # ============================================================================
 
 def demo_setup():
-    """Run the complete RAG setup process"""
+    """
+    Run the complete RAG setup process
+    
+    Safe to re-run: only new, changed or deleted chunks touch the
+    embedding API and the vector database.
+    """
     print("\n" + "="*70)
     print("WCC RAG SYSTEM SETUP")
     print("="*70)
@@ -314,16 +851,32 @@ def demo_setup():
     print(f"✓ Created {len(chunks)} chunks from {len(SAMPLE_BLOGS)} blog posts")
     print(f"  First chunk preview: {chunks[0]['text'][:100]}...")
     
-    # Step 2: Generate embeddings
+    # Rebuild the keyword index when the set of chunks changed
+    chunk_ids = chunks.ids()
+    if bm25_index.ids != chunk_ids:
+        bm25_index.build(chunk_ids, chunks.texts())
+        print(f"✓ Built BM25 keyword index ({len(bm25_index.vocab)} terms)")
+    
+    # Compare with what is already stored
+    new_chunks, stale_ids = plan_sync(chunks)
+    print(f"  {len(chunks) - len(new_chunks)} unchanged, {len(new_chunks)} new or changed, "
+          f"{len(stale_ids)} stale")
+    
+    if not new_chunks and not stale_ids:
+        print("\n✅ Collection already up to date. Ready for queries.")
+        print("="*70)
+        return
+    
+    # Step 2: Generate embeddings (only for new / changed chunks)
     print("\n🧮 STEP 2: Generating Embeddings")
     print("-" * 70)
-    texts = [chunk["text"] for chunk in chunks]
-    embeddings = generate_embeddings(texts)
+    texts = new_chunks.texts()
+    embeddings = generate_embeddings(texts) if texts else []
     
     # Step 3: Store in vector database
-    print("\n💾 STEP 3: Storing in ChromaDB")
+    print(f"\n💾 STEP 3: Storing in the vector database ({VECTOR_BACKEND})")
     print("-" * 70)
-    store_in_vectordb(chunks, embeddings)
+    store_in_vectordb(new_chunks, embeddings, stale_ids)
     
     print("\n✅ Setup complete! Ready for queries.")
     print("="*70)
@@ -353,8 +906,8 @@ def demo_search():
             print(f"  Distance: {result['distance']:.3f} (lower = more similar)")
             print(f"  Preview: {result['text'][:150]}...")
 
-def demo_rag():
-    """Demo complete RAG pipeline"""
+def demo_rag(stream: bool = False):
+    """Demo complete RAG pipeline (stream=True prints the answer as it arrives)"""
     print("\n" + "="*70)
     print("RAG PIPELINE DEMO")
     print("="*70)
@@ -371,10 +924,23 @@ def demo_rag():
         print(f"\n❓ Question: {question}")
         print("-" * 70)
         
-        result = rag_query(question, k=3, verbose=True)
-        
-        print(f"\n💬 Answer:")
-        print(result['answer'])
+        if stream:
+            started = time.perf_counter()
+            result = rag_query_stream(question, k=3, verbose=True)
+            
+            print(f"\n💬 Answer:")
+            first_piece = None
+            for piece in result['stream']:
+                if first_piece is None:
+                    first_piece = time.perf_counter() - started
+                print(piece, end="", flush=True)
+            print(f"\n\n⏱️  First words after {first_piece:.2f}s, "
+                  f"complete after {time.perf_counter() - started:.2f}s")
+        else:
+            result = rag_query(question, k=3, verbose=True)
+            
+            print(f"\n💬 Answer:")
+            print(result['answer'])
         
         print(f"\n📚 Sources:")
         for source in result['sources']:
@@ -397,13 +963,22 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         if sys.argv[1] == "--reset":
             print("\n🔄 Resetting collection...")
-            chroma_client.delete_collection(collection_name)
-            collection = chroma_client.create_collection(collection_name)
+            get_vector_store().reset()
+            answer_cache.invalidate()
+            demo_setup()
+        elif sys.argv[1] == "--sync":
+            print("\n🔄 Syncing collection with SAMPLE_BLOGS...")
             demo_setup()
         elif sys.argv[1] == "--search":
             demo_search()
         elif sys.argv[1] == "--rag":
             demo_rag()
+        elif sys.argv[1] == "--stream":
+            demo_rag(stream=True)
+        elif sys.argv[1] == "--batch":
+            if len(sys.argv) < 4:
+                sys.exit("Usage: python rag_demo.py --batch questions.jsonl answers.jsonl")
+            batch_query(sys.argv[2], sys.argv[3])
         elif sys.argv[1] == "--all":
             demo_setup()
             input("\n⏩ Press Enter to run the semantic search demo...")
@@ -412,17 +987,20 @@ if __name__ == "__main__":
             demo_rag()
     else:
         # Default behavior: check status and auto-setup if needed
-        if collection.count() == 0:
+        if get_vector_store().count() == 0:
             print("\n⚠️  Collection is empty. Running setup...")
             demo_setup()
         else:
-            print(f"\n✓ Collection already contains {collection.count()} documents")
+            print(f"\n✓ Collection already contains {get_vector_store().count()} documents")
             print("  (Use '--reset' to clear and re-setup)")
         
         print("\n💡 Usage:")
         print("  python rag_demo.py           # Check status")
         print("  python rag_demo.py --reset   # Reset and re-setup")
+        print("  python rag_demo.py --sync    # Ingest only new/changed/deleted chunks")
         print("  python rag_demo.py --search  # Demo search")
         print("  python rag_demo.py --rag     # Demo RAG pipeline")
+        print("  python rag_demo.py --stream  # Demo RAG pipeline, streaming the answers")
         print("  python rag_demo.py --all     # Run all demos")
+        print("  python rag_demo.py --batch in.jsonl out.jsonl  # Answer a file of questions")
         print("\nFor interactive use, see: streamlit_app.py")
@@ -0,0 +1,151 @@
+"""
+WCC AI Learning Series - Session 3: Streaming Ingestion
+Chunk -> embed -> store without holding the whole corpus in memory
+
+The simple pipeline builds every chunk, every embedding and every ID in lists
+before one big `collection.add`, so peak memory grows with the corpus. Here
+each stage runs in its own thread and hands fixed-size batches to the next
+through a bounded queue:
+
+    chunks (generator) --[queue]--> embed thread --[queue]--> store thread
+
+When a downstream stage is slow the queue fills up and the upstream stage
+waits, so at most about `2 * queue_size + 3` batches are alive at any time,
+however big the corpus is.
+"""
+
+import queue
+import threading
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Marks the end of the stream on a queue
+_DONE = object()
+
+
+def batched(items: Iterable, batch_size: int) -> Iterable[List]:
+    """Yield lists of up to `batch_size` items from any iterable"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class _Aborted(Exception):
+    """Another stage failed; stop quietly so its error can be reported"""
+
+
+def _put(q: queue.Queue, item, failed: threading.Event) -> None:
+    """Blocking put that gives up once any stage has failed"""
+    while True:
+        if failed.is_set():
+            raise _Aborted()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def _get(q: queue.Queue, failed: threading.Event):
+    """Blocking get that returns _DONE once any stage has failed"""
+    while True:
+        if failed.is_set():
+            return _DONE
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+
+
+class _Stage(threading.Thread):
+    """Worker thread: take a batch from `inbox`, process it, pass it on"""
+
+    def __init__(self, name: str, inbox: queue.Queue, work: Callable,
+                 outbox: Optional[queue.Queue], failed: threading.Event):
+        super().__init__(name=name, daemon=True)
+        self.inbox = inbox
+        self.work = work
+        self.outbox = outbox
+        self.failed = failed
+        self.error = None
+
+    def run(self):
+        try:
+            while True:
+                item = _get(self.inbox, self.failed)
+                if item is _DONE:
+                    break
+                result = self.work(item)
+                if self.outbox is not None:
+                    _put(self.outbox, result, self.failed)
+            if self.outbox is not None:
+                _put(self.outbox, _DONE, self.failed)
+        except _Aborted:
+            pass
+        except BaseException as error:
+            self.error = error
+            self.failed.set()
+
+
+def run_streaming_ingest(chunks: Iterable[Dict],
+                         embed_fn: Callable[[List[str]], List[List[float]]],
+                         store_fn: Callable[[List[Dict], List[List[float]]], None],
+                         batch_size: int = 500,
+                         queue_size: int = 4,
+                         verbose: bool = True) -> Dict:
+    """
+    Stream chunks through embedding and storage with bounded memory
+
+    Args:
+        chunks: Iterable (ideally a generator) of chunk dicts with a "text" key
+        embed_fn: Embeds a list of texts, returns embeddings in the same order
+        store_fn: Writes one batch of (chunks, embeddings) to the vector store
+        batch_size: Chunks per batch (also the max size of one store write)
+        queue_size: Max batches waiting between two stages
+        verbose: Print progress
+
+    Returns:
+        Dict with the number of chunks and batches ingested
+    """
+    failed = threading.Event()
+    to_embed: queue.Queue = queue.Queue(maxsize=queue_size)
+    to_store: queue.Queue = queue.Queue(maxsize=queue_size)
+    stats = {"chunks": 0, "batches": 0}
+
+    def embed_batch(batch):
+        return batch, embed_fn([chunk["text"] for chunk in batch])
+
+    def store_batch(item):
+        batch, embeddings = item
+        store_fn(batch, embeddings)
+        stats["chunks"] += len(batch)
+        stats["batches"] += 1
+        if verbose:
+            print(f"  Stored {stats['chunks']} chunks ({stats['batches']} batches)")
+
+    embedder = _Stage("embed", to_embed, embed_batch, to_store, failed)
+    storer = _Stage("store", to_store, store_batch, None, failed)
+    embedder.start()
+    storer.start()
+
+    # Produce batches from the calling thread
+    try:
+        for batch in batched(chunks, batch_size):
+            _put(to_embed, batch, failed)
+        _put(to_embed, _DONE, failed)
+    except _Aborted:
+        pass  # A stage failed; its error is raised below
+    except BaseException:
+        failed.set()  # Reading the source failed; stop the workers
+        raise
+
+    embedder.join()
+    storer.join()
+
+    for stage in (embedder, storer):
+        if stage.error is not None:
+            raise stage.error
+    return stats
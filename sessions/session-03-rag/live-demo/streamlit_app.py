@@ -10,10 +10,15 @@ import sys
 from typing import Dict, List
 
 # Import our RAG functions
+import rag_demo
 from rag_demo import (
     semantic_search,
-    rag_query,
-    collection,
+    hybrid_search,
+    bm25_index,
+    rag_query_stream,
+    get_client,
+    get_vector_store,
+    query_embedding_cache,
     SAMPLE_BLOGS,
     demo_setup
 )
@@ -29,6 +34,34 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ============================================================================
+# CACHED RESOURCES
+# ============================================================================
+
+# Streamlit reruns this whole script on every widget interaction. The
+# Vertex AI client and the vector store are created once per server process
+# and shared by every rerun and session; the chunk counts are computed once
+# and only recomputed after an ingest (index_counts.clear()).
+
+@st.cache_resource(show_spinner="Connecting to Vertex AI and the vector store...")
+def load_rag_resources():
+    """Generative AI client and vector store, created once per process"""
+    return get_client(), get_vector_store()
+
+@st.cache_data(show_spinner=False)
+def index_counts() -> Dict:
+    """Chunks indexed: 'total' and 'per_blog' (url -> chunks)"""
+    store = get_vector_store()
+    return {
+        "total": store.count(),
+        "per_blog": {blog['url']: len(store.get_ids(where={"url": blog['url']}))
+                     for blog in SAMPLE_BLOGS},
+    }
+
+# Hand the cached objects to rag_demo (it may have been reloaded since they were created)
+rag_demo.client, rag_demo.vector_store = load_rag_resources()
+counts = index_counts()
+
 # ============================================================================
 # CUSTOM CSS
 # ============================================================================
@@ -103,12 +136,34 @@ with st.sidebar:
         help="Display distance scores (lower = more similar)"
     )
     
+    use_hybrid = st.checkbox(
+        "Hybrid search (keywords + meaning)",
+        value=True,
+        help="Fuse BM25 keyword matches with vector search results"
+    )
+    
+    use_diversify = st.checkbox(
+        "Diverse results (MMR)",
+        value=False,
+        help="Skip near-duplicate chunks of the same post (uses vector search only)"
+    )
+    
+    lambda_mult = st.slider(
+        "Relevance vs. diversity",
+        min_value=0.0,
+        max_value=1.0,
+        value=rag_demo.DEFAULT_LAMBDA,
+        step=0.1,
+        disabled=not use_diversify,
+        help="MMR trade-off: 1.0 = relevance only, 0.0 = diversity only"
+    )
+    
     st.markdown("---")
     
     st.markdown("### 📊 System Status")
     
     # Check collection status
-    doc_count = collection.count()
+    doc_count = counts["total"]
     
     if doc_count > 0:
         st.success(f"✓ {doc_count} chunks indexed")
@@ -117,6 +172,7 @@ with st.sidebar:
         if st.button("Initialize System"):
             with st.spinner("Setting up RAG system..."):
                 demo_setup()
+            index_counts.clear()
             st.rerun()
     
     st.markdown(f"""
@@ -126,6 +182,11 @@ with st.sidebar:
     **LLM:** gemini-2.5-flash-lite
     """)
     
+    cache_stats = query_embedding_cache.stats()
+    st.caption(f"Query cache: {cache_stats['hit_rate']:.0%} hit rate "
+               f"({cache_stats['hits'] + cache_stats['coalesced']} reused, "
+               f"{cache_stats['misses']} embedded)")
+    
     st.markdown("---")
     
     st.markdown("""
@@ -145,7 +206,7 @@ st.markdown('<p class="sub-header">Ask questions about Women Coding Community co
             unsafe_allow_html=True)
 
 # Check if system is initialized
-if collection.count() == 0:
+if counts["total"] == 0:
     st.error("⚠️ System not initialized. Please click 'Initialize System' in the sidebar.")
     st.stop()
 
@@ -180,14 +241,14 @@ with tab1:
             question = "What advice do you have for mentees?"
     
     if question:
-        with st.spinner("🔍 Searching and generating answer..."):
-            result = rag_query(question, k=num_results)
+        with st.spinner("🔍 Searching..."):
+            result = rag_query_stream(question, k=num_results, hybrid=use_hybrid,
+                                      diversify=use_diversify, lambda_mult=lambda_mult)
         
-        # Display answer
-        st.markdown("### 💬 Answer")
-        st.markdown(result['answer'])
+        # The answer goes above the sources, but is filled in last (streamed)
+        answer_box = st.container()
         
-        # Display sources
+        # Display sources (known as soon as retrieval is done)
         if result['sources']:
             st.markdown("### 📚 Sources")
             for i, source in enumerate(result['sources'], 1):
@@ -205,12 +266,27 @@ with tab1:
             
             for i, chunk in enumerate(result['chunks'], 1):
                 with st.expander(f"Chunk {i}: {chunk['metadata']['title']}"):
-                    if show_distances:
+                    if show_distances and chunk['distance'] is not None:
                         st.markdown(f"**Similarity score:** {chunk['distance']:.4f}")
+                    elif show_distances:
+                        st.markdown("**Keyword match** (found by BM25)")
                     st.markdown(f"**Source:** {chunk['metadata']['title']}")
-                    st.markdown(f"**Chunk ID:** {chunk['metadata']['chunk_id']} of {chunk['metadata']['total_chunks']}")
+                    first = chunk['metadata']['chunk_id']
+                    merged = len(chunk.get('ids', [chunk['id']]))
+                    if merged > 1:
+                        st.markdown(f"**Chunks:** {merged} neighbours merged, from {first} "
+                                    f"(of {chunk['metadata']['total_chunks']})")
+                    else:
+                        st.markdown(f"**Chunk ID:** {first} of {chunk['metadata']['total_chunks']}")
                     st.markdown("---")
                     st.markdown(chunk['text'])
+        
+        # Display answer, word by word as Gemini generates it
+        with answer_box:
+            st.markdown("### 💬 Answer")
+            st.write_stream(result['stream'])
+            if result.get('cached'):
+                st.caption("⚡ Reused a cached answer to a near-identical question")
 
 # ============================================================================
 # TAB 2: SEMANTIC SEARCH
@@ -241,7 +317,13 @@ with tab2:
     
     if search_query:
         with st.spinner("🔍 Searching..."):
-            results = semantic_search(search_query, k=num_results)
+            if use_diversify:
+                results = semantic_search(search_query, k=num_results, diversify=True,
+                                          lambda_mult=lambda_mult)
+            elif use_hybrid and len(bm25_index):
+                results = hybrid_search(search_query, k=num_results)
+            else:
+                results = semantic_search(search_query, k=num_results)
         
         if results:
             st.markdown(f"### Found {len(results)} relevant chunks")
@@ -255,8 +337,10 @@ with tab2:
                         st.markdown(f"**Date:** {result['metadata']['date']}")
                         st.markdown(f"**URL:** [{result['metadata']['url']}]({result['metadata']['url']})")
                     with col2:
-                        if show_distances:
+                        if show_distances and result['distance'] is not None:
                             st.markdown(f"**Score:** {result['distance']:.4f}")
+                        elif show_distances:
+                            st.markdown("**Keyword match**")
                     
                     # Content
                     st.markdown("---")
@@ -282,9 +366,7 @@ with tab3:
                 st.markdown(f"**URL:** [{blog['url']}]({blog['url']})")
             with col2:
                 # Count chunks for this blog
-                chunks_in_blog = sum(1 for j in range(collection.count()) 
-                                   if collection.get(ids=[f"chunk_{j}"])['metadatas'][0]['title'] == blog['title'])
-                st.metric("Chunks", chunks_in_blog)
+                st.metric("Chunks", counts["per_blog"].get(blog['url'], 0))
             
             st.markdown("**Content Preview:**")
             st.markdown(f'<div class="chunk-preview">{blog["content"][:500]}...</div>', 
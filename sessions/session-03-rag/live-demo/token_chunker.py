@@ -0,0 +1,123 @@
+"""
+WCC AI Learning Series - Session 3: Token-Aware Chunking
+Chunks measured in tokens, the unit embedding models actually charge and limit
+
+Measuring chunks with len() gives very uneven token counts (code, URLs and
+non-English text use far more tokens per character than plain prose).
+TokenChunker budgets chunks in tokens using the same tiktoken encoding as
+utilities/token_counter.py:
+
+- Each document is encoded ONCE, keeping the character offset of every token
+- A chunk's furthest possible end is a lookup (start token + chunk_size)
+- It then backs off to the nearest paragraph / line / sentence / word break,
+  mapped back to a token with a binary search over the offsets - candidate
+  splits are never re-encoded
+
+It returns (start, end) character spans, like parallel_chunking.split_spans(),
+so the results drop straight into ChunkStore and stable chunk IDs.
+"""
+
+from bisect import bisect_right
+from typing import List, Optional, Sequence, Tuple
+
+from token_counter import CHARS_PER_TOKEN, get_token_counter
+
+SEPARATORS = ["\n\n", "\n", ". ", " "]
+
+
+def tokens_available() -> bool:
+    """True if the tiktoken encoding can be loaded"""
+    return get_token_counter().exact
+
+
+class TokenChunker:
+    """
+    Split text into chunks of at most `chunk_size` tokens
+
+    Usage:
+        chunker = TokenChunker(chunk_size=100, chunk_overlap=12)
+        spans = chunker.split_spans(text)
+        chunks = [text[start:end] for start, end in spans]
+    """
+
+    def __init__(self, chunk_size: int = 100, chunk_overlap: int = 12,
+                 separators: Optional[Sequence[str]] = None, encoding=None):
+        """
+        Args:
+            chunk_size: Max tokens per chunk
+            chunk_overlap: Tokens shared by neighbouring chunks
+            separators: Preferred split points, tried in order
+            encoding: A tiktoken Encoding (default: the shared TokenCounter's)
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = [sep for sep in (separators or SEPARATORS) if sep]
+        self.encoding = encoding or get_token_counter().encoding
+        if self.encoding is None:
+            raise RuntimeError("tiktoken encoding unavailable (pip install tiktoken; "
+                               "the vocabulary is downloaded on first use)")
+
+    def token_offsets(self, text: str) -> List[int]:
+        """Character offset where each token starts, plus len(text) at the end"""
+        tokens = self.encoding.encode_ordinary(text)
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        offsets.append(len(text))
+        return offsets
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Chunk `text` in one encode pass
+
+        Returns:
+            (start, end) character offsets per chunk, whitespace trimmed
+        """
+        offsets = self.token_offsets(text)
+        num_tokens = len(offsets) - 1
+        spans = []
+        first = 0
+
+        while first < num_tokens:
+            last = min(first + self.chunk_size, num_tokens)
+            if last < num_tokens:
+                # Back off to a natural break in the second half of the window
+                lo = offsets[first + self.chunk_size // 2]
+                split = self._split_point(text, lo, offsets[last])
+                last = min(bisect_right(offsets, split) - 1, last)
+                if last <= first:
+                    last = min(first + self.chunk_size, num_tokens)
+
+            start, end = _trim(text, offsets[first], offsets[last])
+            if start < end:
+                spans.append((start, end))
+            if last >= num_tokens:
+                break
+            first = self._overlap_start(text, offsets, first, last)
+
+        return spans
+
+    def _split_point(self, text: str, lo: int, hi: int) -> int:
+        """Character position just after the best separator in text[lo:hi]"""
+        for sep in self.separators:
+            pos = text.rfind(sep, lo, hi)
+            if pos != -1:
+                return pos + len(sep)
+        return hi
+
+    def _overlap_start(self, text: str, offsets: List[int], first: int, last: int) -> int:
+        """First token of the next chunk: chunk_overlap tokens back, moved to a word start"""
+        start = max(last - self.chunk_overlap, first + 1)
+        for token in range(start, last):
+            pos = offsets[token]
+            if 0 < pos < len(text) and (text[pos].isspace() or text[pos - 1].isspace()):
+                return token
+        return start
+
+
+def _trim(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
@@ -0,0 +1,671 @@
+"""
+WCC AI Learning Series - Session 3: Vector Stores
+One small interface, two backends
+
+- ChromaVectorStore: the ChromaDB collection we use in the demo
+- NumpyVectorStore: an in-process index in pure NumPy
+
+The NumPy backend keeps every embedding L2-normalized in one contiguous
+float32 matrix. A query is a single matrix-vector product followed by
+`argpartition` for the top k, and metadata filters are precomputed boolean
+masks. query_batch() scores a whole block of queries with one matrix-matrix
+product. The matrix is saved as a `.npy` file and memory-mapped on load, so
+opening a large index is instant and pages are read only when needed.
+Chunk texts and metadata live in SQLite next to it and are read only for
+the rows a query returns, so memory doesn't grow with the corpus text.
+For corpora up to a few million chunks this skips ChromaDB's per-query
+overhead entirely.
+
+The "ann" backend is the NumPy index plus an IVF-PQ approximate index
+(see ann_index.py) for archives where even one pass over the matrix is too
+slow. Its `nprobe` knob trades recall for speed.
+
+Pick a backend with the VECTOR_BACKEND environment variable ("chroma",
+"numpy" or "ann").
+"""
+
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import chromadb
+import numpy as np
+
+from ann_index import IVFPQIndex
+
+# Max query x row similarity scores computed at once by query_batch() (128 MB of float32)
+QUERY_BLOCK_ELEMENTS = 32 * 1024 * 1024
+
+# SQLite limits the number of "?" parameters in a single statement
+_SQL_BATCH = 500
+
+
+class VectorStore:
+    """
+    Interface shared by all backends
+
+    Results from query() and get() are dicts with 'id', 'text', 'metadata'
+    and (for query) 'distance', where lower = more similar.
+    """
+
+    def upsert(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]],
+               documents: Sequence[str], metadatas: Sequence[Dict]) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: Sequence[str]) -> None:
+        raise NotImplementedError
+
+    def get(self, ids: Sequence[str]) -> List[Dict]:
+        raise NotImplementedError
+
+    def get_ids(self, where: Optional[Dict] = None) -> List[str]:
+        raise NotImplementedError
+
+    def query(self, embedding: Sequence[float], k: int = 5, where: Optional[Dict] = None,
+              include_embeddings: bool = False) -> List[Dict]:
+        """
+        Nearest chunks to `embedding`: dicts with id, text, metadata and
+        distance (lower = more similar), plus 'embedding' if requested
+        """
+        raise NotImplementedError
+
+    def query_batch(self, embeddings: Sequence[Sequence[float]], k: int = 5,
+                    where: Optional[Dict] = None, include_embeddings: bool = False) -> List[List[Dict]]:
+        """query() for many embeddings at once: one result list per embedding"""
+        return [self.query(embedding, k, where, include_embeddings) for embedding in embeddings]
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+    def persist(self) -> None:
+        """Flush pending writes to disk (no-op for backends that write through)"""
+
+
+# ============================================================================
+# CHROMADB BACKEND
+# ============================================================================
+
+class ChromaVectorStore(VectorStore):
+    """
+    ChromaDB collection behind the VectorStore interface
+
+    Collections are created in cosine space, so 'distance' is 1 - cosine
+    similarity like the NumPy backend (Chroma's default is squared L2).
+    Collections created before that still rank by L2; their distances are
+    recomputed as cosine distances from the returned embeddings.
+    """
+
+    COLLECTION_METADATA = {"hnsw:space": "cosine"}
+
+    def __init__(self, path: str = "./chroma_data", collection_name: str = "wcc_blogs"):
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection_name = collection_name
+
+        # Create or get collection
+        try:
+            self.collection = self.client.get_collection(collection_name)
+            print(f"✓ Using existing collection: {collection_name}")
+        except Exception:
+            self.collection = self.client.create_collection(
+                collection_name, metadata=self.COLLECTION_METADATA)
+            print(f"✓ Created new collection: {collection_name}")
+        self._cosine = (self.collection.metadata or {}).get("hnsw:space") == "cosine"
+        if not self._cosine:
+            print("  (collection uses L2 ranking; reset it to index by cosine similarity)")
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=list(ids), embeddings=np.asarray(embeddings, dtype=np.float32),
+                               documents=list(documents), metadatas=list(metadatas))
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def get(self, ids):
+        if not ids:
+            return []
+        results = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return [{"id": i, "text": t, "metadata": m}
+                for i, t, m in zip(results["ids"], results["documents"], results["metadatas"])]
+
+    def get_ids(self, where=None):
+        return self.collection.get(where=where, include=[])["ids"]
+
+    def query(self, embedding, k=5, where=None, include_embeddings=False):
+        return self.query_batch([embedding], k, where, include_embeddings)[0]
+
+    def query_batch(self, embeddings, k=5, where=None, include_embeddings=False):
+        if not len(embeddings):
+            return []
+        # Older L2 collections: fetch the embeddings to report cosine distances
+        with_embeddings = include_embeddings or not self._cosine
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if with_embeddings else [])
+        queries = np.asarray(embeddings, dtype=np.float32)
+        results = self.collection.query(query_embeddings=queries, n_results=k, where=where,
+                                        include=include)
+        if not self._cosine:
+            results['distances'] = [
+                (1.0 - _normalize(np.asarray(found, dtype=np.float32)) @ _normalize(query)).tolist()
+                if len(found) else []
+                for query, found in zip(queries, results['embeddings'])]
+
+        # Format results (one list per query embedding)
+        batch = []
+        for q in range(len(embeddings)):
+            relevant_docs = []
+            for i in range(len(results['documents'][q]) if results['documents'] else 0):
+                relevant_docs.append({
+                    'id': results['ids'][q][i],
+                    'text': results['documents'][q][i],
+                    'metadata': results['metadatas'][q][i],
+                    'distance': results['distances'][q][i]  # Lower = more similar
+                })
+                if include_embeddings:
+                    relevant_docs[-1]['embedding'] = results['embeddings'][q][i]
+            batch.append(relevant_docs)
+        return batch
+
+    def count(self):
+        return self.collection.count()
+
+    def reset(self):
+        self.client.delete_collection(self.collection_name)
+        self.collection = self.client.create_collection(
+            self.collection_name, metadata=self.COLLECTION_METADATA)
+        self._cosine = True
+
+
+# ============================================================================
+# NUMPY BACKEND
+# ============================================================================
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector index: one normalized float32 matrix + metadata columns
+
+    Files in `path`:
+        embeddings-<n>.npy - (rows, dim) float32 matrix, memory-mapped on load
+        records.sqlite     - id, matrix row, document and metadata of each
+                             chunk, and the name of the current matrix file
+        ann/               - IVF-PQ index (only with ann=True)
+
+    Writes are kept in memory (matrix) and in an open SQLite transaction
+    (records) until persist() is called. persist() writes the matrix to a
+    new file and switches to it in the same commit as the records, so a
+    crash at any point leaves the previous matrix and records together.
+
+    With ann=True queries go through an IVF-PQ index once the store holds
+    `ann_min_rows` vectors (below that exact search is already fast). The
+    `k * refine` best approximate candidates are re-scored exactly, so the
+    returned distances are always exact cosine distances.
+    """
+
+    def __init__(self, path: str = "./numpy_index", collection_name: str = "wcc_blogs",
+                 ann: bool = False, nprobe: int = 16, refine: int = 4,
+                 ann_min_rows: int = 100_000):
+        """
+        Args:
+            path: Storage directory
+            collection_name: Index name (a subfolder of `path`)
+            ann: Use an approximate IVF-PQ index for large collections
+            nprobe: Clusters searched per ANN query (higher = better recall, slower)
+            refine: Approximate candidates re-scored exactly, as a multiple of k
+            ann_min_rows: Collection size at which the ANN index is first built
+        """
+        self.path = os.path.join(path, collection_name)
+        self.collection_name = collection_name
+        self._records_path = os.path.join(self.path, "records.sqlite")
+        self._ann_path = os.path.join(self.path, "ann")
+
+        self.ann = ann
+        self.nprobe = nprobe
+        self.refine = max(refine, 1)
+        self.ann_min_rows = ann_min_rows
+        self._index: Optional[IVFPQIndex] = None
+
+        self._size = 0                             # rows [0, _size) of the matrix are in use
+        self._matrix: Optional[np.ndarray] = None
+        self._alive: Optional[np.ndarray] = None   # False = deleted, dropped on persist()
+        self._masks: Dict[Tuple[str, str], np.ndarray] = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if os.path.exists(self._records_path) or os.path.exists(
+                os.path.join(self.path, "records.json")):
+            self._open_records()
+            self._import_records_json()
+            matrix_file = self._matrix_file()
+            self._remove_stale_matrices(matrix_file)
+            if matrix_file is not None:
+                self._matrix = np.load(os.path.join(self.path, matrix_file), mmap_mode="r")
+                self._size = self._matrix.shape[0]
+                self._alive = np.ones(self._size, dtype=bool)
+            if ann and os.path.exists(os.path.join(self._ann_path, "meta.json")):
+                self._index = IVFPQIndex.load(self._ann_path)
+            print(f"✓ Using existing index: {self.path} ({self._size} vectors)")
+        else:
+            print(f"✓ Created new index: {self.path}")
+
+    # ------------------------------------------------------------------------
+    # Records (SQLite)
+    # ------------------------------------------------------------------------
+
+    def _open_records(self) -> sqlite3.Connection:
+        """The records database, created on first use"""
+        if self._conn is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._conn = sqlite3.connect(self._records_path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    id TEXT PRIMARY KEY,
+                    row INTEGER NOT NULL,
+                    document TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_row ON records(row)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.commit()
+        return self._conn
+
+    def _matrix_file(self) -> Optional[str]:
+        """Name of the matrix file the committed records belong to (None = no matrix yet)"""
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'matrix'").fetchone()
+        if row is not None:
+            return row[0]
+        # Indexes saved before the matrix was versioned
+        return "embeddings.npy" if os.path.exists(os.path.join(self.path, "embeddings.npy")) else None
+
+    def _remove_stale_matrices(self, current: Optional[str]) -> None:
+        """Delete matrix files left over from earlier (or interrupted) persist() calls"""
+        for file_path in glob.glob(os.path.join(self.path, "embeddings*.npy")):
+            if os.path.basename(file_path) != current:
+                try:
+                    os.remove(file_path)
+                except OSError:  # Still memory-mapped (Windows); removed next time
+                    pass
+
+    def _import_records_json(self) -> None:
+        """One-time upgrade of an index saved with records.json"""
+        json_path = os.path.join(self.path, "records.json")
+        if not os.path.exists(json_path):
+            return
+        with open(json_path, encoding="utf-8") as f:
+            records = json.load(f)
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO records (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+            ((chunk_id, row, document, json.dumps(metadata)) for row, (chunk_id, document, metadata)
+             in enumerate(zip(records["ids"], records["documents"], records["metadatas"]))))
+        self._conn.commit()
+        os.remove(json_path)
+
+    def _rows_of(self, ids: Sequence[str]) -> Dict[str, int]:
+        """Matrix row of each id that is stored (deleted ids are not)"""
+        if self._conn is None:
+            return {}
+        rows = {}
+        ids = list(dict.fromkeys(ids))
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = ids[start:start + _SQL_BATCH]
+            rows.update(self._conn.execute(
+                f"SELECT id, row FROM records WHERE id IN ({','.join('?' * len(batch))})",
+                batch).fetchall())
+        return rows
+
+    def _records_at(self, rows: Sequence[int]) -> Dict[int, Tuple[str, str, Dict]]:
+        """(id, document, metadata) for matrix rows"""
+        records = {}
+        rows = [int(row) for row in rows]
+        for start in range(0, len(rows), _SQL_BATCH):
+            batch = rows[start:start + _SQL_BATCH]
+            for row, chunk_id, document, metadata in self._conn.execute(
+                    "SELECT row, id, document, metadata FROM records "
+                    f"WHERE row IN ({','.join('?' * len(batch))})", batch):
+                records[row] = (chunk_id, document, json.loads(metadata))
+        return records
+
+    # ------------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------------
+
+    def _writable_matrix(self, rows_needed: int, dim: int) -> np.ndarray:
+        """In-memory matrix with room for `rows_needed` rows (grows by doubling)"""
+        if self._matrix is None:
+            self._matrix = np.zeros((max(rows_needed, 1024), dim), dtype=np.float32)
+            self._alive = np.zeros(self._matrix.shape[0], dtype=bool)
+            return self._matrix
+
+        capacity = self._matrix.shape[0]
+        if rows_needed > capacity:
+            capacity = max(rows_needed, capacity * 2)
+
+        # A memory-mapped matrix is read-only: copy it into memory before writing
+        if isinstance(self._matrix, np.memmap) or capacity != self._matrix.shape[0]:
+            n = self._size
+            grown = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+            grown[:n] = self._matrix[:n]
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:n] = self._alive[:n]
+            self._matrix, self._alive = grown, alive
+        return self._matrix
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not len(ids):
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._open_records()
+            rows = self._rows_of(ids)
+            new_ids = [chunk_id for chunk_id in dict.fromkeys(ids) if chunk_id not in rows]
+            matrix = self._writable_matrix(self._size + len(new_ids), vectors.shape[1])
+            for chunk_id in new_ids:
+                rows[chunk_id] = self._size
+                self._size += 1
+
+            for chunk_id, vector in zip(ids, vectors):
+                matrix[rows[chunk_id]] = vector
+                self._alive[rows[chunk_id]] = True
+            # Uncommitted until persist()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+                [(chunk_id, rows[chunk_id], document, json.dumps(metadata))
+                 for chunk_id, document, metadata in zip(ids, documents, metadatas)])
+
+            if self._index is not None:
+                # New and changed vectors are searchable right away (no retraining)
+                self._index.add([rows[chunk_id] for chunk_id in ids], vectors)
+
+            self._masks.clear()
+            self._dirty = True
+
+    def delete(self, ids):
+        with self._lock:
+            rows = self._rows_of(ids)
+            if not rows:
+                return
+            self._alive[list(rows.values())] = False
+            self._conn.executemany("DELETE FROM records WHERE id = ?",
+                                   [(chunk_id,) for chunk_id in rows])
+            self._masks.clear()
+            self._dirty = True
+
+    def persist(self):
+        """Write the matrix to disk and commit the records, compacting deleted rows"""
+        with self._lock:
+            if not self._dirty:
+                return
+            n = self._size
+            keep = np.flatnonzero(self._alive[:n]) if self._alive is not None else np.arange(0)
+
+            os.makedirs(self.path, exist_ok=True)
+            dim = self._matrix.shape[1] if self._matrix is not None else 0
+            matrix = (np.ascontiguousarray(self._matrix[keep]) if self._matrix is not None
+                      else np.zeros((0, dim), dtype=np.float32))
+
+            # Renumber the records after deleted rows (ascending, so rows never collide);
+            # only rows after the first deletion move
+            moved = np.flatnonzero(keep != np.arange(len(keep)))
+            self._open_records().executemany(
+                "UPDATE records SET row = ? WHERE row = ?",
+                [(int(new), int(keep[new])) for new in moved])
+
+            # The matrix goes to a new file; committing its name with the records
+            # is the single step that switches the index to the new version
+            previous = self._matrix_file()
+            version = (int(previous[len("embeddings-"):-len(".npy")]) + 1
+                       if previous and previous.startswith("embeddings-") else 1)
+            matrix_file = f"embeddings-{version}.npy"
+            np.save(os.path.join(self.path, matrix_file + ".tmp.npy"), matrix)
+            os.replace(os.path.join(self.path, matrix_file + ".tmp.npy"),
+                       os.path.join(self.path, matrix_file))
+            self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('matrix', ?)",
+                               (matrix_file,))
+            self._conn.commit()
+
+            self._matrix = np.load(os.path.join(self.path, matrix_file), mmap_mode="r")
+            self._remove_stale_matrices(matrix_file)
+            self._size = len(keep)
+            self._alive = np.ones(self._size, dtype=bool)
+            self._masks.clear()
+            self._dirty = False
+
+        if self.ann:
+            # Rows were renumbered by the compaction above
+            row_map = np.full(n, -1, dtype=np.int64)
+            row_map[keep] = np.arange(len(keep))
+            self._update_index(row_map)
+
+    def _update_index(self, row_map: np.ndarray) -> None:
+        """Keep the ANN index in step with the matrix after persist()"""
+        n = self._size
+        if self._index is None or n > 8 * self._index.built_on:
+            # Build, or rebuild once the collection is 8x the size the clusters were learned at
+            if n < self.ann_min_rows:
+                return
+            print(f"  Building IVF-PQ index over {n} vectors...")
+            self._index = IVFPQIndex(self._matrix.shape[1], nprobe=self.nprobe)
+            self._index.train(self._matrix)
+            for start in range(0, n, 100_000):
+                rows = np.arange(start, min(start + 100_000, n))
+                self._index.add(rows, self._matrix[rows])
+        else:
+            self._index.compact(row_map)
+        self._index.save(self._ann_path)
+
+    def reset(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            for file_path in (self._records_path, os.path.join(self.path, "records.json")):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            self._matrix = None
+            self._remove_stale_matrices(None)
+            self._size = 0
+            self._matrix, self._alive = None, None
+            self._masks.clear()
+            self._dirty = False
+            self._index = None
+            shutil.rmtree(self._ann_path, ignore_errors=True)
+
+    # ------------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------------
+
+    def _mask(self, where: Optional[Dict]) -> np.ndarray:
+        """
+        Boolean row mask for a Chroma-style filter
+
+        Supports {"key": value}, {"key": {"$eq": v}}, {"key": {"$in": [...]}}
+        and {"$and": [...]}. Masks per (key, value) are cached until the next write.
+        """
+        n = self._size
+        mask = self._alive[:n].copy() if self._alive is not None else np.zeros(0, dtype=bool)
+        if not where:
+            return mask
+
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._mask(clause)
+                continue
+            if isinstance(condition, dict):
+                if "$in" in condition:
+                    values = condition["$in"]
+                elif "$eq" in condition:
+                    values = [condition["$eq"]]
+                else:
+                    raise ValueError(f"Unsupported filter: {condition}")
+            else:
+                values = [condition]
+
+            any_value = np.zeros(n, dtype=bool)
+            for value in values:
+                any_value |= self._value_mask(key, value)
+            mask &= any_value
+        return mask
+
+    def _value_mask(self, key: str, value: Any) -> np.ndarray:
+        cache_key = (key, json.dumps(value))
+        if cache_key not in self._masks:
+            mask = np.zeros(self._size, dtype=bool)
+            if self._conn is not None:
+                path = '$."' + key.replace('"', '""') + '"'
+                if value is None:
+                    condition, params = "json_extract(metadata, ?) IS NULL", [path]
+                elif isinstance(value, (list, dict)):
+                    condition, params = "json_extract(metadata, ?) = json(?)", [path, json.dumps(value)]
+                else:
+                    condition, params = "json_extract(metadata, ?) = ?", [path, value]
+                with self._lock:
+                    rows = self._conn.execute(f"SELECT row FROM records WHERE {condition}",
+                                              params).fetchall()
+                mask[[row for (row,) in rows]] = True
+            self._masks[cache_key] = mask
+        return self._masks[cache_key]
+
+    def get(self, ids):
+        with self._lock:
+            rows = self._rows_of(ids)
+            records = self._records_at(rows.values())
+        results = []
+        for chunk_id in ids:
+            if chunk_id in rows:
+                _, document, metadata = records[rows[chunk_id]]
+                results.append({"id": chunk_id, "text": document, "metadata": metadata})
+        return results
+
+    def get_ids(self, where=None):
+        rows = np.flatnonzero(self._mask(where))
+        with self._lock:
+            records = self._records_at(rows)
+        return [records[row][0] for row in rows]
+
+    def query(self, embedding, k=5, where=None, include_embeddings=False):
+        n = self._size
+        if n == 0 or k <= 0:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+
+        mask = self._mask(where)
+        candidates = int(mask.sum())
+        if candidates == 0:
+            return []
+        k = min(k, candidates)
+
+        if self._index is not None and candidates > n // 10:
+            # Approximate candidates from the IVF-PQ index, re-scored exactly
+            rows, _ = self._index.search(query, k=k * self.refine, nprobe=self.nprobe)
+            rows = rows[mask[rows]]
+            if len(rows) >= k:
+                return self._top_k(rows, query, k, include_embeddings)
+
+        # Exact search; a selective filter only scores the rows it lets through
+        rows = np.flatnonzero(mask) if candidates < n else None
+        return self._top_k(rows, query, k, include_embeddings)
+
+    def _top_k(self, rows: Optional[np.ndarray], query: np.ndarray, k: int,
+               include_embeddings: bool = False) -> List[Dict]:
+        """Exact top k among `rows` (None = every row)"""
+        if rows is None:
+            rows = np.arange(self._size)
+            similarities = self._matrix[:len(rows)] @ query
+        else:
+            rows = np.sort(rows)  # Sorted rows read the memory-mapped matrix in order
+            similarities = self._matrix[rows] @ query
+
+        # Top k without sorting everything: partition, then sort just those k
+        k = min(k, len(rows))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return self._results(rows[top], similarities[top], include_embeddings)
+
+    def _results(self, rows: np.ndarray, similarities: np.ndarray,
+                 include_embeddings: bool = False) -> List[Dict]:
+        """Result dicts for matrix `rows`, best first"""
+        with self._lock:
+            records = self._records_at(rows)
+        results = [{
+            "id": records[row][0],
+            "text": records[row][1],
+            "metadata": records[row][2],
+            "distance": float(1.0 - similarity),  # Cosine distance, lower = more similar
+        } for row, similarity in zip(rows, similarities)]
+        if include_embeddings:
+            for result, embedding in zip(results, self._matrix[rows]):
+                result["embedding"] = embedding  # Normalized row of the matrix
+        return results
+
+    def query_batch(self, embeddings, k=5, where=None, include_embeddings=False):
+        """
+        Exact top k for many queries: one matrix-matrix product per block of
+        queries instead of one matrix-vector product each
+        """
+        n = self._size
+        if self._index is not None or n == 0 or k <= 0 or not len(embeddings):
+            return super().query_batch(embeddings, k, where, include_embeddings)
+
+        mask = self._mask(where)
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return [[] for _ in embeddings]
+        matrix = self._matrix[:n] if len(rows) == n else self._matrix[rows]
+        k = min(k, len(rows))
+
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32))
+        block = max(1, QUERY_BLOCK_ELEMENTS // len(rows))  # Caps the (queries x rows) scores matrix
+        batch = []
+        for start in range(0, len(queries), block):
+            similarities = queries[start:start + block] @ matrix.T
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            top_similarities = np.take_along_axis(similarities, top, axis=1)
+            order = np.argsort(-top_similarities, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_similarities = np.take_along_axis(top_similarities, order, axis=1)
+            batch.extend(self._results(rows[top_row], sims, include_embeddings)
+                         for top_row, sims in zip(top, top_similarities))
+        return batch
+
+    def count(self):
+        return int(self._alive[:self._size].sum()) if self._alive is not None else 0
+
+
+# ============================================================================
+# FACTORY
+# ============================================================================
+
+def open_vector_store(backend: str = "chroma", collection_name: str = "wcc_blogs",
+                      path: Optional[str] = None) -> VectorStore:
+    """
+    Open a vector store by backend name
+
+    Args:
+        backend: "chroma" (ChromaDB), "numpy" (in-process NumPy index) or
+                 "ann" (NumPy index + IVF-PQ; ANN_NPROBE sets nprobe, default 16)
+        collection_name: Collection / index name
+        path: Storage directory (default: ./chroma_data or ./numpy_index)
+    """
+    if backend == "chroma":
+        return ChromaVectorStore(path or "./chroma_data", collection_name)
+    if backend == "numpy":
+        return NumpyVectorStore(path or "./numpy_index", collection_name)
+    if backend == "ann":
+        return NumpyVectorStore(path or "./numpy_index", collection_name, ann=True,
+                                nprobe=int(os.getenv("ANN_NPROBE", "16")))
+    raise ValueError(f"Unknown vector backend: {backend!r} (use 'chroma', 'numpy' or 'ann')")
@@ -0,0 +1,157 @@
+"""
+WCC AI Learning Series - Session 3: Corpus Session
+Pay the setup cost once, then answer questions on a warm path
+
+Asking a RAG Engine corpus a question used to rebuild everything per call:
+the API clients, the corpus resource, the retrieval settings. A
+CorpusSession does that once (backend.retriever()) and keeps:
+
+- the corpus name and retrieval config (top k), bound into one retriever
+- the generative model client, which reuses its connections
+- a thread pool, so ask_many() runs several retrievals and generations
+  at once (the work is waiting on the network, not on Python)
+
+Every answer carries its timings (retrieve / generate / total, in ms) and
+stats() sums them up, so the effect of the warm path is visible.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from rag_backends import RagBackend
+
+
+def build_prompt(question: str, contexts: Sequence[Dict]) -> str:
+    """The grounded prompt: numbered sources, then the question"""
+    context = "\n\n".join(f"[Source {i}: {ctx['source_uri']}]\n{ctx['text']}"
+                          for i, ctx in enumerate(contexts, 1))
+    return f"""You are a helpful assistant for the Women Coding Community (WCC).
+Answer the question based ONLY on the provided context below.
+If the context doesn't contain enough information to answer the question, say so.
+Always cite your sources using the format [Source X] where X is the source number.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer (with citations):"""
+
+
+class CorpusSession:
+    """
+    A long-lived, reusable handle on one RAG corpus
+
+    Usage:
+        with CorpusSession(backend, corpus.name, client=genai.Client(...)) as session:
+            result = session.ask("How do I learn Python?")
+            print(result["answer"], result["timings"])
+            results = session.ask_many(questions)  # concurrently, in input order
+    """
+
+    def __init__(self, backend: RagBackend, corpus_name: str, client=None,
+                 model_name: str = "gemini-2.5-flash-lite", similarity_top_k: int = 3,
+                 max_workers: int = 8):
+        """
+        Args:
+            backend: RAG backend the corpus lives in
+            corpus_name: RAG corpus resource name
+            client: genai.Client for answers (None = retrieval only)
+            model_name: Generation model
+            similarity_top_k: Chunks retrieved per question
+            max_workers: Questions answered at once by ask_many()
+        """
+        started = time.perf_counter()
+        self.backend = backend
+        self.corpus_name = corpus_name
+        self.client = client
+        self.model_name = model_name
+        self.similarity_top_k = similarity_top_k
+        self._retrieve = backend.retriever(corpus_name, similarity_top_k)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="corpus-session")
+        self.setup_ms = (time.perf_counter() - started) * 1000
+
+        # Counters
+        self.questions = 0
+        self.errors = 0
+        self._totals = {"retrieve_ms": 0.0, "generate_ms": 0.0, "total_ms": 0.0}
+        self._lock = threading.Lock()
+
+    def retrieve(self, question: str) -> List[Dict]:
+        """Top chunks for `question`: dicts with 'source_uri', 'text' and 'distance'"""
+        response = self._retrieve(question)
+        return [{"source_uri": context.source_uri, "text": context.text, "distance": context.distance}
+                for context in response.contexts.contexts]
+
+    def ask(self, question: str) -> Dict:
+        """
+        Retrieve context for `question` and generate a grounded answer
+
+        Returns:
+            Dict with 'question', 'answer' (None without a client), 'contexts'
+            and 'timings' (retrieve_ms, generate_ms, total_ms)
+        """
+        started = time.perf_counter()
+        contexts = self.retrieve(question)
+        retrieved = time.perf_counter()
+
+        answer = None
+        if self.client is not None and contexts:
+            response = self.client.models.generate_content(
+                model=self.model_name,
+                contents=[build_prompt(question, contexts)],
+            )
+            answer = response.text
+        elif self.client is not None:
+            answer = "I couldn't find any relevant information to answer that question."
+        finished = time.perf_counter()
+
+        timings = {
+            "retrieve_ms": (retrieved - started) * 1000,
+            "generate_ms": (finished - retrieved) * 1000,
+            "total_ms": (finished - started) * 1000,
+        }
+        with self._lock:
+            self.questions += 1
+            for key, value in timings.items():
+                self._totals[key] += value
+        return {"question": question, "answer": answer, "contexts": contexts, "timings": timings}
+
+    def ask_many(self, questions: Sequence[str]) -> List[Dict]:
+        """
+        ask() several questions concurrently
+
+        Returns:
+            Results in the order of `questions`; a failed question's result
+            has 'error' set instead of raising
+        """
+        futures = [self._executor.submit(self.ask, question) for question in questions]
+        results = []
+        for question, future in zip(questions, futures):
+            try:
+                results.append(future.result())
+            except Exception as error:
+                with self._lock:
+                    self.errors += 1
+                results.append({"question": question, "answer": None, "contexts": [], "timings": {},
+                                "error": f"{type(error).__name__}: {error}"})
+        return results
+
+    def stats(self) -> Dict:
+        """Questions answered, errors, setup time and mean timings in ms"""
+        with self._lock:
+            n = max(self.questions, 1)
+            stats = {"questions": self.questions, "errors": self.errors, "setup_ms": self.setup_ms}
+            stats.update({f"mean_{key}": total / n for key, total in self._totals.items()})
+            return stats
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
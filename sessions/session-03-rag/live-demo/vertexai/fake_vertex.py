@@ -0,0 +1,215 @@
+"""
+WCC AI Learning Series - Session 3: Local Vertex AI RAG Engine Stub
+Offline stand-ins for the RAG Engine import API and Cloud Storage
+
+FakeRagEngine implements rag_import.RagImportAPI in memory, so the import
+manager can be tested and load-tested without a GCP project:
+
+- Files live in in-memory "buckets" (put_file / list_uris)
+- An import finishes after `seconds_per_file` per file on the given clock,
+  like a long-running operation
+- Only `max_concurrent_imports` operations may run per corpus; more are
+  rejected with a 409, as the real service rejects concurrent imports
+- Chosen files end up in the ERROR state; unsupported types are skipped
+
+FakeBucket is the part of a google.cloud.storage Bucket that
+gcs_upload.BulkUploader uses, with checksums, generations and a simulated
+per-request latency. Give it the engine and uploads become importable.
+
+Usage:
+    engine = FakeRagEngine(seconds_per_file=0.1)
+    engine.put_file("gs://bucket/blogs/post.txt", b"...")
+    report = ImportManager(engine).run("corpora/1", ["gs://bucket/blogs/"])
+
+    bucket = FakeBucket("bucket", engine=engine, latency=0.05)
+    BulkUploader(bucket).upload({"post.txt": "..."}, prefix="blogs/")
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Sequence
+
+from gcs_upload import crc32c_base64, md5_base64
+from rag_import import RagImportAPI
+
+# File types RAG Engine imports from Cloud Storage
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".html", ".pdf", ".json", ".jsonl", ".docx", ".pptx")
+
+
+class FakeRagError(Exception):
+    """Error from the stub; `.code` matches google.api_core exceptions"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+
+class _FakeOperation:
+    """google.api_core.operation.Operation look-alike for one import"""
+
+    def __init__(self, engine: "FakeRagEngine", corpus_name: str, uris: List[str], finish_at: float):
+        self.engine = engine
+        self.corpus_name = corpus_name
+        self.uris = uris
+        self.finish_at = finish_at
+        self._response = None
+
+    def done(self) -> bool:
+        if self._response is None and self.engine.clock() >= self.finish_at:
+            self._response = self.engine._finish(self)
+        return self._response is not None
+
+    def result(self, timeout: Optional[float] = None):
+        while not self.done():
+            time.sleep(0.01)
+        return self._response
+
+    def exception(self, timeout: Optional[float] = None) -> Optional[Exception]:
+        self.result(timeout)
+        return None
+
+
+class FakeRagEngine(RagImportAPI):
+    """In-memory RAG Engine import API (see module docstring)"""
+
+    def __init__(self, seconds_per_file: float = 0.0, max_concurrent_imports: int = 3,
+                 failing_uris: Sequence[str] = (), clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            seconds_per_file: Simulated import time per file
+            max_concurrent_imports: Imports allowed to run at once per corpus
+            failing_uris: Files that end up in the ERROR state
+            clock: Time source (override in tests)
+        """
+        self.seconds_per_file = seconds_per_file
+        self.max_concurrent_imports = max_concurrent_imports
+        self.failing_uris = set(failing_uris)
+        self.clock = clock
+
+        self.objects: Dict[str, bytes] = {}        # gs:// uri -> content
+        self.corpora: Dict[str, Dict[str, Dict]] = {}  # corpus -> uri -> file
+        self.running: Dict[str, int] = {}           # corpus -> imports in progress
+
+        # Counters
+        self.imports_started = 0
+        self.imports_rejected = 0
+        self._lock = threading.Lock()
+
+    def put_file(self, uri: str, content: bytes = b"") -> None:
+        self.objects[uri] = content
+
+    def list_uris(self, prefix):
+        prefix = prefix.rstrip("*")
+        return sorted(uri for uri in self.objects if uri.startswith(prefix))
+
+    def start_import(self, corpus_name, uris, chunk_size, chunk_overlap):
+        with self._lock:
+            if self.running.get(corpus_name, 0) >= self.max_concurrent_imports:
+                self.imports_rejected += 1
+                raise FakeRagError(409, f"Other operations are running on {corpus_name}")
+            self.running[corpus_name] = self.running.get(corpus_name, 0) + 1
+            self.imports_started += 1
+        finish_at = self.clock() + self.seconds_per_file * len(uris)
+        return _FakeOperation(self, corpus_name, list(uris), finish_at)
+
+    def list_files(self, corpus_name):
+        with self._lock:
+            return list(self.corpora.get(corpus_name, {}).values())
+
+    def _finish(self, operation: _FakeOperation):
+        """Apply a finished import to the corpus; returns its response"""
+        imported = failed = skipped = 0
+        with self._lock:
+            files = self.corpora.setdefault(operation.corpus_name, {})
+            for uri in operation.uris:
+                if uri not in self.objects or not uri.lower().endswith(SUPPORTED_EXTENSIONS):
+                    skipped += 1
+                elif uri in self.failing_uris:
+                    files[uri] = {"uri": uri, "state": "ERROR", "error": "Failed to parse file"}
+                    failed += 1
+                else:
+                    files[uri] = {"uri": uri, "state": "ACTIVE", "error": None}
+                    imported += 1
+            self.running[operation.corpus_name] -= 1
+        return SimpleNamespace(imported_rag_files_count=imported, failed_rag_files_count=failed,
+                               skipped_rag_files_count=skipped)
+
+
+# ============================================================================
+# CLOUD STORAGE
+# ============================================================================
+
+class FakeBlob:
+    """google.cloud.storage Blob look-alike"""
+
+    def __init__(self, bucket: "FakeBucket", name: str, chunk_size: Optional[int] = None):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = chunk_size
+        self.content_encoding: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.data = b""
+        self.generation: Optional[int] = None
+        self.md5_hash: Optional[str] = None
+        self.crc32c: Optional[str] = None
+
+    def upload_from_string(self, data, content_type: str = "text/plain",
+                           if_generation_match: Optional[int] = None) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.bucket._store(self, data, content_type, if_generation_match)
+
+
+class FakeBucket:
+    """In-memory bucket: blob(), list_blobs() and uploads (see module docstring)"""
+
+    def __init__(self, name: str, engine: Optional[FakeRagEngine] = None, latency: float = 0.0):
+        """
+        Args:
+            name: Bucket name
+            engine: FakeRagEngine that sees uploaded files as gs:// objects
+            latency: Simulated seconds per request (per chunk for resumable uploads)
+        """
+        self.name = name
+        self.engine = engine
+        self.latency = latency
+        self.blobs: Dict[str, FakeBlob] = {}
+
+        # Counters
+        self.list_calls = 0
+        self.uploads = 0
+        self.resumable_uploads = 0
+        self.bytes_received = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def blob(self, name: str, chunk_size: Optional[int] = None) -> FakeBlob:
+        return FakeBlob(self, name, chunk_size)
+
+    def list_blobs(self, prefix: str = "") -> List[FakeBlob]:
+        time.sleep(self.latency)
+        with self._lock:
+            self.list_calls += 1
+            return [blob for name, blob in sorted(self.blobs.items()) if name.startswith(prefix)]
+
+    def _store(self, blob: FakeBlob, data: bytes, content_type: str,
+               if_generation_match: Optional[int]) -> None:
+        chunks = -(-len(data) // blob.chunk_size) if blob.chunk_size else 1
+        time.sleep(self.latency * max(1, chunks))
+        with self._lock:
+            current = self.blobs.get(blob.name)
+            if if_generation_match is not None and if_generation_match != (current.generation if current else 0):
+                raise FakeRagError(412, f"Precondition failed for {blob.name}")
+            self._generation += 1
+            blob.data = data
+            blob.content_type = content_type
+            blob.generation = self._generation
+            blob.md5_hash = md5_base64(data)
+            blob.crc32c = crc32c_base64(data)
+            self.blobs[blob.name] = blob
+            self.uploads += 1
+            self.resumable_uploads += blob.chunk_size is not None
+            self.bytes_received += len(data)
+        if self.engine is not None:
+            self.engine.put_file(f"gs://{self.name}/{blob.name}", data)
@@ -0,0 +1,430 @@
+"""
+WCC AI Learning Series - Session 3: RAG Engine Backends
+The managed RAG flow, with a do-it-yourself twin that runs on one machine
+
+vertex_ai_rag_managed.py needs three things from RAG Engine: create a
+corpus, import files (chunked with chunk_size / chunk_overlap tokens), and
+retrieve the chunks closest to a question. RagBackend is that interface:
+
+- ManagedRagBackend: Vertex AI RAG Engine (vertexai.preview.rag)
+- LocalRagBackend: the same steps built from the DIY demo's parts - token
+  chunking (token_chunker.py), stable chunk IDs (chunk_ids.py), concurrent
+  embedding (embedding_dispatcher.py) and the on-disk NumPy index
+  (vector_store.py), one index per corpus
+
+Both return RAG Engine's shapes (corpus.name, response.contexts.contexts
+with source_uri / text / distance), so the demo code doesn't change, and
+benchmark_retrieval() can time them side by side. The "fake" backend is
+LocalRagBackend with fake_genai's offline embeddings: load tests without
+quota or network.
+
+Pick a backend with the RAG_BACKEND environment variable ("managed",
+"local" or "fake").
+"""
+
+import json
+import os
+import shutil
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# The DIY building blocks come from live-demo/, installed by requirements.txt
+from chunk_ids import hash16, make_chunk_id
+from embedding_dispatcher import EmbeddingDispatcher
+from parallel_chunking import make_splitter, span_text, split_spans
+from rag_import import ImportManager, RagImportAPI, VertexRagImportAPI
+from token_chunker import CHARS_PER_TOKEN, tokens_available
+from vector_store import NumpyVectorStore
+
+# RAG Engine's default embedding model and its embedding size
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "text-embedding-005")
+LOCAL_EMBEDDING_DIMENSIONS = 768
+
+# File types the local backend can read as text (RAG Engine also parses PDF, DOCX, ...)
+LOCAL_TEXT_EXTENSIONS = (".txt", ".md", ".html", ".json", ".jsonl")
+
+
+class RagBackend:
+    """
+    What the RAG Engine demo needs: corpora, chunked imports and retrieval
+
+    Corpora have .name and .display_name; retrieval_query() returns an
+    object with .contexts.contexts, each with source_uri, text and distance
+    (cosine distance, lower = more similar).
+    """
+
+    name = "base"
+
+    def create_corpus(self, display_name: str, description: str = ""):
+        raise NotImplementedError
+
+    def get_corpus(self, corpus_name: str):
+        raise NotImplementedError
+
+    def import_files(self, corpus_name: str, paths: Sequence[str], chunk_size: int = 512,
+                     chunk_overlap: int = 100) -> Dict:
+        """Import files / prefixes; returns a report like ImportManager.run()"""
+        raise NotImplementedError
+
+    def retrieval_query(self, corpus_name: str, text: str, similarity_top_k: int = 5):
+        raise NotImplementedError
+
+    def retriever(self, corpus_name: str, similarity_top_k: int = 5) -> Callable[[str], Any]:
+        """
+        retrieval_query() for one corpus and top k, with everything that
+        doesn't depend on the question set up once (see CorpusSession)
+        """
+        return lambda text: self.retrieval_query(corpus_name, text, similarity_top_k)
+
+    def delete_corpus(self, corpus_name: str) -> None:
+        raise NotImplementedError
+
+
+# ============================================================================
+# MANAGED (VERTEX AI RAG ENGINE)
+# ============================================================================
+
+class ManagedRagBackend(RagBackend):
+    """Vertex AI RAG Engine"""
+
+    name = "managed"
+
+    def __init__(self, project: str, location: str = "us-central1",
+                 import_api: Optional[RagImportAPI] = None):
+        """
+        Args:
+            project: GCP project ID
+            location: Vertex AI region
+            import_api: RagImportAPI for imports (default: VertexRagImportAPI;
+                        fake_vertex.FakeRagEngine for offline tests)
+        """
+        import vertexai
+        from vertexai.preview import rag
+
+        vertexai.init(project=project, location=location)
+        self.rag = rag
+        self.import_api = import_api
+
+    def create_corpus(self, display_name, description=""):
+        return self.rag.create_corpus(display_name=display_name, description=description)
+
+    def get_corpus(self, corpus_name):
+        return self.rag.RagCorpus(name=corpus_name)
+
+    def import_files(self, corpus_name, paths, chunk_size=512, chunk_overlap=100):
+        manager = ImportManager(self.import_api or VertexRagImportAPI())
+        return manager.run(corpus_name, paths, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def retrieval_query(self, corpus_name, text, similarity_top_k=5):
+        return self.rag.retrieval_query(
+            rag_resources=[self.rag.RagResource(rag_corpus=corpus_name)],
+            text=text,
+            similarity_top_k=similarity_top_k,
+        )
+
+    def retriever(self, corpus_name, similarity_top_k=5):
+        # rag.retrieval_query() opens two new API clients (gRPC channels) and
+        # rebuilds the request on every call; here that happens once
+        from google.cloud import aiplatform_v1beta1 as gapic
+        from vertexai.preview.rag.utils import _gapic_utils
+
+        client = _gapic_utils.create_rag_service_client()
+        corpus_name = _gapic_utils.get_corpus_name(corpus_name)
+        parent = corpus_name.split("/ragCorpora/")[0]
+        store = gapic.RetrieveContextsRequest.VertexRagStore(
+            rag_resources=[gapic.RetrieveContextsRequest.VertexRagStore.RagResource(rag_corpus=corpus_name)])
+        config = gapic.RagRetrievalConfig(top_k=similarity_top_k)
+
+        def retrieve(text: str):
+            request = gapic.RetrieveContextsRequest(
+                vertex_rag_store=store,
+                parent=parent,
+                query=gapic.RagQuery(text=text, rag_retrieval_config=config),
+            )
+            return client.retrieve_contexts(request=request)
+
+        return retrieve
+
+    def delete_corpus(self, corpus_name):
+        self.rag.delete_corpus(name=corpus_name)
+
+
+# ============================================================================
+# LOCAL (DIY)
+# ============================================================================
+
+class LocalRagBackend(RagBackend):
+    """
+    RAG Engine's corpus / import / retrieval flow on local files
+
+    Files in `path`:
+        corpora.json - corpus name -> display name, description, imported files
+        <corpus id>/ - the corpus' NumpyVectorStore index
+
+    Usage:
+        backend = LocalRagBackend(client=genai.Client(vertexai=True, ...))
+        corpus = backend.create_corpus("WCC Blogs")
+        backend.import_files(corpus.name, ["./docs/"], chunk_size=512, chunk_overlap=100)
+        response = backend.retrieval_query(corpus.name, "How do I learn Python?", similarity_top_k=3)
+    """
+
+    name = "local"
+
+    def __init__(self, client, path: str = "./local_rag", embedding_model: str = LOCAL_EMBEDDING_MODEL,
+                 embedding_dimensions: int = LOCAL_EMBEDDING_DIMENSIONS, max_workers: int = 8,
+                 storage_client=None):
+        """
+        Args:
+            client: genai.Client for embeddings (or fake_genai.FakeGenAIClient)
+            path: Storage directory for the corpora
+            embedding_model: Embedding model name
+            embedding_dimensions: Embedding size to request
+            max_workers: Embedding requests in flight during imports
+            storage_client: google.cloud.storage.Client for gs:// paths (default: created on first use)
+        """
+        self.path = path
+        self.dispatcher = EmbeddingDispatcher(client, embedding_model,
+                                              output_dimensionality=embedding_dimensions,
+                                              max_workers=max_workers, verbose=False)
+        self.storage_client = storage_client
+        self._registry_path = os.path.join(path, "corpora.json")
+        self._stores: Dict[str, NumpyVectorStore] = {}
+        self._lock = threading.Lock()
+
+        self.corpora: Dict[str, Dict] = {}
+        if os.path.exists(self._registry_path):
+            with open(self._registry_path, encoding="utf-8") as f:
+                self.corpora = json.load(f)
+
+    def _save_registry(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._registry_path, "w", encoding="utf-8") as f:
+            json.dump(self.corpora, f, indent=2)
+
+    def _store(self, corpus_name: str) -> NumpyVectorStore:
+        """The corpus' index, opened once"""
+        if corpus_name not in self.corpora:
+            raise KeyError(f"No such corpus: {corpus_name}")
+        with self._lock:
+            if corpus_name not in self._stores:
+                self._stores[corpus_name] = NumpyVectorStore(self.path, corpus_name.rsplit("/", 1)[-1])
+            return self._stores[corpus_name]
+
+    @staticmethod
+    def _corpus(corpus_name: str, entry: Dict):
+        return SimpleNamespace(name=corpus_name, display_name=entry["display_name"],
+                               description=entry["description"])
+
+    def create_corpus(self, display_name, description=""):
+        corpus_name = f"projects/local/locations/local/ragCorpora/{hash16(display_name + str(time.time_ns()))}"
+        self.corpora[corpus_name] = {"display_name": display_name, "description": description, "files": {}}
+        self._save_registry()
+        return self._corpus(corpus_name, self.corpora[corpus_name])
+
+    def get_corpus(self, corpus_name):
+        if corpus_name not in self.corpora:
+            raise KeyError(f"No such corpus: {corpus_name}")
+        return self._corpus(corpus_name, self.corpora[corpus_name])
+
+    # ------------------------------------------------------------------------
+    # Import
+    # ------------------------------------------------------------------------
+
+    def list_uris(self, path: str) -> List[str]:
+        """Files under a local directory or gs:// prefix (a trailing '*' is allowed)"""
+        path = path.rstrip("*")
+        if path.startswith("gs://"):
+            bucket, _, prefix = path[len("gs://"):].partition("/")
+            blobs = self._storage().list_blobs(bucket, prefix=prefix)
+            return [f"gs://{bucket}/{blob.name}" for blob in blobs if not blob.name.endswith("/")]
+        if os.path.isdir(path):
+            return sorted(str(file) for file in Path(path).rglob("*") if file.is_file())
+        return [path]
+
+    def read(self, uri: str) -> str:
+        """Text of a local file or gs:// object (gzip-encoded objects are decompressed)"""
+        if uri.startswith("gs://"):
+            bucket, _, name = uri[len("gs://"):].partition("/")
+            return self._storage().bucket(bucket).blob(name).download_as_text()
+        return Path(uri).read_text(encoding="utf-8")
+
+    def _storage(self):
+        if self.storage_client is None:
+            from google.cloud import storage
+            self.storage_client = storage.Client()
+        return self.storage_client
+
+    def import_files(self, corpus_name, paths, chunk_size=512, chunk_overlap=100):
+        """
+        Chunk, embed and index files, replacing earlier imports of the same files
+
+        chunk_size / chunk_overlap are tokens, as in RAG Engine (approximated
+        with CHARS_PER_TOKEN characters each when tiktoken is unavailable).
+
+        Returns:
+            Report like ImportManager.run(): 'files' (uri -> {'status', 'error'})
+            and counts of 'imported', 'failed', 'skipped' and 'pending'
+        """
+        started = time.monotonic()
+        store = self._store(corpus_name)
+        if tokens_available():
+            splitter = make_splitter(chunk_size, chunk_overlap, unit="tokens")
+        else:
+            splitter = make_splitter(chunk_size * CHARS_PER_TOKEN, chunk_overlap * CHARS_PER_TOKEN)
+
+        uris = list(dict.fromkeys(uri for path in paths for uri in self.list_uris(path)))
+        files: Dict[str, Dict] = {}
+        ids, texts, metadatas = [], [], []
+        for uri in uris:
+            if not uri.lower().endswith(LOCAL_TEXT_EXTENSIONS):
+                files[uri] = {"status": "skipped", "error": None}
+                continue
+            try:
+                text = self.read(uri)
+            except Exception as error:
+                files[uri] = {"status": "failed", "error": f"{type(error).__name__}: {error}"}
+                continue
+            for span in split_spans(splitter, text):
+                chunk = span_text(text, span)
+                ids.append(make_chunk_id(uri, span[0], chunk))
+                texts.append(chunk)
+                metadatas.append({"source_uri": uri, "display_name": os.path.basename(uri)})
+            files[uri] = {"status": "imported", "error": None}
+
+        embeddings = self.dispatcher.embed(texts) if texts else []
+        imported = [uri for uri, entry in files.items() if entry["status"] == "imported"]
+        for uri in imported:
+            store.delete(store.get_ids(where={"source_uri": uri}))
+        store.upsert(ids, embeddings, texts, metadatas)
+        store.persist()
+
+        self.corpora[corpus_name]["files"].update(
+            {uri: {"chunks": sum(m["source_uri"] == uri for m in metadatas)} for uri in imported})
+        self._save_registry()
+
+        statuses = [entry["status"] for entry in files.values()]
+        report = {
+            "files": files,
+            "imported": statuses.count("imported"),
+            "failed": statuses.count("failed"),
+            "skipped": statuses.count("skipped"),
+            "pending": 0,
+            "operations": 1,
+            "seconds": time.monotonic() - started,
+        }
+        print(f"✓ Imported {report['imported']} files ({len(ids)} chunks) in {report['seconds']:.1f}s: "
+              f"{report['failed']} failed, {report['skipped']} skipped")
+        return report
+
+    # ------------------------------------------------------------------------
+    # Retrieval
+    # ------------------------------------------------------------------------
+
+    def retrieval_query(self, corpus_name, text, similarity_top_k=5):
+        return self.retriever(corpus_name, similarity_top_k)(text)
+
+    def retriever(self, corpus_name, similarity_top_k=5):
+        store = self._store(corpus_name)
+
+        def retrieve(text: str):
+            embedding = self.dispatcher.embed([text])[0]
+            contexts = [SimpleNamespace(
+                source_uri=result["metadata"]["source_uri"],
+                source_display_name=result["metadata"]["display_name"],
+                text=result["text"],
+                distance=result["distance"],
+            ) for result in store.query(embedding, k=similarity_top_k)]
+            return SimpleNamespace(contexts=SimpleNamespace(contexts=contexts))
+
+        return retrieve
+
+    def delete_corpus(self, corpus_name):
+        store = self._store(corpus_name)
+        store.reset()
+        shutil.rmtree(store.path, ignore_errors=True)
+        with self._lock:
+            self._stores.pop(corpus_name, None)
+        del self.corpora[corpus_name]
+        self._save_registry()
+
+
+# ============================================================================
+# FACTORY AND BENCHMARK
+# ============================================================================
+
+def open_rag_backend(backend: str = "managed", project: Optional[str] = None,
+                     location: str = "us-central1", path: str = "./local_rag") -> RagBackend:
+    """
+    Open a RAG backend by name
+
+    Args:
+        backend: "managed" (Vertex AI RAG Engine), "local" (DIY index with
+                 Vertex AI embeddings) or "fake" (DIY index with offline
+                 fake embeddings - no GCP needed)
+        project, location: GCP project and region (managed / local)
+        path: Storage directory for local corpora
+    """
+    if backend == "managed":
+        return ManagedRagBackend(project, location)
+    if backend == "local":
+        from google import genai
+        return LocalRagBackend(genai.Client(vertexai=True, project=project, location=location), path)
+    if backend == "fake":
+        from fake_genai import FakeGenAIClient
+        local = LocalRagBackend(FakeGenAIClient(), path)
+        local.name = "fake"
+        return local
+    raise ValueError(f"Unknown RAG backend: {backend!r} (use 'managed', 'local' or 'fake')")
+
+
+def benchmark_retrieval(backend: RagBackend, corpus_name: str, questions: Sequence[str],
+                        similarity_top_k: int = 5, concurrency: int = 8, rounds: int = 3) -> Dict:
+    """
+    Time retrieval_query() on one backend
+
+    Args:
+        backend: Backend to measure
+        corpus_name: Corpus to query
+        questions: Questions, each asked `rounds` times
+        similarity_top_k: Chunks per query
+        concurrency: Queries in flight at once
+        rounds: Passes over `questions`
+
+    Returns:
+        'queries', latency 'p50_ms' / 'p95_ms' / 'mean_ms', 'qps' and 'seconds'
+    """
+    retrieve = backend.retriever(corpus_name, similarity_top_k)
+
+    def timed(question: str) -> float:
+        start = time.perf_counter()
+        retrieve(question)
+        return (time.perf_counter() - start) * 1000
+
+    retrieve(questions[0])  # Warm-up
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(timed, list(questions) * rounds))
+    seconds = time.perf_counter() - started
+
+    return {
+        "queries": len(latencies),
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "mean_ms": statistics.fmean(latencies),
+        "qps": len(latencies) / seconds,
+        "seconds": seconds,
+    }
+
+
+def print_benchmark(results: Dict[str, Dict]) -> None:
+    """Print benchmark_retrieval() results side by side"""
+    print(f"\n{'Backend':<10} {'Queries':>8} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'QPS':>8}")
+    print("-" * 58)
+    for name, result in results.items():
+        print(f"{name:<10} {result['queries']:>8} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+              f"{result['mean_ms']:>9.1f} {result['qps']:>8.1f}")
@@ -0,0 +1,309 @@
+"""
+WCC AI Learning Series - Session 3: RAG Engine Import Manager
+Wait for Vertex AI RAG Engine imports exactly as long as they take
+
+Importing files into a RAG corpus is a long-running operation (LRO): the
+API returns at once and the work continues on Google's side. Sleeping a
+fixed 30 seconds is too long for five small files and too short for five
+thousand. ImportManager instead:
+
+1. Lists the files under each GCS prefix and splits them into shards
+   (one import request accepts a limited number of URIs)
+2. Starts several shard imports at once; a start that is rejected because
+   the corpus is busy or rate limited is retried with backoff. A rejection
+   while other imports run lowers the number started at once, which then
+   creeps back up by one after each run of successful starts
+3. Polls every running operation, checking often at first and less often
+   the longer it runs (exponential backoff), and returns as soon as the
+   last one is done
+4. Reports a status per file: imported, failed (with the error), skipped
+   or pending. Running out of time raises ImportTimeoutError carrying that
+   report instead of returning as if all went well
+
+Everything it needs from Google Cloud goes through a RagImportAPI, so the
+same code runs against VertexRagImportAPI or the offline FakeRagEngine in
+fake_vertex.py.
+"""
+
+import random
+import time
+from collections import deque
+from typing import Callable, Dict, List, Sequence
+
+# URIs per import request (the API's limit for GCS sources)
+MAX_URIS_PER_IMPORT = 25
+
+# gRPC status names / HTTP codes worth retrying when starting an import:
+# another operation is running on the corpus, quota, or a transient outage
+RETRYABLE_STATUSES = {"ABORTED", "FAILED_PRECONDITION", "RESOURCE_EXHAUSTED", "UNAVAILABLE"}
+RETRYABLE_CODES = {409, 429, 503}
+
+
+def _retryable(error: Exception) -> bool:
+    status = getattr(error, "grpc_status_code", None)
+    if getattr(status, "name", None) in RETRYABLE_STATUSES:
+        return True
+    return getattr(error, "code", None) in RETRYABLE_CODES
+
+
+class ImportTimeoutError(TimeoutError):
+    """Imports still running at the deadline; `.report` has the per-file status so far"""
+
+    def __init__(self, report: Dict):
+        super().__init__(f"{report['pending']} of {len(report['files'])} files still importing "
+                         f"after {report['seconds']:.0f}s")
+        self.report = report
+
+
+# ============================================================================
+# API (REAL OR STUB)
+# ============================================================================
+
+class RagImportAPI:
+    """
+    What ImportManager needs from Vertex AI (see VertexRagImportAPI and
+    fake_vertex.FakeRagEngine)
+
+    Operations are google.api_core.operation.Operation look-alikes with
+    done(), result() and exception().
+    """
+
+    def list_uris(self, prefix: str) -> List[str]:
+        """Files under a gs:// prefix (a trailing '*' is allowed)"""
+        raise NotImplementedError
+
+    def start_import(self, corpus_name: str, uris: Sequence[str], chunk_size: int, chunk_overlap: int):
+        """Start importing `uris` into the corpus; returns the operation"""
+        raise NotImplementedError
+
+    def list_files(self, corpus_name: str) -> List[Dict]:
+        """Files in the corpus: dicts with 'uri', 'state' ('ACTIVE' / 'ERROR') and 'error'"""
+        raise NotImplementedError
+
+
+class VertexRagImportAPI(RagImportAPI):
+    """RagImportAPI on the Vertex AI RAG data service and Cloud Storage"""
+
+    def __init__(self, storage_client=None, max_embedding_requests_per_min: int = 1000):
+        """
+        Args:
+            storage_client: google.cloud.storage.Client (default: a new one)
+            max_embedding_requests_per_min: Embedding quota per import operation
+        """
+        from vertexai.preview.rag.utils import _gapic_utils
+
+        self._gapic = _gapic_utils
+        self._client = _gapic_utils.create_rag_data_service_client()
+        self._storage_client = storage_client
+        self.max_embedding_requests_per_min = max_embedding_requests_per_min
+
+    def list_uris(self, prefix):
+        from google.cloud import storage
+
+        self._storage_client = self._storage_client or storage.Client()
+        bucket, _, path = prefix[len("gs://"):].partition("/")
+        blobs = self._storage_client.list_blobs(bucket, prefix=path.rstrip("*"))
+        return [f"gs://{bucket}/{blob.name}" for blob in blobs if not blob.name.endswith("/")]
+
+    def start_import(self, corpus_name, uris, chunk_size, chunk_overlap):
+        request = self._gapic.prepare_import_files_request(
+            corpus_name=self._gapic.get_corpus_name(corpus_name),
+            paths=list(uris),
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            max_embedding_requests_per_min=self.max_embedding_requests_per_min,
+        )
+        return self._client.import_rag_files(request=request)
+
+    def list_files(self, corpus_name):
+        files = []
+        for rag_file in self._client.list_rag_files(parent=self._gapic.get_corpus_name(corpus_name)):
+            uris = list(rag_file.gcs_source.uris)
+            files.append({
+                "uri": uris[0] if uris else rag_file.display_name,
+                "state": rag_file.file_status.state.name,
+                "error": rag_file.file_status.error_status or None,
+            })
+        return files
+
+
+# ============================================================================
+# IMPORT MANAGER
+# ============================================================================
+
+class ImportManager:
+    """
+    Sharded, concurrent RAG imports that poll their operations with backoff
+
+    Usage:
+        manager = ImportManager(VertexRagImportAPI())
+        report = manager.run(corpus.name, ["gs://bucket/blogs/"], chunk_size=512, chunk_overlap=100)
+        print(report["imported"], report["failed"])
+    """
+
+    def __init__(self, api: RagImportAPI, shard_size: int = MAX_URIS_PER_IMPORT,
+                 max_concurrent: int = 4, initial_poll: float = 1.0, max_poll: float = 30.0,
+                 poll_multiplier: float = 1.5, timeout: float = 3600.0, max_start_retries: int = 8,
+                 sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic, verbose: bool = True):
+        """
+        Args:
+            api: Vertex AI (VertexRagImportAPI) or a local stub
+            shard_size: Max URIs per import request
+            max_concurrent: Max import operations running at once
+            initial_poll: Seconds before the first status check
+            max_poll: Longest wait between status checks
+            poll_multiplier: Growth of the wait after each check with no progress
+            timeout: Seconds before giving up (raises ImportTimeoutError)
+            max_start_retries: Retries per shard when starting its import is rejected
+                               (including "busy" rejections while others run)
+            sleep, clock: Time functions (override in tests)
+            verbose: Print progress
+        """
+        self.api = api
+        self.shard_size = min(shard_size, MAX_URIS_PER_IMPORT)
+        self.max_concurrent = max_concurrent
+        self.initial_poll = initial_poll
+        self.max_poll = max_poll
+        self.poll_multiplier = poll_multiplier
+        self.timeout = timeout
+        self.max_start_retries = max_start_retries
+        self.sleep = sleep
+        self.clock = clock
+        self.verbose = verbose
+
+    def shard(self, paths: Sequence[str]) -> List[List[str]]:
+        """Expand gs:// prefixes to files and split them into import-sized shards"""
+        uris = []
+        for path in paths:
+            listed = self.api.list_uris(path) if path.endswith(("/", "*")) else []
+            uris.extend(listed or [path])
+        uris = list(dict.fromkeys(uris))
+        return [uris[i:i + self.shard_size] for i in range(0, len(uris), self.shard_size)]
+
+    def run(self, corpus_name: str, paths: Sequence[str], chunk_size: int = 512,
+            chunk_overlap: int = 100) -> Dict:
+        """
+        Import `paths` into the corpus and wait until every file is done
+
+        Args:
+            corpus_name: RAG corpus resource name
+            paths: gs:// files or prefixes (ending in '/' or '*')
+            chunk_size: Chunk size in tokens, applied by RAG Engine
+            chunk_overlap: Overlap between chunks in tokens
+
+        Returns:
+            Report: 'files' (uri -> {'status', 'error'}), counts of 'imported',
+            'failed', 'skipped' and 'pending', 'operations' and 'seconds'
+
+        Raises:
+            ImportTimeoutError: Some imports were still running after `timeout`
+        """
+        started = self.clock()
+        shards = self.shard(paths)
+        waiting = deque((shard, 0, started) for shard in shards)  # (uris, attempt, not before)
+        running: List[tuple] = []  # (uris, operation)
+        shard_errors: Dict[str, str] = {}
+        operations = 0
+        delay = self.initial_poll
+        limit = self.max_concurrent  # Lowered when the corpus rejects more parallel imports
+        clean_starts = 0  # Successful starts since `limit` last changed
+
+        if self.verbose:
+            total = sum(len(shard) for shard in shards)
+            print(f"  Importing {total} files in {len(shards)} shards "
+                  f"(up to {self.max_concurrent} at once)")
+
+        while waiting or running:
+            # 1. Start shards while there is room
+            for _ in range(len(waiting)):
+                if len(running) >= limit:
+                    break
+                uris, attempt, not_before = waiting.popleft()
+                if not_before > self.clock():
+                    waiting.append((uris, attempt, not_before))
+                    continue
+                try:
+                    running.append((uris, self.api.start_import(corpus_name, uris, chunk_size, chunk_overlap)))
+                    operations += 1
+                    clean_starts += 1
+                    if limit < self.max_concurrent and clean_starts >= limit:
+                        # `limit` starts in a row went through: try one more at once
+                        limit += 1
+                        clean_starts = 0
+                except Exception as error:
+                    if not _retryable(error) or attempt >= self.max_start_retries:
+                        for uri in uris:
+                            shard_errors[uri] = f"{type(error).__name__}: {error}"
+                        continue
+                    if running:
+                        limit = len(running)  # The corpus is busy with what is running: wait for it
+                        clean_starts = 0
+                        waiting.appendleft((uris, attempt + 1, self.clock()))
+                        break
+                    backoff = random.uniform(0, min(self.max_poll, self.initial_poll * 2 ** attempt))
+                    waiting.append((uris, attempt + 1, self.clock() + backoff))
+
+            # 2. Collect finished operations
+            finished = [(uris, op) for uris, op in running if op.done()]
+            for uris, op in finished:
+                running.remove((uris, op))
+                error = op.exception()
+                if error is not None:
+                    for uri in uris:
+                        shard_errors[uri] = f"{type(error).__name__}: {error}"
+                elif self.verbose:
+                    print(f"  ✓ Shard of {len(uris)} files done after {self.clock() - started:.1f}s")
+
+            if not waiting and not running:
+                break
+            if self.clock() - started >= self.timeout:
+                report = self._report(corpus_name, shards, shard_errors,
+                                      {uri for uris, _ in running for uri in uris} |
+                                      {uri for uris, _, _ in waiting for uri in uris},
+                                      operations, started)
+                raise ImportTimeoutError(report)
+
+            # 3. Poll again soon after progress, back off while nothing changes
+            if finished:
+                delay = self.initial_poll
+            wait = delay
+            if waiting and len(running) < limit:
+                wait = min(wait, min(not_before for _, _, not_before in waiting) - self.clock())
+            self.sleep(max(0.0, min(wait, started + self.timeout - self.clock())))
+            delay = min(self.max_poll, delay * self.poll_multiplier)
+
+        report = self._report(corpus_name, shards, shard_errors, set(), operations, started)
+        if self.verbose:
+            print(f"✓ Import finished in {report['seconds']:.1f}s: {report['imported']} imported, "
+                  f"{report['failed']} failed, {report['skipped']} skipped")
+        return report
+
+    def _report(self, corpus_name: str, shards: List[List[str]], shard_errors: Dict[str, str],
+                pending: set, operations: int, started: float) -> Dict:
+        """Per-file status from the corpus' file list and the failed / unfinished shards"""
+        in_corpus = {rag_file["uri"]: rag_file for rag_file in self.api.list_files(corpus_name)}
+        files = {}
+        for uri in (uri for shard in shards for uri in shard):
+            rag_file = in_corpus.get(uri)
+            if uri in pending:
+                files[uri] = {"status": "pending", "error": None}
+            elif uri in shard_errors:
+                files[uri] = {"status": "failed", "error": shard_errors[uri]}
+            elif rag_file is None:
+                files[uri] = {"status": "skipped", "error": None}  # e.g. unsupported file type
+            elif rag_file["state"] == "ERROR":
+                files[uri] = {"status": "failed", "error": rag_file.get("error")}
+            else:
+                files[uri] = {"status": "imported", "error": None}
+
+        statuses = [entry["status"] for entry in files.values()]
+        return {
+            "files": files,
+            "imported": statuses.count("imported"),
+            "failed": statuses.count("failed"),
+            "skipped": statuses.count("skipped"),
+            "pending": statuses.count("pending"),
+            "operations": operations,
+            "seconds": self.clock() - started,
+        }
@@ -18,11 +18,14 @@ Prerequisites:
 """
 
 import os
-import vertexai
-from vertexai.preview import rag
+from functools import lru_cache
 from google.cloud import storage
 from dotenv import load_dotenv
 from google import genai
+from corpus_session import CorpusSession
+from gcs_upload import BulkUploader
+from rag_backends import benchmark_retrieval, open_rag_backend, print_benchmark
+from rag_import import ImportTimeoutError
 
 # ============================================================================
 # CONFIGURATION
@@ -35,35 +38,31 @@ LOCATION = os.getenv("LOCATION", "us-central1")
 GENERATION_MODEL_NAME = os.getenv("GENERATION_MODEL_NAME", "gemini-2.5-flash-lite")
 BUCKET_NAME = f"{PROJECT_ID}-rag-demo"  # Will be created if doesn't exist
 
-# Initialize Vertex AI and Generative AI client
-vertexai.init(project=PROJECT_ID, location=LOCATION)
-genai.configure_vertex(project=PROJECT_ID, location=LOCATION)
+# Which RAG Engine to use (see rag_backends.py):
+# RAG_BACKEND=managed -> Vertex AI RAG Engine (default)
+# RAG_BACKEND=local   -> the same flow on a local NumPy index, Vertex AI embeddings
+# RAG_BACKEND=fake    -> local index with offline fake embeddings (no GCP needed)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "managed")
+LOCAL_DOCS_PATH = "./local_rag/docs"
+
+# Initialize Vertex AI (inside the managed backend)
+backend = open_rag_backend(RAG_BACKEND, project=PROJECT_ID, location=LOCATION)
+
+@lru_cache(maxsize=1)
+def get_generation_client():
+    """Generative AI client, created on first use and shared by every session"""
+    if RAG_BACKEND == "fake":
+        from fake_genai import FakeGenAIClient
+        return FakeGenAIClient()
+    return genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
 
 # ============================================================================
 # STEP 1: PREPARE DOCUMENTS IN CLOUD STORAGE
 # ============================================================================
 
-def setup_cloud_storage():
-    """
-    Create Cloud Storage bucket and upload sample documents
-    """
-    print("\n" + "="*70)
-    print("STEP 1: Setting up Cloud Storage")
-    print("="*70)
-    
-    storage_client = storage.Client(project=PROJECT_ID)
-    
-    # Create bucket if it doesn't exist
-    try:
-        bucket = storage_client.get_bucket(BUCKET_NAME)
-        print(f"✓ Using existing bucket: {BUCKET_NAME}")
-    except:
-        bucket = storage_client.create_bucket(BUCKET_NAME, location=LOCATION)
-        print(f"✓ Created new bucket: {BUCKET_NAME}")
-    
-    # Sample documents (same content as our DIY demo)
-    sample_docs = {
-        "python_intro.txt": """
+# Sample documents (same content as our DIY demo)
+SAMPLE_DOCS = {
+    "python_intro.txt": """
 Title: Introduction to Python for Beginners
 Date: 2024-10-15
 
@@ -87,9 +86,9 @@ Next Steps:
 - Practice on HackerRank or LeetCode
 - Join WCC Python study group (Tuesdays 7pm)
 - Check out github.com/wcc/python-beginners
-        """,
-        
-        "django_workshop.txt": """
+    """,
+    
+    "django_workshop.txt": """
 Title: Django Web Development Workshop Recap
 Date: 2024-09-22
 
@@ -111,9 +110,9 @@ Project: Built a complete blog application with:
 Instructor: Sarah Chen
 Code: github.com/wcc/django-blog-workshop
 Next: Django REST Framework workshop (November 2024)
-        """,
-        
-        "career_transitions.txt": """
+    """,
+    
+    "career_transitions.txt": """
 Title: Career Transitions: Backend to AI Engineering
 Date: 2024-08-10
 
@@ -142,9 +141,9 @@ Emma: Backend → ML Engineer (built sentiment analysis API)
 Priya: Java → AI Engineer (MLOps expertise transferred directly)
 
 WCC hosts monthly AI networking events!
-        """,
-        
-        "mentorship_guide.txt": """
+    """,
+    
+    "mentorship_guide.txt": """
 Title: Effective Mentorship: Guide for Mentees
 Date: 2024-07-18
 
@@ -177,9 +176,9 @@ Mistakes to Avoid:
 - Not respecting boundaries
 
 Apply: womencodingcommunity.com/mentorship (quarterly applications)
-        """,
-        
-        "cloud_architecture.txt": """
+    """,
+    
+    "cloud_architecture.txt": """
 Title: Cloud Architecture Best Practices for Startups
 Date: 2024-06-25
 
@@ -216,19 +215,53 @@ Real Example (WCC member's startup):
 Cost: $150/month for 10K users, $800/month for 100K users
 
 Next WCC Talk: "Kubernetes for Beginners" (August 2024)
-        """
-    }
+    """
+}
+
+def setup_cloud_storage():
+    """
+    Create Cloud Storage bucket and upload sample documents
+    """
+    print("\n" + "="*70)
+    print("STEP 1: Setting up Cloud Storage")
+    print("="*70)
+    
+    storage_client = storage.Client(project=PROJECT_ID)
     
-    # Upload documents to Cloud Storage
+    # Create bucket if it doesn't exist
+    try:
+        bucket = storage_client.get_bucket(BUCKET_NAME)
+        print(f"✓ Using existing bucket: {BUCKET_NAME}")
+    except:
+        bucket = storage_client.create_bucket(BUCKET_NAME, location=LOCATION)
+        print(f"✓ Created new bucket: {BUCKET_NAME}")
+    
+    # Upload documents to Cloud Storage: in parallel, gzipped, and only
+    # the ones whose checksum differs from what is already in the bucket
     print("\nUploading documents to Cloud Storage...")
-    for filename, content in sample_docs.items():
-        blob = bucket.blob(f"blogs/{filename}")
-        blob.upload_from_string(content)
-        print(f"  ✓ Uploaded: {filename}")
+    report = BulkUploader(bucket).upload(SAMPLE_DOCS, prefix="blogs/")
+    if report["failed"]:
+        raise RuntimeError(f"{report['failed']} uploads failed (see above)")
     
     print(f"\n✓ All documents uploaded to gs://{BUCKET_NAME}/blogs/")
     return f"gs://{BUCKET_NAME}/blogs/"
 
+def setup_local_documents(path=LOCAL_DOCS_PATH):
+    """
+    Write the sample documents to a local folder (for the local backends)
+    """
+    print("\n" + "="*70)
+    print("STEP 1: Writing documents to a local folder")
+    print("="*70)
+    
+    os.makedirs(path, exist_ok=True)
+    for filename, content in SAMPLE_DOCS.items():
+        with open(os.path.join(path, filename), "w", encoding="utf-8") as f:
+            f.write(content)
+    
+    print(f"✓ {len(SAMPLE_DOCS)} documents in {path}/")
+    return path + "/"
+
 # ============================================================================
 # STEP 2: CREATE RAG CORPUS
 # ============================================================================
@@ -242,7 +275,7 @@ def create_rag_corpus():
     print("="*70)
     
     # Create corpus
-    corpus = rag.create_corpus(
+    corpus = backend.create_corpus(
         display_name="WCC Blogs",
         description="Women Coding Community blog posts for RAG demo"
     )
@@ -260,74 +293,106 @@ def import_documents(corpus, gcs_path):
     """
     Import documents from Cloud Storage into RAG corpus
     This handles chunking, embedding, and indexing automatically!
+    
+    The import runs as a long-running operation on Google's side; we poll
+    it with backoff (see rag_import.py) and return as soon as it is done.
+    Large prefixes are split into shards that import concurrently.
+    The local backends chunk, embed and index the files in-process.
+    
+    Args:
+        corpus: RAG corpus to import into
+        gcs_path: gs:// file or prefix (or a local folder for the local backends)
+    
+    Returns:
+        Import report with a status per file
     """
     print("\n" + "="*70)
     print("STEP 3: Importing Documents")
     print("="*70)
     print("(Vertex AI handles chunking, embedding, and indexing...)")
-    
-    # Import files from GCS
-    response = rag.import_files(
-        corpus_name=corpus.name,
-        paths=[gcs_path],
-        chunk_size=512,  # Similar to our 400 tokens
-        chunk_overlap=100
-    )
-    
-    print("✓ Import started (this may take a minute...)")
     print(f"  Source: {gcs_path}")
-    print(f"  Chunk size: 512 characters")
-    print(f"  Chunk overlap: 100 characters")
+    print(f"  Chunk size: 512 tokens")
+    print(f"  Chunk overlap: 100 tokens")
+    
+    try:
+        report = backend.import_files(corpus.name, [gcs_path], chunk_size=512, chunk_overlap=100)
+    except ImportTimeoutError as error:
+        print(f"✗ Import timed out: {error}")
+        for uri, entry in error.report["files"].items():
+            if entry["status"] == "pending":
+                print(f"  … still importing: {uri}")
+        raise
     
-    # Wait for import to complete
-    print("  Waiting for import to complete...", end="", flush=True)
-    import time
-    time.sleep(30)  # Import usually takes 20-40 seconds
-    print(" Done!")
+    for uri, entry in report["files"].items():
+        if entry["status"] != "imported":
+            print(f"  ✗ {entry['status']}: {uri}" + (f" ({entry['error']})" if entry["error"] else ""))
     
-    return response
+    return report
 
 # ============================================================================
 # STEP 4: QUERY WITH RAG
 # ============================================================================
 
-def query_with_rag(corpus, question, num_chunks=5):
+def open_session(corpus, num_chunks=3):
+    """
+    Open a CorpusSession: corpus, retrieval config and model set up once
+    """
+    return CorpusSession(
+        backend,
+        corpus.name,
+        client=get_generation_client(),
+        model_name=GENERATION_MODEL_NAME,
+        similarity_top_k=num_chunks,
+    )
+
+def query_with_rag(corpus, question, num_chunks=5, session=None):
+    """
+    Query the RAG corpus: retrieve the most relevant chunks, then answer
+    
+    Pass a `session` (see open_session) when asking several questions, so
+    the setup happens once instead of on every call.
+    """
+    if session is None:
+        with open_session(corpus, num_chunks) as session:
+            return query_with_rag(corpus, question, num_chunks, session)
+    
+    # One retrieval call does the search:
+    # 1. Embeds the question
+    # 2. Searches the vector database
+    # 3. Retrieves relevant chunks with their source files
+    # Then Gemini answers from those chunks, with citations
+    result = session.ask(question)
+    print_result(result)
+    return result
+
+def print_result(result):
     """
-    Query the RAG corpus - retrieval and generation in ONE call!
+    Print a CorpusSession answer with its sources and timings
     """
     print("\n" + "="*70)
     print("RAG QUERY")
     print("="*70)
-    print(f"\n❓ Question: {question}")
+    print(f"\n❓ Question: {result['question']}")
     print("-" * 70)
     
-    # This one call does EVERYTHING:
-    # 1. Embeds the question
-    # 2. Searches the vector database
-    # 3. Retrieves relevant chunks
-    # 4. Generates answer with citations
-    response = rag.retrieval_query(
-        rag_resources=[
-            rag.RagResource(
-                rag_corpus=corpus.name,
-            )
-        ],
-        text=question,
-        similarity_top_k=num_chunks,
-    )
+    if result.get("error"):
+        print(f"\n✗ Error: {result['error']}")
+        return
     
     print("\n💬 ANSWER:")
-    print(response.answer)
+    print(result["answer"])
     
-    if response.contexts:
+    if result["contexts"]:
         print("\n📚 SOURCES:")
-        for i, context in enumerate(response.contexts.contexts, 1):
+        for i, context in enumerate(result["contexts"], 1):
             print(f"\n  Source {i}:")
-            print(f"  File: {context.source_uri}")
-            print(f"  Distance: {context.distance:.3f}")
-            print(f"  Preview: {context.text[:150]}...")
+            print(f"  File: {context['source_uri']}")
+            print(f"  Distance: {context['distance']:.3f}")
+            print(f"  Preview: {context['text'][:150]}...")
     
-    return response
+    timings = result["timings"]
+    print(f"\n⏱  Retrieval {timings['retrieve_ms']:.0f} ms, generation {timings['generate_ms']:.0f} ms, "
+          f"total {timings['total_ms']:.0f} ms")
 
 # ============================================================================
 # DEMO FUNCTIONS
@@ -340,20 +405,30 @@ def demo_setup():
     print("\n🎓 WCC AI Learning Series - Vertex AI RAG Engine Demo")
     print("=" * 70)
     
-    # Step 1: Setup Cloud Storage
-    gcs_path = setup_cloud_storage()
+    # Step 1: Setup Cloud Storage (or a local folder for the local backends)
+    if RAG_BACKEND == "managed":
+        source = setup_cloud_storage() + "*"
+    else:
+        source = setup_local_documents()
     
     # Step 2: Create corpus
     corpus = create_rag_corpus()
     
     # Step 3: Import documents
-    import_documents(corpus, gcs_path + "*")
+    import_documents(corpus, source)
     
     print("\n✅ Setup complete! Corpus is ready for queries.")
     print(f"   Corpus name: {corpus.name}")
     
     return corpus
 
+DEMO_QUESTIONS = [
+    "What Python workshops has WCC hosted?",
+    "How do I transition from backend to AI engineering?",
+    "What's your advice for mentees?",
+    "Tell me about cloud architecture best practices"
+]
+
 def demo_queries(corpus):
     """
     Run sample queries
@@ -362,17 +437,12 @@ def demo_queries(corpus):
     print("DEMO QUERIES")
     print("="*70)
     
-    questions = [
-        "What Python workshops has WCC hosted?",
-        "How do I transition from backend to AI engineering?",
-        "What's your advice for mentees?",
-        "Tell me about cloud architecture best practices"
-    ]
-    
-    for question in questions:
-        query_with_rag(corpus, question, num_chunks=3)
-        print("\n" + "-"*70)
-        input("Press Enter for next question...")
+    # All questions are answered concurrently up front; we just step through them
+    with open_session(corpus, num_chunks=3) as session:
+        for result in session.ask_many(DEMO_QUESTIONS):
+            print_result(result)
+            print("\n" + "-"*70)
+            input("Press Enter for next question...")
 
 def demo_interactive(corpus):
     """
@@ -384,17 +454,22 @@ def demo_interactive(corpus):
     print("Ask questions about WCC content!")
     print("Type 'quit' to exit\n")
     
-    while True:
-        question = input("\n❓ Your question: ").strip()
-        
-        if question.lower() in ['quit', 'exit', 'q']:
-            print("\nThanks for trying Vertex AI RAG! 👋")
-            break
-        
-        if not question:
-            continue
-        
-        query_with_rag(corpus, question, num_chunks=3)
+    # Set up once; every question then takes the warm path
+    with open_session(corpus, num_chunks=3) as session:
+        while True:
+            question = input("\n❓ Your question: ").strip()
+            
+            if question.lower() in ['quit', 'exit', 'q']:
+                stats = session.stats()
+                print(f"\n{stats['questions']} questions, mean {stats['mean_total_ms']:.0f} ms each "
+                      f"(setup {stats['setup_ms']:.0f} ms, paid once)")
+                print("\nThanks for trying Vertex AI RAG! 👋")
+                break
+            
+            if not question:
+                continue
+            
+            query_with_rag(corpus, question, num_chunks=3, session=session)
 
 def cleanup(corpus_name):
     """
@@ -405,13 +480,39 @@ def cleanup(corpus_name):
     print("="*70)
     
     try:
-        rag.delete_corpus(name=corpus_name)
+        backend.delete_corpus(corpus_name)
         print(f"✓ Deleted corpus: {corpus_name}")
     except Exception as e:
         print(f"✗ Error deleting corpus: {e}")
     
-    print("\nNote: Cloud Storage bucket and files remain for reuse.")
-    print(f"To delete bucket: gsutil -m rm -r gs://{BUCKET_NAME}")
+    if RAG_BACKEND == "managed":
+        print("\nNote: Cloud Storage bucket and files remain for reuse.")
+        print(f"To delete bucket: gsutil -m rm -r gs://{BUCKET_NAME}")
+
+def demo_benchmark(targets, concurrency=8, rounds=5):
+    """
+    Time retrieval on several backends side by side
+    
+    Args:
+        targets: "<backend>=<corpus name>" strings, e.g. "managed=projects/.../ragCorpora/1"
+        concurrency: Queries in flight at once
+        rounds: Passes over the demo questions
+    """
+    print("\n" + "="*70)
+    print("BENCHMARK: Managed vs DIY retrieval")
+    print("="*70)
+    
+    results = {}
+    for target in targets:
+        name, _, corpus_name = target.partition("=")
+        target_backend = backend if name == RAG_BACKEND else open_rag_backend(
+            name, project=PROJECT_ID, location=LOCATION)
+        print(f"  Querying {name}: {corpus_name}")
+        results[name] = benchmark_retrieval(target_backend, corpus_name, DEMO_QUESTIONS,
+                                            similarity_top_k=3, concurrency=concurrency, rounds=rounds)
+    
+    print_benchmark(results)
+    return results
 
 # ============================================================================
 # COMPARISON WITH DIY RAG
@@ -493,7 +594,7 @@ if __name__ == "__main__":
             
             corpus_name = sys.argv[2]
             # Reconstruct corpus object
-            corpus = rag.RagCorpus(name=corpus_name)
+            corpus = backend.get_corpus(corpus_name)
             demo_queries(corpus)
             
         elif sys.argv[1] == "--interactive":
@@ -502,7 +603,7 @@ if __name__ == "__main__":
                 sys.exit(1)
             
             corpus_name = sys.argv[2]
-            corpus = rag.RagCorpus(name=corpus_name)
+            corpus = backend.get_corpus(corpus_name)
             demo_interactive(corpus)
             
         elif sys.argv[1] == "--cleanup":
@@ -512,6 +613,13 @@ if __name__ == "__main__":
             
             cleanup(sys.argv[2])
             
+        elif sys.argv[1] == "--benchmark":
+            if len(sys.argv) < 3:
+                print("Usage: python vertex_ai_rag_managed.py --benchmark <backend>=<corpus> ...")
+                sys.exit(1)
+            
+            demo_benchmark(sys.argv[2:])
+            
         elif sys.argv[1] == "--all":
             corpus = demo_setup()
             input("\nPress Enter to run demo queries...")
@@ -523,6 +631,8 @@ if __name__ == "__main__":
         print("  python vertex_ai_rag_managed.py --interactive <corpus>  # Interactive Q&A")
         print("  python vertex_ai_rag_managed.py --cleanup <corpus>      # Delete corpus")
         print("  python vertex_ai_rag_managed.py --all             # Setup + queries")
+        print("  python vertex_ai_rag_managed.py --benchmark managed=<corpus> local=<corpus>  # Compare latency")
+        print("\nSet RAG_BACKEND=local (or fake, fully offline) to run the same flow on a local index.")
         print("\nExample workflow:")
         print("  1. python vertex_ai_rag_managed.py --setup")
         print("  2. python vertex_ai_rag_managed.py --interactive projects/123/locations/us-central1/ragCorpora/456")
@@ -0,0 +1,492 @@
+"""
+WCC AI Learning Series - Session 3: Async RAG Pipeline
+Serve many questions from one process with asyncio
+
+RAGPipeline.query() blocks its thread for two network round trips (embed
+the question, then generate the answer), so a threaded server needs one
+thread per request in flight. AsyncRAGPipeline awaits those calls instead:
+
+1. One shared genai client (`client.aio`): its HTTP connection pool is
+   reused by every request instead of opening a connection per call
+2. Semaphores cap how many embedding / generation calls are in flight, so
+   a burst of traffic queues here instead of tripping the API's rate limits
+3. Identical questions asked at the same time share one embedding call,
+   and answers go through the pipeline's query-embedding cache
+4. Vector store work runs on one background thread, off the event loop
+5. aprefetch() (POST /prefetch) starts embedding a question while the user
+   is still typing; submitting the same text joins that embedding instead
+   of starting over, so the embed round trip leaves the critical path
+
+Serve it over HTTP (JSON in, JSON out):
+    python async_rag.py --docs ./my_archive --port 8080
+    curl -X POST localhost:8080/prefetch -d '{"query": "What is RAG?"}'
+    curl -X POST localhost:8080/query -d '{"question": "What is RAG?"}'
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from google.genai import types
+
+from rag_pipeline import RAGPipeline, load_text_files
+
+# Shared helpers come from the full demo, installed by requirements.txt
+# (pip install -e ../live-demo)
+from context_packer import pack_context
+from embedding_dispatcher import RETRYABLE_STATUS_CODES, status_code
+from query_cache import normalize_query
+from streaming_ingest import batched
+
+# Largest request body the HTTP server accepts (bytes)
+MAX_BODY_BYTES = 64 * 1024
+
+
+class HTTPRequestError(ValueError):
+    """A request the server can't read; answered with `status` and the connection closed"""
+
+    def __init__(self, status: str, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class AsyncRAGPipeline:
+    """
+    asyncio front end for a RAGPipeline (same store, caches and models)
+
+    Usage:
+        rag = AsyncRAGPipeline(RAGPipeline(project_id=os.getenv("PROJECT_ID")))
+        await rag.aembed_and_store(chunks)
+        results = await rag.asearch("How do I learn Python?")
+        answers = await asyncio.gather(*(rag.aquery(q) for q in questions))
+    """
+
+    def __init__(self, pipeline: RAGPipeline, max_concurrent_embeds: int = 16,
+                 max_concurrent_generations: int = 32, max_retries: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 32.0, max_prefetches: int = 64):
+        """
+        Args:
+            pipeline: The RAGPipeline whose client, caches and vector store to use
+            max_concurrent_embeds: Max embedding requests in flight
+            max_concurrent_generations: Max generation requests in flight
+            max_retries: Retries per request for 429 / 5xx responses
+            base_delay: First backoff delay in seconds
+            max_delay: Upper bound for a single backoff delay
+            max_prefetches: Max speculative query embeddings in flight; further
+                            aprefetch() calls are dropped
+        """
+        self.pipeline = pipeline
+        self.models = pipeline.client.aio.models  # One pooled client for every request
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._embed_slots = asyncio.Semaphore(max_concurrent_embeds)
+        self._generate_slots = asyncio.Semaphore(max_concurrent_generations)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.max_prefetches = max_prefetches
+        self._prefetches: Set[asyncio.Task] = set()
+
+        # The vector stores aren't thread-safe: one thread does all their work
+        self._store_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-store")
+
+        # Counters
+        self.queries = 0
+        self.coalesced = 0
+        self.prefetched = 0
+
+    async def __aenter__(self) -> "AsyncRAGPipeline":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Cancel pending prefetches, wait for vector store work and stop its thread"""
+        for task in list(self._prefetches):
+            task.cancel()
+        await asyncio.gather(*self._prefetches, return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(None, self._store_thread.shutdown)
+
+    # ========================================================================
+    # API CALLS
+    # ========================================================================
+
+    async def _call(self, slots: asyncio.Semaphore, method, **kwargs):
+        """Await one API call within `slots`, backing off and retrying on 429 / 5xx"""
+        attempt = 0
+        while True:
+            async with slots:
+                try:
+                    return await method(**kwargs)
+                except Exception as error:
+                    if status_code(error) not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                        raise
+
+            # Sleep outside the semaphore so other requests can use the slot
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+            await asyncio.sleep(random.uniform(0, delay))
+            attempt += 1
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed one request-sized batch of texts"""
+        response = await self._call(
+            self._embed_slots, self.models.embed_content,
+            model=self.pipeline.embedding_model_name,
+            contents=texts,
+            config=types.EmbedContentConfig(output_dimensionality=self.pipeline.output_dimensionality),
+        )
+        return [emb.values for emb in response.embeddings]
+
+    async def _in_store_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._store_thread, fn, *args)
+
+    # ========================================================================
+    # EMBEDDING & STORAGE
+    # ========================================================================
+
+    async def aembed_and_store(self, chunks: Optional[Iterable[Dict]] = None,
+                               write_batch_size: int = 500, max_pending_writes: int = 4) -> int:
+        """
+        Embed chunks (skipping cached ones) and store them, many requests at once
+
+        Args:
+            chunks: Chunks to store (default: the pipeline's chunk_documents() result)
+            write_batch_size: Chunks per vector database write
+            max_pending_writes: Write batches being embedded at the same time
+
+        Returns:
+            Number of chunks stored
+        """
+        if chunks is None:
+            chunks = getattr(self.pipeline, 'chunks', [])
+
+        pending = set()
+        stored = 0
+        for batch in batched(chunks, write_batch_size):
+            if len(pending) >= max_pending_writes:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                stored += sum(task.result() for task in done)
+            pending.add(asyncio.ensure_future(self._embed_and_store_batch(batch)))
+        if pending:
+            stored += sum(await asyncio.gather(*pending))
+
+        await self._in_store_thread(self.pipeline.vector_store.persist)
+        return stored
+
+    async def _embed_and_store_batch(self, chunks: List[Dict]) -> int:
+        """Embed the uncached chunks of one write batch, then write it"""
+        pipeline = self.pipeline
+        cache = pipeline.embedding_cache
+        keys = [cache.make_key(pipeline.embedding_model_name, pipeline.output_dimensionality, chunk["text"])
+                for chunk in chunks]
+        found = await asyncio.to_thread(cache.get_many, list(dict.fromkeys(keys)))
+
+        # Embed each missing text once, even if it appears several times
+        missing = {}
+        for key, chunk in zip(keys, chunks):
+            if key not in found:
+                missing.setdefault(key, chunk["text"])
+        hit_count = sum(1 for key in keys if key in found)
+        cache.hits += hit_count
+        cache.misses += len(keys) - hit_count
+
+        if missing:
+            texts = list(missing.values())
+            batches = pipeline.embedding_dispatcher.make_batches(texts)
+            results = await asyncio.gather(*(self._embed(texts[start:end]) for start, end in batches))
+            fresh = dict(zip(missing.keys(), (emb for batch in results for emb in batch)))
+            await asyncio.to_thread(cache.put_many, fresh)
+            found.update(fresh)
+
+        await self._in_store_thread(pipeline._store_batch, chunks, [found[key] for key in keys])
+        return len(chunks)
+
+    # ========================================================================
+    # SEARCH & GENERATION
+    # ========================================================================
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """Query embedding from the cache, an identical in-flight request, or the API"""
+        cache = self.pipeline.query_cache
+        embedding = cache.peek(query)
+        if embedding is not None:
+            return embedding
+
+        key = normalize_query(query)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            embedding = (await self._embed([query]))[0]
+        except BaseException as error:
+            future.set_exception(error)
+            future.exception()  # Mark as retrieved when nobody else was waiting
+            raise
+        else:
+            cache.put(query, embedding)
+            future.set_result(embedding)
+            return embedding
+        finally:
+            del self._inflight[key]
+
+    def aprefetch(self, query: str) -> bool:
+        """
+        Start embedding `query` in the background and return straight away
+
+        Call it with the partial question while the user types (debounced).
+        If they submit the same text (after normalize_query), aquery() and
+        asearch() join the in-flight embedding or find it in the cache.
+        Failures are dropped: the real query embeds again.
+
+        Returns:
+            False if the query is empty or max_prefetches are already running
+        """
+        if not normalize_query(query):
+            return False
+        if self.pipeline.query_cache.peek(query) is not None:
+            return True
+        if len(self._prefetches) >= self.max_prefetches:
+            return False
+
+        task = asyncio.get_running_loop().create_task(self.aembed_query(query))
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetch_done)
+        self.prefetched += 1
+        return True
+
+    def _prefetch_done(self, task: asyncio.Task) -> None:
+        self._prefetches.discard(task)
+        if not task.cancelled():
+            task.exception()  # Retrieve it so asyncio doesn't log it as unhandled
+
+    async def asearch(self, query: str, k: int = 5) -> List[Dict]:
+        """
+        Async RAGPipeline.search()
+
+        Args:
+            query: User's question or search term
+            k: Number of results to return
+
+        Returns:
+            List of relevant chunks with similarity scores
+        """
+        embedding = await self.aembed_query(query)
+        return await self._in_store_thread(self.pipeline.vector_store.query, embedding, k)
+
+    async def aquery(self, question: str, k: int = 5, model: str = "gemini-2.5-flash-lite",
+                     max_context_tokens: int = 2000) -> Dict:
+        """
+        Async RAGPipeline.query(): retrieve context and generate an answer
+
+        Args:
+            question: User's question
+            k: Number of context chunks to retrieve
+            model: Which Gemini model to use
+            max_context_tokens: Token budget for the retrieved context
+
+        Returns:
+            Dict with 'answer', 'sources' and 'chunks'
+        """
+        self.queries += 1
+        relevant_docs = await self.asearch(question, k=k)
+        if not relevant_docs:
+            return {'answer': "I couldn't find any relevant information.", 'sources': [], 'chunks': []}
+
+        relevant_docs = pack_context(relevant_docs, max_context_tokens)
+        response = await self._call(
+            self._generate_slots, self.models.generate_content,
+            model=model,
+            contents=[RAGPipeline.build_prompt(question, relevant_docs)],
+            config=types.GenerateContentConfig(),
+        )
+        return {
+            'answer': response.text,
+            'sources': RAGPipeline.unique_sources(relevant_docs),
+            'chunks': relevant_docs,
+        }
+
+
+# ============================================================================
+# HTTP SERVER
+# ============================================================================
+
+class RAGServer:
+    """
+    Minimal HTTP/1.1 JSON server on asyncio streams (keep-alive supported)
+
+    Routes:
+        GET  /health    -> {"status": "ok", "chunks": ..., "queries": ...}
+        POST /prefetch  {"query": ...} -> 202, embedding starts in the background
+        POST /search    {"query": ..., "k": 5}
+        POST /query     {"question": ..., "k": 5, "max_context_tokens": 2000}
+    """
+
+    def __init__(self, rag: AsyncRAGPipeline, host: str = "127.0.0.1", port: int = 8080):
+        self.rag = rag
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.Server] = None
+
+    async def start(self) -> "RAGServer":
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]  # The real port when 0 was asked for
+        return self
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ValueError as error:
+                    # The rest of the stream can't be trusted: answer and hang up
+                    status = getattr(error, "status", "400 Bad Request")
+                    await self._respond(writer, status, {"error": f"{status[4:]}: {error}"}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self._route(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: str, payload: Dict, keep_alive: bool) -> None:
+        data = json.dumps(payload, default=float).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict, bytes]]:
+        """
+        (method, path, headers, body) of the next request, or None at end of connection
+
+        Raises:
+            ValueError: Malformed request line or Content-Length
+            HTTPRequestError: Body larger than MAX_BODY_BYTES (413)
+        """
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise ValueError(f"malformed request line {request_line[:100]!r}")
+        method, path, _ = parts
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0))  # ValueError if not a number
+        if length < 0:
+            raise ValueError(f"negative Content-Length {length}")
+        if length > MAX_BODY_BYTES:
+            raise HTTPRequestError("413 Payload Too Large",
+                                   f"body of {length} bytes exceeds the {MAX_BODY_BYTES}-byte limit")
+        body = await reader.readexactly(length) if length else b""
+        return method, path.split("?", 1)[0], headers, body
+
+    @staticmethod
+    def _text(params: Dict, key: str) -> str:
+        """String field `key` of a request body (KeyError if missing, ValueError if not text)"""
+        value = params[key]
+        if not isinstance(value, str):
+            raise ValueError(f"'{key}' must be a string, got {type(value).__name__}")
+        return value
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[str, Dict]:
+        """Run one request, returning (HTTP status line, JSON payload)"""
+        try:
+            if method == "GET" and path == "/health":
+                count = await self.rag._in_store_thread(self.rag.pipeline.vector_store.count)
+                return "200 OK", {"status": "ok", "chunks": count, "queries": self.rag.queries,
+                                  "prefetched": self.rag.prefetched}
+
+            if method != "POST" or path not in ("/prefetch", "/search", "/query"):
+                return "404 Not Found", {"error": f"No route for {method} {path}"}
+
+            params = json.loads(body or b"{}")
+            if not isinstance(params, dict):
+                raise ValueError(f"expected a JSON object, got {type(params).__name__}")
+            if path == "/prefetch":
+                return "202 Accepted", {"prefetching": self.rag.aprefetch(self._text(params, "query"))}
+            if path == "/search":
+                return "200 OK", {"results": await self.rag.asearch(self._text(params, "query"),
+                                                                    k=int(params.get("k", 5)))}
+            return "200 OK", await self.rag.aquery(
+                self._text(params, "question"), k=int(params.get("k", 5)),
+                max_context_tokens=int(params.get("max_context_tokens", 2000)))
+        except (KeyError, ValueError) as error:
+            return "400 Bad Request", {"error": f"Bad request: {error}"}
+        except Exception as error:
+            return "500 Internal Server Error", {"error": str(error)}
+
+
+# ============================================================================
+# MAIN EXECUTION
+# ============================================================================
+
+async def main(args: argparse.Namespace) -> None:
+    client = None
+    if args.fake:
+        from fake_genai import FakeGenAIClient
+        client = FakeGenAIClient(embed_latency=0.05, generate_latency=0.5)
+
+    pipeline = RAGPipeline(project_id=os.getenv("PROJECT_ID"), location=os.getenv("LOCATION", "us-central1"),
+                           client=client)
+    async with AsyncRAGPipeline(pipeline, args.max_embeds, args.max_generations) as rag:
+        if args.docs:
+            chunks = pipeline.chunk_documents(list(load_text_files(args.docs)))
+            stored = await rag.aembed_and_store(chunks)
+            print(f"✓ Stored {stored} chunks")
+
+        server = await RAGServer(rag, args.host, args.port).start()
+        print(f"✓ Serving RAG on http://{server.host}:{server.port} (POST /query, POST /search, POST /prefetch, GET /health)")
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the RAG pipeline over HTTP with asyncio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--docs", help="Folder of .txt files to ingest before serving")
+    parser.add_argument("--max-embeds", type=int, default=16, help="Embedding requests in flight")
+    parser.add_argument("--max-generations", type=int, default=32, help="Generation requests in flight")
+    parser.add_argument("--fake", action="store_true", help="Use the offline fake client (no GCP needed)")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        print("\n✓ Server stopped")
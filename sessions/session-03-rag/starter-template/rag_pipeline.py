@@ -9,15 +9,25 @@ This is a simplified version of the full demo. Perfect for:
 """
 
 import os
-from typing import List, Dict
+from pathlib import Path
+from typing import List, Dict, Iterable, Iterator, Tuple
 from dotenv import load_dotenv
 
 # Import required libraries
 import vertexai
 from google import genai
 from google.genai import types
-import chromadb
-from langchain_text_splitters.character import RecursiveCharacterTextSplitter
+
+# Shared helpers (embedding cache, dispatcher, ...) come from the full demo,
+# installed by requirements.txt (pip install -e ../live-demo)
+from embedding_cache import EmbeddingCache
+from embedding_dispatcher import EmbeddingDispatcher
+from streaming_ingest import run_streaming_ingest
+from query_cache import QueryEmbeddingCache
+from vector_store import open_vector_store
+from parallel_chunking import ParallelChunker, Span
+from chunk_store import ChunkStore
+from context_packer import pack_context
 
 
 load_dotenv()
@@ -26,6 +36,28 @@ load_dotenv()
 PROJECT_ID = os.getenv("PROJECT_ID")
 LOCATION = os.getenv("LOCATION", "us-central1")
 
+
+def load_text_files(directory: str, pattern: str = "**/*.txt") -> Iterator[Dict]:
+    """
+    Lazily read documents from disk, one file at a time
+    
+    Pair with RAGPipeline.ingest() to index archives that don't fit in memory.
+    
+    Args:
+        directory: Folder to read from
+        pattern: Glob pattern for the files to include
+    
+    Yields:
+        Dicts with 'title', 'source' and 'content'
+    """
+    for path in sorted(Path(directory).glob(pattern)):
+        yield {
+            "title": path.stem.replace("_", " ").title(),
+            "source": str(path),
+            "content": path.read_text(encoding="utf-8", errors="replace"),
+        }
+
+
 class RAGPipeline:
     """
     Simple RAG Pipeline - Learn the 4 core steps:
@@ -35,39 +67,48 @@ class RAGPipeline:
     4. Query: Retrieve relevant chunks and generate answers
     """
     
-    def __init__(self, project_id: str, location: str = "us-central1"):
+    def __init__(self, project_id: str, location: str = "us-central1",
+                 vector_backend: str = None, client=None):
         """
         Initialize the RAG pipeline
         
         Args:
             project_id: Your GCP project ID
             location: GCP region (default: us-central1)
+            vector_backend: "chroma", "numpy" or "ann"
+                            (default: VECTOR_BACKEND env var, then "chroma")
+            client: Ready-made genai.Client (or a local fake for tests and benchmarks)
         """
         self.project_id = project_id
         self.location = location
         
         # Initialize Vertex AI and Generative AI client
-        vertexai.init(project=project_id, location=location)
-        
-        # Initialize clients
-        self.client = genai.Client(
-            vertexai=True, project=project_id, location=location)
+        if client is None:
+            vertexai.init(project=project_id, location=location)
+            client = genai.Client(
+                vertexai=True, project=project_id, location=location)
+        self.client = client
         
         # Model names from environment or defaults
         self.embedding_model_name = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-004")
         self.generation_model_name = os.getenv("GENERATION_MODEL_NAME", "gemini-2.5-flash-lite")
+        self.output_dimensionality = 10
+        
+        # Cache embeddings on disk so unchanged chunks are never re-embedded
+        self.embedding_cache = EmbeddingCache(
+            os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite"))
         
-        # Initialize ChromaDB (local, persistent storage)
-        self.chroma_client = chromadb.PersistentClient(path="./chroma_data")
+        # Send cache misses to the API with several batches in flight
+        self.embedding_dispatcher = EmbeddingDispatcher(
+            self.client, self.embedding_model_name, self.output_dimensionality)
         
-        # Create or get collection
+        # Repeated questions reuse their embedding (see query_cache.stats())
+        self.query_cache = QueryEmbeddingCache(self._embed_query, maxsize=1024, ttl=3600)
+        
+        # Initialize the vector store (ChromaDB or in-process NumPy index, both on disk)
+        self.vector_backend = vector_backend or os.getenv("VECTOR_BACKEND", "chroma")
         self.collection_name = "my_documents"
-        try:
-            self.collection = self.chroma_client.get_collection(self.collection_name)
-            print(f"✓ Using existing collection: {self.collection_name}")
-        except:
-            self.collection = self.chroma_client.create_collection(self.collection_name)
-            print(f"✓ Created new collection: {self.collection_name}")
+        self.vector_store = open_vector_store(self.vector_backend, self.collection_name)
         
         # Store documents for reference
         self.documents = []
@@ -76,53 +117,68 @@ class RAGPipeline:
     # STEP 1: CHUNKING
     # ========================================================================
     
+    def iter_chunks(self, documents: Iterable[Dict], chunk_size: int = 400,
+                    chunk_overlap: int = 50, max_workers: int = None) -> Iterator[Dict]:
+        """
+        Yield chunks in document order (nothing is kept in memory)
+        
+        Big inputs are split by a pool of worker processes, a few batches
+        ahead of the consumer.
+        
+        Args:
+            documents: Any iterable of dicts with 'title' and 'content',
+                       e.g. a generator like load_text_files()
+            chunk_size: Size of each chunk (in characters)
+            chunk_overlap: Overlap between chunks (for context)
+            max_workers: Worker processes (default: CPU count, 1 = no pool)
+        
+        Yields:
+            Chunks with a stable ID and metadata
+        """
+        for document in self._split_documents(documents, chunk_size, chunk_overlap, max_workers):
+            chunks = ChunkStore(offset_key=None)
+            chunks.add_document(*document)
+            yield from chunks
+    
+    def _split_documents(self, documents: Iterable[Dict], chunk_size: int, chunk_overlap: int,
+                         max_workers: int = None) -> Iterator[Tuple[str, Dict, str, List[Span]]]:
+        """Split documents, yielding (doc key, shared metadata, full text, chunk spans)"""
+        # Combine title and content
+        texts = ((doc, f"Title: {doc['title']}\n\n{doc['content']}") for doc in documents)
+        
+        with ParallelChunker(chunk_size, chunk_overlap, max_workers=max_workers) as chunker:
+            # Split into chunks
+            for doc, full_text, spans in chunker.iter_split(texts):
+                doc_key = doc.get("url") or f"{doc.get('source', 'Unknown')}/{doc['title']}"
+                metadata = {"title": doc.get("title", "Unknown"), "source": doc.get("source", "Unknown")}
+                yield doc_key, metadata, full_text, spans
+    
     def chunk_documents(self, documents: List[Dict], chunk_size: int = 400, 
-                       chunk_overlap: int = 50) -> List[Dict]:
+                       chunk_overlap: int = 50) -> ChunkStore:
         """
         STEP 1: Break documents into smaller chunks
         
         Why? Large documents don't fit well in embeddings.
         Smaller chunks = better retrieval.
         
+        Chunks are kept as offsets into each document (see chunk_store.py)
+        and only turned into dicts when they are embedded or returned.
+        
         Args:
             documents: List of dicts with 'title' and 'content'
             chunk_size: Size of each chunk (in characters)
             chunk_overlap: Overlap between chunks (for context)
         
         Returns:
-            List of chunks with metadata
+            ChunkStore of chunks with metadata (behaves like a list of dicts)
         """
         print("\n" + "="*70)
         print("STEP 1: CHUNKING DOCUMENTS")
         print("="*70)
         
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ". ", " ", ""],
-            length_function=len,
-        )
-        
-        all_chunks = []
-        
-        for doc in documents:
-            # Combine title and content
-            full_text = f"Title: {doc['title']}\n\n{doc['content']}"
-            
-            # Split into chunks
-            chunks = text_splitter.split_text(full_text)
-            
-            # Add metadata to each chunk
-            for i, chunk in enumerate(chunks):
-                all_chunks.append({
-                    "text": chunk,
-                    "metadata": {
-                        "title": doc.get("title", "Unknown"),
-                        "source": doc.get("source", "Unknown"),
-                        "chunk_id": i,
-                        "total_chunks": len(chunks)
-                    }
-                })
+        all_chunks = ChunkStore(offset_key=None)
+        for document in self._split_documents(documents, chunk_size, chunk_overlap):
+            all_chunks.add_document(*document)
         
         self.chunks = all_chunks
         print(f"✓ Created {len(all_chunks)} chunks from {len(documents)} documents")
@@ -135,7 +191,7 @@ class RAGPipeline:
     # STEP 2: EMBEDDING & STORAGE
     # ========================================================================
     
-    def embed_and_store(self, batch_size: int = 5) -> None:
+    def embed_and_store(self, batch_size: int = None, write_batch_size: int = 500) -> None:
         """
         STEP 2: Generate embeddings and store in vector database
         
@@ -143,7 +199,8 @@ class RAGPipeline:
         Vector DB lets us find similar chunks quickly.
         
         Args:
-            batch_size: Process this many chunks at once
+            batch_size: Max chunks per API request (default: the model's limit)
+            write_batch_size: Max chunks per write to the vector database
         """
         print("\n" + "="*70)
         print("STEP 2: EMBEDDING & STORAGE")
@@ -153,45 +210,79 @@ class RAGPipeline:
             print("❌ No chunks found. Run chunk_documents() first!")
             return
         
-        # Extract texts
-        texts = [chunk["text"] for chunk in self.chunks]
-        
-        print(f"Generating embeddings for {len(texts)} chunks...")
-        
-        all_embeddings = []
-        
-        # Process in batches
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i+batch_size]
-            
-            # Get embeddings from Vertex AI
-            response = self.client.models.embed_content(
-                model=self.embedding_model_name,
-                contents=batch,
-                config=types.EmbedContentConfig(output_dimensionality=10),
-            )
-            
-            batch_embeddings = [emb.values for emb in response.embeddings]
-            all_embeddings.extend(batch_embeddings)
-            
-            if (i + batch_size) % 10 == 0:
-                print(f"  Processed {min(i+batch_size, len(texts))}/{len(texts)} chunks")
-        
-        # Store in ChromaDB
-        ids = [f"chunk_{i}" for i in range(len(self.chunks))]
-        documents = [chunk["text"] for chunk in self.chunks]
-        metadatas = [chunk["metadata"] for chunk in self.chunks]
-        
-        self.collection.add(
-            embeddings=all_embeddings,
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        print(f"Generating embeddings for {len(self.chunks)} chunks...")
+        self._run_ingest(self.chunks, batch_size, write_batch_size)
+    
+    def ingest(self, documents: Iterable[Dict], chunk_size: int = 400, chunk_overlap: int = 50,
+               batch_size: int = None, write_batch_size: int = 500, queue_size: int = 4) -> None:
+        """
+        STEPS 1 + 2 for big corpora: chunk, embed and store as a stream
+        
+        Chunks are produced lazily and flow through embedding and storage in
+        bounded batches, so memory use stays flat however large `documents` is.
         
-        print(f"✓ Stored {len(self.chunks)} chunks in vector database")
-        print(f"  Embedding dimension: {len(all_embeddings[0])}")
-        print(f"  Collection size: {self.collection.count()}")
+        Args:
+            documents: Any iterable of dicts with 'title' and 'content'
+                       (use a generator such as load_text_files() for big archives)
+            chunk_size: Size of each chunk (in characters)
+            chunk_overlap: Overlap between chunks (for context)
+            batch_size: Max chunks per API request (default: the model's limit)
+            write_batch_size: Chunks per pipeline batch / vector database write
+            queue_size: Max batches waiting between stages
+        """
+        print("\n" + "="*70)
+        print("STREAMING INGEST: CHUNK → EMBED → STORE")
+        print("="*70)
+        
+        chunks = self.iter_chunks(documents, chunk_size, chunk_overlap)
+        self._run_ingest(chunks, batch_size, write_batch_size, queue_size)
+    
+    def _run_ingest(self, chunks: Iterable[Dict], batch_size: int = None,
+                    write_batch_size: int = 500, queue_size: int = 4) -> None:
+        """Stream chunks through the (cached) embedder into the vector store"""
+        hits_before = self.embedding_cache.hits
+        misses_before = self.embedding_cache.misses
+        
+        stats = run_streaming_ingest(
+            chunks,
+            embed_fn=lambda texts: self._embed_cached(texts, batch_size),
+            store_fn=self._store_batch,
+            batch_size=write_batch_size,
+            queue_size=queue_size,
+        )
+        self.vector_store.persist()
+        
+        print(f"  Embedding cache: {self.embedding_cache.hits - hits_before} hits, "
+              f"{self.embedding_cache.misses - misses_before} misses "
+              f"({len(self.embedding_cache)} cached)")
+        print(f"✓ Stored {stats['chunks']} chunks in vector database")
+        print(f"  Embedding dimension: {self.output_dimensionality}")
+        print(f"  Collection size: {self.vector_store.count()}")
+    
+    def _embed_cached(self, texts: List[str], batch_size: int = None) -> List[List[float]]:
+        """Embed texts, only sending chunks missing from the embedding cache to the API"""
+        return self.embedding_cache.embed(
+            texts,
+            model=self.embedding_model_name,
+            output_dimensionality=self.output_dimensionality,
+            embed_fn=lambda missing: self._embed_texts(missing, batch_size),
+        )
+    
+    def _store_batch(self, chunks: List[Dict], embeddings: List[List[float]]) -> None:
+        """Write one bounded batch of chunks to the vector store"""
+        # Identical documents produce identical IDs; ChromaDB rejects duplicates in one call
+        unique = {chunk["id"]: (chunk, emb) for chunk, emb in zip(chunks, embeddings)}
+        
+        self.vector_store.upsert(
+            embeddings=[emb for _, emb in unique.values()],
+            documents=[chunk["text"] for chunk, _ in unique.values()],
+            metadatas=[chunk["metadata"] for chunk, _ in unique.values()],
+            ids=list(unique.keys())
+        )
+    
+    def _embed_texts(self, texts: List[str], batch_size: int = None) -> List[List[float]]:
+        """Call the embedding API for `texts` (concurrent batches, retried on 429)"""
+        return self.embedding_dispatcher.embed(texts, batch_size=batch_size)
     
     # ========================================================================
     # STEP 3: SEMANTIC SEARCH
@@ -213,39 +304,32 @@ class RAGPipeline:
         """
         print(f"\n🔍 Searching for: {query}")
         
-        # Embed the query
-        response = self.client.models.embed_content(
-            model=self.embedding_model_name,
-            contents=[query],
-            config=types.EmbedContentConfig(output_dimensionality=10),
-        )
-        query_embedding = response.embeddings[0].values
-        
-        # Search the vector database
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=k
-        )
+        # Embed the query (cached by normalized query text)
+        query_embedding = self.query_cache.get(query)
         
-        # Format results
-        relevant_docs = []
-        if results['documents'] and len(results['documents'][0]) > 0:
-            for i in range(len(results['documents'][0])):
-                relevant_docs.append({
-                    'text': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i]  # Lower = more similar
-                })
+        # Search the vector database (each result has 'text', 'metadata' and
+        # 'distance', where lower = more similar)
+        relevant_docs = self.vector_store.query(query_embedding, k=k)
         
         print(f"✓ Found {len(relevant_docs)} relevant chunks")
         
         return relevant_docs
     
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed one search query with Vertex AI (no caching)"""
+        response = self.client.models.embed_content(
+            model=self.embedding_model_name,
+            contents=[query],
+            config=types.EmbedContentConfig(output_dimensionality=self.output_dimensionality),
+        )
+        return response.embeddings[0].values
+    
     # ========================================================================
     # STEP 4: GENERATION (RAG)
     # ========================================================================
     
-    def query(self, question: str, k: int = 5, model: str = "gemini-2.5-flash-lite") -> Dict:
+    def query(self, question: str, k: int = 5, model: str = "gemini-2.5-flash-lite",
+              max_context_tokens: int = 2000) -> Dict:
         """
         STEP 4: Complete RAG - Retrieve context and generate answer
         
@@ -256,6 +340,7 @@ class RAGPipeline:
             question: User's question
             k: Number of context chunks to retrieve
             model: Which Gemini model to use
+            max_context_tokens: Token budget for the retrieved context
         
         Returns:
             Dict with 'answer' and 'sources'
@@ -273,17 +358,39 @@ class RAGPipeline:
                 'sources': []
             }
         
-        # 2. Build context from retrieved chunks
+        # Merge neighbouring chunks, drop repeats, fill the budget by relevance per token
+        relevant_docs = pack_context(relevant_docs, max_context_tokens)
+        
+        # 2. Build prompt from retrieved chunks
+        prompt = self.build_prompt(question, relevant_docs)
+        
+        # 3. Generate answer with Gemini
+        print("🤖 Generating answer with Gemini...")
+        
+        response = self.client.models.generate_content(
+            model=model,
+            contents=[prompt],
+            config=types.GenerateContentConfig()
+        )
+        
+        return {
+            'answer': response.text,
+            'sources': self.unique_sources(relevant_docs),
+            'chunks': relevant_docs
+        }
+    
+    @staticmethod
+    def build_prompt(question: str, docs: List[Dict]) -> str:
+        """Prompt asking the model to answer `question` from the numbered `docs` only"""
         context_parts = []
-        for i, doc in enumerate(relevant_docs):
+        for i, doc in enumerate(docs):
             context_parts.append(f"""[Source {i+1}: {doc['metadata']['title']}]
 {doc['text']}
 """)
         
         context = "\n\n".join(context_parts)
         
-        # 3. Build prompt
-        prompt = f"""Answer the question based ONLY on the provided context.
+        return f"""Answer the question based ONLY on the provided context.
 If the context doesn't contain enough information, say so.
 Always cite your sources using [Source X] format.
 
@@ -293,30 +400,18 @@ Context:
 Question: {question}
 
 Answer:"""
-        
-        # 4. Generate answer with Gemini
-        print("🤖 Generating answer with Gemini...")
-        
-        response = self.client.models.generate_content(
-            model=model,
-            contents=[prompt],
-            config=types.GenerateContentConfig()
-        )
-        
-        # 5. Extract unique sources
+    
+    @staticmethod
+    def unique_sources(docs: List[Dict]) -> List[Dict]:
+        """Metadata of each distinct source title, in order of first appearance"""
         unique_sources = []
         seen_titles = set()
-        for doc in relevant_docs:
+        for doc in docs:
             title = doc['metadata']['title']
             if title not in seen_titles:
                 seen_titles.add(title)
                 unique_sources.append(doc['metadata'])
-        
-        return {
-            'answer': response.text,
-            'sources': unique_sources,
-            'chunks': relevant_docs
-        }
+        return unique_sources
     
     # ========================================================================
     # UTILITIES
@@ -324,8 +419,7 @@ Answer:"""
     
     def reset(self) -> None:
         """Clear all stored documents and start fresh"""
-        self.chroma_client.delete_collection(self.collection_name)
-        self.collection = self.chroma_client.create_collection(self.collection_name)
+        self.vector_store.reset()
         self.chunks = []
         print("✓ Collection reset")
     
@@ -336,8 +430,10 @@ Answer:"""
         print("="*70)
         print(f"Project ID: {self.project_id}")
         print(f"Location: {self.location}")
-        print(f"Collection: {self.collection_name}")
-        print(f"Stored chunks: {self.collection.count()}")
+        print(f"Collection: {self.collection_name} ({self.vector_backend})")
+        print(f"Stored chunks: {self.vector_store.count()}")
+        print(f"Cached embeddings: {len(self.embedding_cache)}")
+        print(f"Query cache hit rate: {self.query_cache.stats()['hit_rate']:.0%}")
         if hasattr(self, 'chunks'):
             print(f"Loaded chunks: {len(self.chunks)}")
 
@@ -1,11 +1,207 @@
-import tiktoken
+"""
+WCC AI Learning Series - Token Counter
+How LLMs see text: tokens, not characters
 
-encoding = tiktoken.encoding_for_model("gpt-5")
+Run it to see how words split into tokens. Import it to count tokens anywhere
+in the series with one shared tokenizer:
 
-# Token IDs are vocabulary indices
-texts = ["API", "APIEndpoint", "indivisibility", "eadfgb", "analysis", "nalysis"]
+    counter = get_token_counter()
+    counter.count("Hello!")                   # exact (cached)
+    counter.count_batch(chunk_texts)          # misses encoded on a thread pool
+    counter.fits(prompt, 2000)                # cheap bound first, exact if needed
+    trim_history(messages, max_tokens=3000)   # keep the newest turns that fit
 
-for text in texts:
-    tokens = encoding.encode(text)
-    print(f"{text:20} → {len(tokens)} tokens: {tokens}")
-    
\ No newline at end of file
+Without tiktoken (or offline before its vocabulary is cached) every count
+falls back to an estimate of ~4 characters per token.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import tiktoken
+except ImportError:  # Optional dependency: pip install tiktoken
+    tiktoken = None
+
+TOKENIZER_MODEL = "gpt-5"
+
+# Rough characters per token for English prose (estimate mode)
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = TOKENIZER_MODEL):
+    """
+    The tiktoken encoding for `model`
+
+    Returns None when tiktoken isn't installed or its vocabulary can't be
+    downloaded (it is fetched once, then cached on disk).
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+class TokenCounter:
+    """
+    Batched, cached token counting
+
+    - count_batch() encodes all cache misses in one call to tiktoken's
+      thread-pooled encode_ordinary_batch (tiktoken releases the GIL)
+    - Counts are kept in an LRU cache keyed by the string's hash and length,
+      so the strings themselves are never retained; the same chat history
+      or chunk counted every turn costs one dict lookup
+    - estimate() is a free len()-based guess for pre-filtering
+    """
+
+    def __init__(self, model: str = TOKENIZER_MODEL, cache_size: int = 100_000,
+                 num_threads: int = 4, encoding=None):
+        """
+        Args:
+            model: Model whose tokenizer to use
+            cache_size: Max cached counts
+            num_threads: Threads for count_batch() / encode_batch()
+            encoding: A tiktoken Encoding to use instead of `model`'s
+        """
+        self.encoding = encoding or get_encoding(model)
+        self.cache_size = cache_size
+        self.num_threads = num_threads
+        self._cache: "OrderedDict[tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def exact(self) -> bool:
+        """False when counts are estimates (no tiktoken)"""
+        return self.encoding is not None
+
+    @staticmethod
+    def estimate(text: str) -> int:
+        """Fast approximate count (~4 characters per token)"""
+        return -(-len(text) // CHARS_PER_TOKEN)
+
+    def count(self, text: str) -> int:
+        """Token count of one string"""
+        return self.count_batch([text])[0]
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        """Token counts of many strings, encoding only the ones not cached"""
+        if not self.exact:
+            return [self.estimate(text) for text in texts]
+
+        keys = [(hash(text), len(text)) for text in texts]
+        counts: List[Optional[int]] = [None] * len(texts)
+        missing: Dict[tuple, List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                count = self._cache.get(key)
+                if count is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    counts[i] = count
+            self.hits += len(texts) - sum(len(positions) for positions in missing.values())
+            self.misses += len(missing)
+
+        if missing:
+            to_encode = [texts[positions[0]] for positions in missing.values()]
+            new_counts = [len(tokens) for tokens in self.encode_batch(to_encode)]
+            with self._lock:
+                for (key, positions), count in zip(missing.items(), new_counts):
+                    for i in positions:
+                        counts[i] = count
+                    self._cache[key] = count
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return counts
+
+    def encode_batch(self, texts: Sequence[str]) -> List[List[int]]:
+        """Token IDs for many strings, encoded on a thread pool"""
+        if not self.exact:
+            raise RuntimeError("tiktoken encoding unavailable (pip install tiktoken)")
+        if len(texts) == 1:
+            return [self.encoding.encode_ordinary(texts[0])]
+        return self.encoding.encode_ordinary_batch(list(texts), num_threads=self.num_threads)
+
+    def fits(self, text: str, max_tokens: int) -> bool:
+        """
+        True if `text` is at most `max_tokens` tokens
+
+        A token is at least one UTF-8 byte, so short strings pass without
+        being encoded at all.
+        """
+        if len(text) <= max_tokens and len(text.encode("utf-8")) <= max_tokens:
+            return True
+        return self.count(text) <= max_tokens
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {"exact": self.exact, "cached": len(self._cache), "hits": self.hits,
+                "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(model: str = TOKENIZER_MODEL) -> TokenCounter:
+    """The shared TokenCounter for `model` (one cache per process)"""
+    return TokenCounter(model)
+
+
+def message_text(message: Dict) -> str:
+    """Text of a chat message in Gemini ({"parts": [...]}) or OpenAI ({"content": ...}) form"""
+    if "parts" in message:
+        return "".join(part if isinstance(part, str) else getattr(part, "text", "") or ""
+                       for part in message["parts"])
+    return str(message.get("content", ""))
+
+
+def trim_history(messages: List[Dict], max_tokens: int,
+                 counter: Optional[TokenCounter] = None) -> List[Dict]:
+    """
+    Keep the most recent messages that fit in `max_tokens`
+
+    The last message (usually the new user turn) is always kept.
+    Counts come from the shared cache, so re-trimming a growing
+    conversation only encodes the newest message.
+    """
+    if not messages:
+        return []
+    counter = counter or get_token_counter()
+    counts = counter.count_batch([message_text(message) for message in messages])
+
+    start, used = len(messages) - 1, counts[-1]
+    while start > 0 and used + counts[start - 1] <= max_tokens:
+        start -= 1
+        used += counts[start]
+
+    # Start on a user turn, never half-way through an exchange
+    while start < len(messages) - 1 and messages[start].get("role") != "user":
+        start += 1
+    return messages[start:]
+
+
+if __name__ == "__main__":
+    encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+
+    # Token IDs are vocabulary indices
+    texts = ["API", "APIEndpoint", "indivisibility", "eadfgb", "analysis", "nalysis"]
+
+    for text in texts:
+        tokens = encoding.encode(text)
+        print(f"{text:20} → {len(tokens)} tokens: {tokens}")
+
+    # Counting many strings: one batched call, then served from the cache
+    counter = get_token_counter()
+    print(f"\nBatch counts: {counter.count_batch(texts)}")
+    counter.count_batch(texts)
+    print(f"Cache: {counter.stats()}")